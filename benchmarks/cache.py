@@ -0,0 +1,74 @@
+"""
+Parse cache benchmark.
+
+Generates a synthetic project whose modules import and call each other, then
+parses it and computes the execution flows of each module and of each module with
+its dependencies, as the graphs and deps phases do, first with a cold cache and
+then with a warm one. The project is generated from a seeded random generator, so
+that the runs are reproducible. Rendering the graphs with Graphviz is not cached,
+and not measured.
+
+Usage: python benchmarks/cache.py [--modules N] [--functions N] [--seed S]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from pycodedoc.parser import Parser  # noqa: E402
+
+
+def write_project(root: str, modules: int, functions: int, seed: int):
+    rng = random.Random(seed)
+    for i in range(modules):
+        deps = rng.sample(range(modules), min(3, modules))
+        deps = [dep for dep in deps if dep != i]
+        lines = [f"from mod{dep} import f{dep}_0" for dep in deps] + [""]
+        for j in range(functions):
+            callees = [f"f{i}_{k}" for k in rng.sample(range(functions), 2) if k != j]
+            callees += [f"f{dep}_0" for dep in deps if rng.random() < 0.5]
+            lines.append(f"def f{i}_{j}(x):")
+            lines += [f"    x = {callee}(x) if x else x + {j}" for callee in callees]
+            lines += ["    return x", ""]
+        with open(os.path.join(root, f"mod{i}.py"), "w") as f:
+            f.write("\n".join(lines))
+
+
+def run(base_dir: str, cache_dir: str):
+    start = time.perf_counter()
+    parser = Parser(base_dir=base_dir, cache_dir=cache_dir)
+    parsed = time.perf_counter()
+    for module in parser.get_modules():
+        parser.parse_files_flows([os.path.join(base_dir, module.path)])
+        parser.parse_module_deps(module, parser.get_module_deps(module.path))
+    return parsed - start, time.perf_counter() - parsed
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument("--modules", type=int, default=100)
+    argparser.add_argument("--functions", type=int, default=20)
+    argparser.add_argument("--seed", type=int, default=0)
+    args = argparser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base_dir, cache_dir = os.path.join(tmp, "project"), os.path.join(tmp, "cache")
+        os.makedirs(base_dir)
+        write_project(base_dir, args.modules, args.functions, args.seed)
+        print(f"{args.modules} modules of {args.functions} functions")
+        for label, cache in (
+            ("no cache", None),
+            ("cold", cache_dir),
+            ("warm", cache_dir),
+        ):
+            parsing, flows = run(base_dir, cache)
+            print(f"{label:<9} parse: {parsing:.2f}s  flows: {flows:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
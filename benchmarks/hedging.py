@@ -0,0 +1,97 @@
+"""
+Hedging benchmark for the Llm batch completions.
+
+Runs a phase of requests against a simulated client whose latencies have a slow
+tail, with and without hedging, and reports the wall time of the phase and the
+latency percentiles of the requests. The latencies are drawn from a seeded random
+generator, so that the runs are reproducible.
+
+Usage: python benchmarks/hedging.py [--requests N] [--slow-fraction F] [--seed S]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from pycodedoc.llm import Llm  # noqa: E402
+
+
+class SimulatedClient:
+    """answers every request after a fast latency or, once in a while, a slow one"""
+
+    def __init__(self, rng: random.Random, slow_fraction: float, slow_latency: float):
+        self.rng = rng
+        self.slow_fraction = slow_fraction
+        self.slow_latency = slow_latency
+        self.requests = 0
+        # the start of the first attempt of each request, hedged or not
+        self.starts = {}
+        self.chat = self.completions = self
+
+    async def create(self, messages, model, **kwargs):
+        self.requests += 1
+        self.starts.setdefault(id(messages), time.perf_counter())
+        latency = self.rng.uniform(0.05, 0.15)
+        if self.rng.random() < self.slow_fraction:
+            latency = self.slow_latency
+        await asyncio.sleep(latency)
+        return {"role": "assistant", "content": "description"}
+
+
+async def run_phase(args, hedge: bool):
+    client = SimulatedClient(
+        random.Random(args.seed), args.slow_fraction, args.slow_latency
+    )
+    llm = Llm(hedge=hedge, adaptive_timeout=False)
+    latencies = []
+    messages = [
+        [{"role": "user", "content": f"describe {i}"}] for i in range(args.requests)
+    ]
+
+    def on_response(i, response):
+        latencies.append(time.perf_counter() - client.starts[id(messages[i])])
+
+    start = time.perf_counter()
+    async with llm.async_session(client=client):
+        await llm.arun_batch_completions(
+            messages, args.max_in_flight, on_response=on_response
+        )
+    return time.perf_counter() - start, latencies, client.requests
+
+
+def percentile(values: list, percentile: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percentile / 100))]
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument("--requests", type=int, default=200)
+    argparser.add_argument("--max-in-flight", type=int, default=20)
+    argparser.add_argument("--slow-fraction", type=float, default=0.04)
+    argparser.add_argument("--slow-latency", type=float, default=2.0)
+    argparser.add_argument("--seed", type=int, default=0)
+    args = argparser.parse_args()
+
+    print(
+        f"{args.requests} requests, {args.max_in_flight} in flight, "
+        f"{args.slow_fraction:.0%} taking {args.slow_latency}s"
+    )
+    for hedge in (False, True):
+        elapsed, latencies, sent = asyncio.run(run_phase(args, hedge))
+        print(
+            f"hedge={str(hedge):<6} phase: {elapsed:.2f}s  "
+            f"p50: {statistics.median(latencies):.2f}s  "
+            f"p95: {percentile(latencies, 95):.2f}s  "
+            f"max: {max(latencies):.2f}s  requests sent: {sent}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Startup benchmark for the pycodedoc CLI.
+
+Measures the wall time of the light CLI commands (--help, --configure) and the
+import time of the CLI entry point, and checks that none of the heavy
+dependencies are imported on those paths.
+
+Usage: python benchmarks/startup.py [--runs N]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+HEAVY_MODULES = ["openai", "tiktoken", "code2flow", "tqdm", "pycodedoc.docgen"]
+
+CHECK_IMPORTS = """
+import sys
+from typer.testing import CliRunner
+from pycodedoc.cli import app
+CliRunner().invoke(app, {args!r})
+print(",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def run(args: list, cwd: str = None):
+    env = dict(os.environ, PYTHONPATH=SRC_DIR)
+    env.pop("OPENAI_API_KEY", None)
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, *args], env=env, cwd=cwd, capture_output=True, text=True
+    )
+    return time.perf_counter() - start, result
+
+
+def time_command(cli_args: list, runs: int, cwd: str = None):
+    timings = []
+    for _ in range(runs):
+        elapsed, _ = run(["-m", "pycodedoc.cli", *cli_args], cwd=cwd)
+        timings.append(elapsed)
+    return statistics.median(timings)
+
+
+def import_time():
+    _, result = run(["-X", "importtime", "-c", "import pycodedoc.cli"])
+    for line in result.stderr.splitlines():
+        if line.rstrip().endswith("| pycodedoc.cli"):
+            return int(line.split("|")[1]) / 1e6
+    return None
+
+
+def heavy_imports(cli_args: list, cwd: str = None):
+    code = CHECK_IMPORTS.format(args=cli_args, heavy=HEAVY_MODULES)
+    _, result = run(["-c", code], cwd=cwd)
+    return result.stdout.strip()
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument("--runs", type=int, default=5)
+    args = argparser.parse_args()
+
+    baseline, _ = run(["-c", "pass"])
+    print(f"interpreter startup:       {baseline:.3f}s")
+    print(f"import pycodedoc.cli:      {import_time():.3f}s")
+    print(f"pycodedoc --help:          {time_command(['--help'], args.runs):.3f}s")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        configure_time = time_command(["--configure"], args.runs, cwd=tmpdir)
+        print(f"pycodedoc --configure:     {configure_time:.3f}s")
+        for cli_args in (["--help"], ["--configure"]):
+            imported = heavy_imports(cli_args, cwd=tmpdir)
+            status = f"heavy imports: {imported}" if imported else "no heavy imports"
+            print(f"{' '.join(cli_args):<26} {status}")
+
+
+if __name__ == "__main__":
+    main()
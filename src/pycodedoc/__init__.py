@@ -1,2 +1,11 @@
 __version__ = "0.1.0"
-from .docgen import DocGen  # noqa
+
+
+def __getattr__(name):
+    # DocGen pulls in pydantic, tenacity and rich: only import it when requested so
+    # that the CLI can answer --help and --configure without paying for it
+    if name == "DocGen":
+        from .docgen import DocGen
+
+        return DocGen
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,102 @@
+import asyncio
+import os
+from typing import List
+
+import toml
+
+from pycodedoc.docgen import DocGen
+from pycodedoc.llm import Llm
+from pycodedoc.utils import set_logger
+
+logger = set_logger()
+
+
+def load_manifest(manifest_path: str) -> List[dict]:
+    """
+    Loads the repositories to document from a TOML manifest, as a list of DocGen
+    arguments. Each [[repos]] table needs a base_dir, the other DocGen arguments being
+    optional. Relative paths are relative to the directory of the manifest, and each
+    repository needs its own descriptions_db, as the descriptions are stored by path.
+    """
+    with open(manifest_path, "r") as f:
+        repos = toml.load(f).get("repos", [])
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+    for repo in repos:
+        if "base_dir" not in repo:
+            raise ValueError(f"A repository of {manifest_path} has no base_dir.")
+        if "llm" in repo:
+            raise ValueError("The llm settings are shared by all the repositories.")
+        for key in ["base_dir", "output_dir", "descriptions_db"]:
+            if repo.get(key):
+                repo[key] = os.path.join(manifest_dir, repo[key])
+        repo.setdefault("output_dir", os.path.join(repo["base_dir"], "docs"))
+    databases = [
+        repo["descriptions_db"] for repo in repos if repo.get("descriptions_db")
+    ]
+    if len(set(map(os.path.normpath, databases))) < len(databases):
+        raise ValueError(f"Repositories of {manifest_path} share a descriptions_db.")
+    return repos
+
+
+async def adocument_repos(repos: List[dict], llm: Llm, max_repos: int = 8):
+    """
+    Documents several repositories concurrently, each one by its own DocGen instance.
+
+    The DocGen instances share the llm, hence its client, max_concurrency and max_cost,
+    so that the requests of all the repositories are interleaved under a single limit.
+    A repository failing does not stop the others.
+
+    Args:
+        repos (List[dict]): The arguments of the DocGen instance of each repository.
+        llm (Llm): The language model shared by the repositories.
+        max_repos (int, optional): The maximum number of repositories documented at the same time. Defaults to 8.
+
+    Returns:
+        dict: The error of each repository which could not be documented, by base directory.
+    """
+    semaphore = asyncio.Semaphore(max_repos)
+    errors = {}
+
+    async def document_repo(repo: dict):
+        async with semaphore:
+            logger.info("DOCUMENTING %s", repo["base_dir"])
+            try:
+                if not os.path.isdir(repo["base_dir"]):
+                    raise FileNotFoundError(f"{repo['base_dir']} is not a directory.")
+                os.makedirs(repo["output_dir"], exist_ok=True)
+                # parsing the repository would stall the requests of the others
+                docgen = await asyncio.to_thread(DocGen, **repo, llm=llm)
+                await docgen.agenerate_documentation()
+            except Exception as e:
+                logger.error("Could not document %s: %r", repo["base_dir"], e)
+                errors[repo["base_dir"]] = e
+
+    async with llm.async_session():
+        await asyncio.gather(*(document_repo(repo) for repo in repos))
+    logger.info(
+        "DOCUMENTED %s OF %s REPOSITORIES", len(repos) - len(errors), len(repos)
+    )
+    return errors
+
+
+def document_repos(
+    manifest_path: str, docgen_kwargs: dict = None, max_repos: int = 8
+) -> dict:
+    """
+    Documents the repositories of a manifest in this process, the manifest's arguments
+    of each repository overriding the docgen_kwargs shared by all of them.
+    """
+    docgen_kwargs = dict(docgen_kwargs or {})
+    if docgen_kwargs.get("descriptions_db"):
+        raise ValueError(
+            "A descriptions_db cannot be shared by the repositories of a manifest, "
+            "give one to each repository in the manifest instead."
+        )
+    llm = docgen_kwargs.pop("llm", None)
+    if not isinstance(llm, Llm):
+        llm = Llm(**(llm or {}))
+    if llm.max_concurrency is None:
+        # a single limit for all the repositories rather than one per batch
+        llm.max_concurrency = llm.batch_size
+    repos = [{**docgen_kwargs, **repo} for repo in load_manifest(manifest_path)]
+    return asyncio.run(adocument_repos(repos, llm, max_repos))
@@ -0,0 +1,126 @@
+"""
+On-disk cache of the parsed modules and execution flows, similar in spirit to
+__pycache__: the entries are keyed by the hash of the files' content and of the
+versions of the tools producing them, so that they never need to be invalidated.
+
+The entries are pickles, which run code when loaded: the cache lives in the user's
+cache directory rather than in the documented project, where anyone able to commit
+could plant entries, and is never read from within the documented tree.
+"""
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+from functools import lru_cache
+
+from pydantic import BaseModel, PrivateAttr
+
+from pycodedoc.utils import paused_gc, set_logger
+
+# bump when the format of the cached objects changes
+CACHE_VERSION = 3
+
+logger = set_logger()
+
+
+def get_user_cache_dir() -> str:
+    """the per-user cache directory of pycodedoc, e.g. ~/.cache/pycodedoc on Linux"""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~/AppData/Local")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "pycodedoc")
+
+
+def is_within(path: str, directory: str) -> bool:
+    path, directory = os.path.realpath(path), os.path.realpath(directory)
+    return os.path.commonpath([path, directory]) == directory
+
+
+@lru_cache(maxsize=None)
+def get_tool_version(namespace: str) -> str:
+    from pycodedoc import __version__
+
+    version = (
+        f"{CACHE_VERSION}-{__version__}-py{sys.version_info[0]}.{sys.version_info[1]}"
+    )
+    if namespace == "flows":
+        from importlib.metadata import version as package_version
+
+        version += f"-code2flow{package_version('code2flow')}"
+    elif namespace == "tokens":
+        from importlib.metadata import version as package_version
+
+        version += f"-tiktoken{package_version('tiktoken')}"
+    return version
+
+
+class Cache(BaseModel):
+    """
+    Stores pickled objects under cache_dir/<namespace>/<key>.pickle.
+
+    Attributes:
+        cache_dir (str): The directory of the cache, created with a .gitignore ignoring it when first written to.
+    """
+
+    cache_dir: str
+    _created: bool = PrivateAttr(default=False)
+
+    def get_key(
+        self, namespace: str, paths: list, base_dir: str = "", variant: str = ""
+    ) -> str:
+        """
+        hashes the paths and content of the files with the versions of the tools, the
+        paths being relative to base_dir. The variant distinguishes the entries computed
+        from the same files with different settings.
+        """
+        digest = hashlib.sha256(f"{get_tool_version(namespace)}{variant}".encode())
+        for path in paths:
+            digest.update(path.encode() + b"\0")
+            with open(os.path.join(base_dir, path), "rb") as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        return digest.hexdigest()
+
+    def get_file(self, namespace: str, key: str) -> str:
+        return os.path.join(self.cache_dir, namespace, f"{key}.pickle")
+
+    def load(self, namespace: str, key: str):
+        """returns the cached object, or None if missing or unreadable"""
+        try:
+            with open(self.get_file(namespace, key), "rb") as f, paused_gc():
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.debug("Ignoring unreadable cache entry %s: %r", key, e)
+            return None
+
+    def create(self):
+        """creates the cache directory, ignored by git wherever it is"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        gitignore = os.path.join(self.cache_dir, ".gitignore")
+        if not os.path.exists(gitignore):
+            with open(gitignore, "w") as f:
+                f.write("*\n")
+        self._created = True
+
+    def save(self, namespace: str, key: str, value):
+        file_path, tmp_path = self.get_file(namespace, key), None
+        try:
+            if not self._created:
+                self.create()
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            # written to a temporary file first so that concurrent runs (e.g. shards)
+            # never read a partially written entry
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path))
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, file_path)
+        except Exception as e:
+            # e.g. read-only file systems or ASTs too deep to be pickled
+            logger.debug("Could not cache %s: %r", key, e)
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -1,11 +1,9 @@
 import os
+from typing import List
 
 import toml
 import typer
 
-from pycodedoc.costs import estimate_cost
-from pycodedoc.docgen import DocGen
-
 app = typer.Typer()
 
 
@@ -31,6 +29,16 @@ def main(
     no_graphs: bool = typer.Option(
         False, "--no-graphs", "-ng", help="Do not create execution graphs of the code"
     ),
+    graph_max_nodes: int = typer.Option(
+        50,
+        "--graph-max-nodes",
+        help="Reduce the execution graphs exceeding this number of nodes, 0 for no limit",
+    ),
+    graph_split: bool = typer.Option(
+        False,
+        "--graph-split",
+        help="Write the execution graph of each module as an overview and a graph per class",
+    ),
     no_relations: bool = typer.Option(
         False,
         "--no-relations",
@@ -58,46 +66,272 @@ def main(
         "-e",
         help="Prints estimation cost of generating the documentation",
     ),
+    sample: int = typer.Option(
+        None,
+        "--sample",
+        min=1,
+        help="With --estimate, only analyze this number of modules and extrapolate to the project",
+    ),
     configure: bool = typer.Option(
         False, "--configure", "-c", help="Configure the prompts file"
     ),
+    watch: bool = typer.Option(
+        False,
+        "--watch",
+        "-w",
+        help="Keep running and update the documentation whenever the code changes",
+    ),
+    shards: int = typer.Option(
+        0,
+        "--shards",
+        "-s",
+        help="Split the project into this number of shards documented in parallel",
+    ),
+    shard_index: int = typer.Option(
+        None,
+        "--shard-index",
+        help="Only document this shard (from 0) and write its partial results",
+    ),
+    merge: bool = typer.Option(
+        False,
+        "--merge",
+        help="Merge the partial results of all the shards into the documentation",
+    ),
+    workers: int = typer.Option(
+        None,
+        "--workers",
+        help="The number of local processes used for documenting the shards",
+    ),
+    package_rollup: bool = typer.Option(
+        False,
+        "--package-rollup",
+        "-pr",
+        help="Summarize packages level by level and build the overview from them",
+    ),
+    small_model: str = typer.Option(
+        None,
+        "--small-model",
+        help="Route small prompts to this fast and cheap model",
+    ),
+    long_model: str = typer.Option(
+        None,
+        "--long-model",
+        help="Route prompts exceeding the model's context window to this model",
+    ),
+    hedge: bool = typer.Option(
+        False,
+        "--hedge",
+        help="Send a duplicate of the requests exceeding the p95 latency",
+    ),
+    deps_budget: int = typer.Option(
+        None,
+        "--deps-budget",
+        help="The maximum number of tokens of code (the module, its execution graph and its dependencies) used for describing modules relations",
+    ),
+    deps_summaries: bool = typer.Option(
+        False,
+        "--deps-summaries",
+        help="Describe the dependencies of each module by their descriptions and signatures instead of their code",
+    ),
+    descriptions_db: str = typer.Option(
+        None,
+        "--descriptions-db",
+        help="Store the descriptions in this SQLite file instead of memory, reusable by later runs",
+    ),
+    max_cost: float = typer.Option(
+        None,
+        "--max-cost",
+        help="Stop sending requests once this cost in $ would be exceeded",
+    ),
+    no_cache: bool = typer.Option(
+        False,
+        "--no-cache",
+        help="Do not cache the parsed modules and execution flows in the user's cache directory",
+    ),
+    resume: bool = typer.Option(
+        False,
+        "--resume",
+        help="Only generate the descriptions missing from the --descriptions-db file",
+    ),
+    include: List[str] = typer.Option(
+        None,
+        "--include",
+        "-i",
+        help="Only document the modules matching this glob or directory (repeatable)",
+    ),
+    entry: List[str] = typer.Option(
+        None,
+        "--entry",
+        help="Only document this module and the modules it imports (repeatable)",
+    ),
+    use_docstrings: bool = typer.Option(
+        False,
+        "--use-docstrings",
+        help="Use the existing docstrings of functions and classes as their descriptions",
+    ),
+    prefix_caching: bool = typer.Option(
+        False,
+        "--prefix-caching",
+        help="Start the prompts about a module with its code, for providers caching prompt prefixes",
+    ),
+    manifest: str = typer.Option(
+        None,
+        "--manifest",
+        help="Document the repositories listed in this TOML manifest in a single process",
+    ),
+    max_repos: int = typer.Option(
+        8,
+        "--max-repos",
+        help="The maximum number of repositories of the manifest documented at the same time",
+    ),
+    max_concurrency: int = typer.Option(
+        None,
+        "--max-concurrency",
+        help="The maximum number of requests in flight, across all the repositories of the manifest",
+    ),
+    record: str = typer.Option(
+        None,
+        "--record",
+        help="Record the requests and responses to this trace file",
+    ),
+    replay: str = typer.Option(
+        None,
+        "--replay",
+        help="Replay the responses recorded in this trace file instead of calling the API",
+    ),
+    replay_latency: bool = typer.Option(
+        False,
+        "--replay-latency",
+        help="Replay the responses with their recorded latencies rather than instantly",
+    ),
 ):
-    if base_dir == "" and configure is False:
+    if base_dir == "" and configure is False and manifest is None:
         typer.echo(
             "Please provide a directory to document with the --dir or -d option. Use 'pycodedoc --help' for more information."
         )
         raise typer.Abort()
     if os.path.exists("prompts.toml"):
         prompts = load_prompts("prompts.toml")
-        docgen = DocGen(
-            base_dir=base_dir,
-            prompts=prompts,
-            create_graphs=not no_graphs,
-            no_relations=no_relations,
-            no_classes=no_classes,
-            use_structure=use_structure,
-            output_dir=output_dir,
-            model=model,
-        )
+        # the execution settings are stored next to the prompts
+        profiles = prompts.pop("profiles", None)
+        router = prompts.pop("router", {})
     else:
-        docgen = DocGen(
-            base_dir=base_dir,
-            create_graphs=not no_graphs,
-            no_relations=no_relations,
-            no_classes=no_classes,
-            use_structure=use_structure,
-            output_dir=output_dir,
-            model=model,
+        prompts, profiles, router = None, None, {}
+    if configure:
+        # only the prompts are needed here, no need to parse the codebase
+        from pycodedoc.profiles import PROFILES
+        from pycodedoc.prompts import PROMPTS
+
+        content = dict(
+            prompts or PROMPTS,
+            profiles=profiles or PROFILES,
+            router=router or {"small_max_tokens": 500},
         )
-    if estimate:
+        write_prompts(content, "prompts.toml")
         typer.echo(
-            f"Estimated cost of generating the documentation: ${estimate_cost(docgen)}"
+            "Prompts file written to prompts.toml. Modify the file as needed and make sure to execute 'pycodedoc' from the same directory as the file."
         )
-    elif configure:
-        write_prompts(docgen.prompts, "prompts.toml")
+        return
+    docgen_kwargs = dict(
+        base_dir=base_dir,
+        create_graphs=not no_graphs,
+        graph_reducer={
+            "max_nodes": graph_max_nodes or None,
+            "max_edges": 2 * graph_max_nodes or None,
+            "split": graph_split,
+        },
+        no_relations=no_relations,
+        no_classes=no_classes,
+        use_structure=use_structure,
+        output_dir=output_dir,
+        model=model,
+        package_rollup=package_rollup,
+        deps_token_budget=deps_budget,
+        deps_summaries=deps_summaries,
+        descriptions_db=descriptions_db,
+        resume=resume,
+        use_docstrings=use_docstrings,
+        prefix_caching=prefix_caching,
+        include=include or None,
+        entries=entry or None,
+        no_cache=no_cache,
+        llm={
+            "hedge": hedge,
+            "max_cost": max_cost,
+            "record_trace": record,
+            "replay_trace": replay,
+            "replay_latency": replay_latency,
+            "max_concurrency": max_concurrency,
+        },
+        router=dict(
+            router,
+            **({"small_model": small_model} if small_model else {}),
+            **({"long_model": long_model} if long_model else {}),
+        ),
+        **({"prompts": prompts} if prompts is not None else {}),
+        **({"profiles": profiles} if profiles is not None else {}),
+    )
+    if manifest is not None:
+        from pycodedoc.batch import document_repos
+
+        if descriptions_db:
+            typer.echo(
+                "The --descriptions-db option cannot be used with --manifest, give a descriptions_db to each repository in the manifest instead."
+            )
+            raise typer.Abort()
+        docgen_kwargs.pop("base_dir")
+        errors = document_repos(manifest, docgen_kwargs, max_repos)
+        if errors:
+            raise typer.Exit(code=1)
+        return
+    if shards and (include or entry):
+        typer.echo("The --include and --entry options cannot be used with --shards.")
+        raise typer.Abort()
+    if shards and watch and not estimate:
+        typer.echo("The --watch option cannot be used with --shards.")
+        raise typer.Abort()
+    if shards and record and not estimate:
+        # the shards would append to the same trace, and their processes exit without
+        # closing it, truncating compressed traces
+        typer.echo("The --record option cannot be used with --shards.")
+        raise typer.Abort()
+    if sample is not None and (not estimate or include or entry):
         typer.echo(
-            "Prompts file written to prompts.toml. Modify the file as needed and make sure to execute 'pycodedoc' from the same directory as the file."
+            "The --sample option requires --estimate and cannot be used with --include or --entry."
         )
+        raise typer.Abort()
+    if shards and not estimate:
+        from pycodedoc.shard import document_shard, merge_shards, run_sharded
+
+        if shard_index is not None:
+            file_path = document_shard(docgen_kwargs, shard_index, shards)
+            typer.echo(f"Partial results of shard {shard_index} written to {file_path}")
+        elif merge:
+            merge_shards(docgen_kwargs, shards)
+        else:
+            run_sharded(docgen_kwargs, shards, workers)
+        return
+    # heavy imports are deferred until a codebase actually needs to be processed
+    from pycodedoc.docgen import DocGen
+
+    if sample is not None:
+        from pycodedoc.sampling import estimate_sampled_cost
+
+        # only the sampled modules are parsed
+        docgen = DocGen(**docgen_kwargs, modules_paths=[])
+        typer.echo(estimate_sampled_cost(docgen, sample).format())
+        return
+    docgen = DocGen(**docgen_kwargs)
+    if estimate:
+        from pycodedoc.costs import estimate_cost
+
+        typer.echo(
+            f"Estimated cost of generating the documentation: ${estimate_cost(docgen)}"
+        )
+    elif watch:
+        from pycodedoc.watch import Watcher
+
+        Watcher(docgen=docgen).run()
     else:
         docgen.generate_documentation()
 
@@ -0,0 +1,229 @@
+import ast
+import os
+from collections import defaultdict
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+from pycodedoc.costs import MODEL_INFO, count_tokens
+from pycodedoc.parser import Module, Parser
+from pycodedoc.skeleton import function_structure, render_selected, render_summary
+from pycodedoc.utils import set_logger
+
+logger = set_logger()
+
+
+class DepsContext(BaseModel):
+    """
+    The code of the dependencies passed as context for describing a module's relations,
+    together with the entities which had to be summarized or dropped to fit the budget.
+    """
+
+    code: str
+    budget: Optional[int] = None
+    tokens: int = 0
+    summarized: List[str] = Field(default_factory=list)
+    dropped: List[str] = Field(default_factory=list)
+
+
+class ContextBuilder(BaseModel):
+    """
+    The ContextBuilder class selects the code of the dependencies of a module to pass as
+    context while staying within a token budget.
+
+    When the code of all the related entities does not fit, the entities are ranked by
+    the number of calls between them and the module (calls between two dependencies
+    weigh less) and by the proximity of their package to the module's one. The best
+    ranked entities are added with their code, then as signatures with their generated
+    descriptions, and the remaining ones are dropped.
+
+    With summaries, the dependencies are never passed as code: each one is described by
+    its generated module description and the signatures of its related entities with
+    their descriptions, the entities being ranked likewise when exceeding the budget.
+    A module imported by many others is then described by its summary in their prompts
+    rather than by its code.
+
+    Attributes:
+        model (str): The model the prompts are sent to, whose context window sets the default budget.
+        budget (int): The maximum number of tokens of the prompt's code context: the module's code, or the prefix replacing it, its execution graph and the dependencies' code. Default is half of the model's context window.
+        summaries (bool): Describe the dependencies by their descriptions and signatures instead of their code. Default is False.
+        reports (dict): The DepsContext built for each module path, recording what was summarized or dropped.
+    """
+
+    model: str
+    budget: Optional[int] = None
+    summaries: bool = False
+    reports: dict = Field(default_factory=dict)
+
+    def get_budget(self) -> Optional[int]:
+        if self.budget is not None:
+            return self.budget
+        if self.model in MODEL_INFO:
+            return MODEL_INFO[self.model]["context"] // 2
+        return None
+
+    def build(
+        self,
+        parser: Parser,
+        module: Module,
+        module_code: str,
+        deps: List[Module],
+        nodes: list,
+        edges: list,
+        execution_graph: str,
+        deps_code: str,
+        descriptions: dict = None,
+        modules_descriptions: dict = None,
+        prefix: str = None,
+    ) -> DepsContext:
+        """
+        Returns the dependencies' code as is if it fits in the budget, otherwise selects
+        the entities to include as explained in the class docstring.
+
+        Args:
+            descriptions (dict, optional): The descriptions already generated for the entities, by module path.
+            modules_descriptions (dict, optional): The descriptions already generated for the modules, used with summaries.
+            prefix (str, optional): The context starting the prompt in place of the module's code, e.g. with prefix caching.
+        """
+        budget = self.get_budget()
+        if budget is not None:
+            module_code = module_code if prefix is None else prefix
+            budget -= count_tokens(module_code + execution_graph, self.model)
+        if self.summaries:
+            context = self.select(
+                parser,
+                module,
+                deps,
+                nodes,
+                edges,
+                budget,
+                descriptions or {},
+                modules_descriptions or {},
+            )
+        elif budget is None:
+            context = DepsContext(code=deps_code)
+        else:
+            tokens = count_tokens(deps_code, self.model)
+            if tokens <= budget:
+                context = DepsContext(code=deps_code, budget=budget, tokens=tokens)
+            else:
+                context = self.select(
+                    parser, module, deps, nodes, edges, budget, descriptions or {}
+                )
+        if context.summarized or context.dropped:
+            logger.info(
+                "Context of %s exceeds %s tokens: summarized %s and dropped %s entities",
+                module.path,
+                budget,
+                len(context.summarized),
+                len(context.dropped),
+            )
+        self.reports[module.path] = context
+        return context
+
+    def select(
+        self,
+        parser: Parser,
+        module: Module,
+        deps: List[Module],
+        nodes: list,
+        edges: list,
+        budget: Optional[int],
+        descriptions: dict,
+        modules_descriptions: dict = None,
+    ) -> DepsContext:
+        deps_by_path, functions = {}, {}
+        for i, dep in enumerate(deps):
+            # modules sharing a name in different packages are told apart by path
+            deps_by_path[os.path.normpath(dep.path)] = dep
+            for function in parser.get_functions(dep.path):
+                functions[(dep.path, function.uname)] = (i, function)
+        weights = self.get_weights(module, edges)
+        candidates = []
+        for node in nodes:
+            dep = deps_by_path.get(node.file_path)
+            key = (dep.path, self.get_uname(node)) if dep else None
+            if key in functions:
+                dep_index, function = functions[key]
+                score = weights[node] / (1 + self.get_distance(module.path, dep.path))
+                # highest scores first, source order of the dependencies on equal scores
+                candidates.append(((-score, dep_index, function.node.lineno), key))
+        candidates.sort()
+
+        context = DepsContext(code="", budget=budget)
+
+        def fits(tokens: int) -> bool:
+            return budget is None or context.tokens + tokens <= budget
+
+        full, stubs = defaultdict(set), defaultdict(set)
+        for _, (dep_path, uname) in candidates:
+            function = functions[(dep_path, uname)][1]
+            if not self.summaries:
+                sizes = parser.get_token_sizes(dep_path, self.model)
+                code_tokens = sizes.code(function)
+                if fits(code_tokens):
+                    full[dep_path].add(uname)
+                    context.tokens += code_tokens
+                    continue
+            stub = function_structure(function.node, descriptions.get(dep_path), uname)
+            stub_tokens = count_tokens(ast.unparse(stub), self.model)
+            if self.summaries and not stubs[dep_path]:
+                # the description of the module comes with its first entity
+                description = modules_descriptions.get(dep_path) or ""
+                stub_tokens += count_tokens(description, self.model)
+            if fits(stub_tokens):
+                stubs[dep_path].add(uname)
+                context.tokens += stub_tokens
+                if not self.summaries:
+                    context.summarized.append(f"{dep_path}:{uname}")
+            else:
+                context.dropped.append(f"{dep_path}:{uname}")
+
+        for dep in deps:
+            if self.summaries and stubs[dep.path]:
+                context.code += f"\n\nFILE {dep.name}.py:\n\n"
+                context.code += render_summary(
+                    dep.node,
+                    stubs[dep.path],
+                    descriptions=descriptions.get(dep.path),
+                    description=modules_descriptions.get(dep.path),
+                )
+            elif full[dep.path] or stubs[dep.path]:
+                context.code += f"\n\nFILE {dep.name}.py:\n\n"
+                context.code += render_selected(
+                    dep.node,
+                    full[dep.path],
+                    stubs[dep.path],
+                    descriptions=descriptions.get(dep.path),
+                    strip_imports=parser.strip_imports,
+                    strip_globals=parser.strip_globals,
+                )
+        return context
+
+    def get_weights(self, module: Module, edges: list):
+        """calls between the module and a dependency weigh twice as much as other calls"""
+        weights = defaultdict(int)
+        module_path = os.path.normpath(module.path)
+        for edge in edges:
+            weight = (
+                2 if module_path in (edge.node0.file_path, edge.node1.file_path) else 1
+            )
+            weights[edge.node0] += weight
+            weights[edge.node1] += weight
+        return weights
+
+    def get_distance(self, module_path: str, dep_path: str):
+        """the number of directories separating the packages of the two modules"""
+        module_dirs = os.path.dirname(module_path).split(os.sep)
+        dep_dirs = os.path.dirname(dep_path).split(os.sep)
+        common = 0
+        for module_dir, dep_dir in zip(module_dirs, dep_dirs):
+            if module_dir != dep_dir:
+                break
+            common += 1
+        return len(module_dirs) + len(dep_dirs) - 2 * common
+
+    def get_uname(self, node):
+        if node.parent.group_type == "CLASS":
+            return f"{node.parent.token}.{node.token}"
+        return node.token
@@ -1,8 +1,11 @@
-import ast
+import os
+from collections import defaultdict
+from typing import TYPE_CHECKING
 
-import tiktoken
+from pycodedoc.tokens import get_token_index
 
-from pycodedoc.docgen import DocGen
+if TYPE_CHECKING:
+    from pycodedoc.docgen import DocGen
 
 MODEL_INFO = {
     "gpt-4-0125-preview": {"context": 128192, "inprice": 0.01, "outprice": 0.03},
@@ -33,64 +36,174 @@ def calculate_cost(intokens, outtokens, model):
 
 
 def count_tokens(text: str, model: str):
-    encoding = tiktoken.encoding_for_model(model)
-    return len(encoding.encode(text))
+    return get_token_index(model).count(text)
 
 
-def estimate_cost(docgen: DocGen):
+# the output tokens expected from the requests of each phase
+OUTPUT_TOKENS = {
+    "docstrings": 10,
+    "functions": 10,
+    "classes": 10,
+    "modules": 50,
+    "modules_deps": 50,
+    "packages": 80,
+    "project": 50,
+}
+# assuming 100 tokens description length per module
+MODULE_DESCRIPTION_TOKENS = 100
+
+
+def estimate_cost(docgen: "DocGen"):
+    # None unless only some modules are documented
+    scope = docgen.get_scope()
     cost = 0
+    for module in docgen.parser.get_modules(scope):
+        for estimate in estimate_module(docgen, module).values():
+            cost += estimate["cost"]
+    if docgen.package_rollup:
+        cost += estimate_packages(docgen, scope)["cost"]
+    cost += estimate_project(docgen)["cost"]
+    return round(cost, 6)
+
+
+def get_phase_model(docgen: "DocGen", phase: str, intokens: int = None) -> str:
+    """
+    the model a request of the phase is sent to, following the phase's profile and,
+    given the size of the prompt, the router
+    """
+    profile = docgen.get_profile(phase)
+    model = profile.model or docgen.model
+    if intokens is None:
+        return model
+    return docgen.router.route_tokens(intokens, model, profile.max_tokens)
+
+
+def get_packages_sizes(modules_paths: list) -> dict:
+    """
+    the number of modules and subpackages of each package of the modules, as package
+    path -> (modules, subpackages), the project's root being the "" package
+    """
+    modules, subpackages = defaultdict(int), defaultdict(set)
+    for path in modules_paths:
+        package_path = os.path.dirname(path)
+        modules[package_path] += 1
+        while package_path:
+            parent_path = os.path.dirname(package_path)
+            subpackages[parent_path].add(package_path)
+            package_path = parent_path
+    return {
+        path: (modules[path], len(subpackages[path]))
+        for path in set(modules) | set(subpackages)
+    }
+
+
+def estimate_packages(docgen: "DocGen", modules_paths: list = None) -> dict:
+    """
+    estimates the packages summaries of the package rollup, one request per package,
+    from the descriptions of its modules and subpackages
+    """
+    if modules_paths is None:
+        modules_paths = docgen.parser.get_modules_paths()
+    estimate = {"cost": 0.0, "requests": 0}
+    for path, (modules, subpackages) in get_packages_sizes(modules_paths).items():
+        # the project's root is described by the project overview
+        if not path:
+            continue
+        intokens = (
+            modules * MODULE_DESCRIPTION_TOKENS
+            + subpackages * OUTPUT_TOKENS["packages"]
+        )
+        model = get_phase_model(docgen, "packages", intokens)
+        estimate["cost"] += calculate_cost(intokens, OUTPUT_TOKENS["packages"], model)
+        estimate["requests"] += 1
+    return estimate
+
+
+def estimate_project(docgen: "DocGen") -> dict:
+    modules_paths = docgen.parser.get_modules_paths()
+    if docgen.package_rollup:
+        # the overview is built from the top-level packages and the root modules
+        modules, subpackages = get_packages_sizes(modules_paths).get("", (0, 0))
+        intokens = (
+            modules * MODULE_DESCRIPTION_TOKENS
+            + subpackages * OUTPUT_TOKENS["packages"]
+        )
+    else:
+        intokens = len(modules_paths) * MODULE_DESCRIPTION_TOKENS
+    model = get_phase_model(docgen, "project", intokens)
+    cost = calculate_cost(intokens, OUTPUT_TOKENS["project"], model)
+    return {"cost": cost, "requests": 1}
+
+
+def estimate_module(docgen: "DocGen", module) -> dict:
+    """
+    estimates the cost and number of requests of each phase for a module, as
+    phase -> {"cost", "requests"}, from the token sizes precomputed by the parser.
+    Each request is priced at the model of its phase, routed by the size of its prompt.
+    """
+    estimates = {
+        phase: {"cost": 0.0, "requests": 0}
+        for phase in ["docstrings", "functions", "classes", "modules", "modules_deps"]
+    }
+    sizes = docgen.parser.get_token_sizes(module.path, docgen.model)
+
+    def add(phase: str, intokens: int):
+        outtokens = OUTPUT_TOKENS[phase]
+        model = get_phase_model(docgen, phase, intokens)
+        estimates[phase]["cost"] += calculate_cost(intokens, outtokens, model)
+        estimates[phase]["requests"] += 1
+
+    # with prefix caching, the prompts start with the code of their module, counted at
+    # full price as the share of it served from the provider's cache is unknown
+    context_tokens = sizes.module if docgen.prefix_caching else 0
+    classes = [entity for entity in module.entities if entity.type == "class"]
     # estimate functions descriptions costs
     if docgen.use_structure:
-        functions_code = docgen.parser.get_functions(attr="code")
-        for function_code in functions_code:
-            cost += calculate_cost(
-                intokens=count_tokens(function_code, docgen.model),
-                outtokens=10,
-                model=docgen.model,
-            )
+        for entity in module.entities:
+            functions = entity.methods if entity.type == "class" else [entity]
+            for function in functions:
+                # meaningful docstrings are used as is, only the long ones summarized
+                docstring = docgen.get_docstring(function)
+                if docstring is None:
+                    intokens = sizes.code(function)
+                    add("functions", intokens + context_tokens)
+                elif docgen.needs_summary(docstring):
+                    add("docstrings", sizes.docstring(function))
     # estimate classes descriptions costs
     if not docgen.no_classes:
-        docgen._descriptions.entities = None
-        for class_ in docgen.parser.get_classes():
+        for class_ in classes:
+            docstring = docgen.get_docstring(class_)
+            if docstring is not None:
+                if docgen.needs_summary(docstring):
+                    add("docstrings", sizes.docstring(class_))
+                continue
             if docgen.use_structure:
-                class_code = docgen.parser.get_code_structure(class_)
+                intokens = sizes.class_structure(class_)
             else:
-                class_code = ast.unparse(class_.node)
-            cost += calculate_cost(
-                intokens=count_tokens(class_code, docgen.model),
-                outtokens=10,
-                model=docgen.model,
-            )
+                intokens = sizes.code(class_)
+            add("classes", intokens + context_tokens)
     # estimate modules descriptions costs
-    for module in docgen.parser.get_modules():
-        if docgen.use_structure:
-            module_code = docgen.parser.get_code_structure(module)
-        else:
-            module_code = ast.unparse(module.node)
-        cost += calculate_cost(
-            intokens=count_tokens(module_code, docgen.model),
-            outtokens=50,
-            model=docgen.model,
-        )
+    if docgen.use_structure:
+        add("modules", sizes.structure + context_tokens)
+    else:
+        # with prefix caching, the module's code is the context of its prompt
+        add("modules", sizes.module)
     # estimate modules dependencies descriptions costs
     if not docgen.no_relations:
-        modules = docgen.parser.get_modules()
-        for module in modules:
-            deps = docgen.parser.get_module_deps(module.path)
-            if any(deps):
-                module_code, dep_code, execution_graph = docgen.parser.get_deps_code(
-                    module, deps, docgen.output_dir
+        deps = docgen.parser.get_module_deps(module.path)
+        if any(deps):
+            module_code, dep_code, execution_graph = docgen.parser.get_deps_code(
+                module, deps, docgen.output_dir, builder=docgen.context_builder
+            )
+            if execution_graph != "":
+                if docgen.prefix_caching:
+                    # the module's code is only given by the context of the prompt
+                    module_code = ""
+                intokens = count_tokens(
+                    module_code + dep_code + execution_graph, docgen.model
                 )
-                if execution_graph != "":
-                    intokens = count_tokens(
-                        module_code + dep_code + execution_graph, docgen.model
-                    )
-                    cost += calculate_cost(
-                        intokens=intokens, outtokens=50, model=docgen.model
-                    )
-    # estimate project description costs
-    intokens = (
-        len(docgen.parser.get_modules_paths()) * 100
-    )  # assuming 100 tokens description length per module
-    cost += calculate_cost(intokens=intokens, outtokens=50, model=docgen.model)
-    return round(cost, 6)
+                if docgen.deps_summaries:
+                    # the descriptions of the dependencies are not generated yet
+                    intokens += dep_code.count("\nFILE ") * OUTPUT_TOKENS["modules"]
+                add("modules_deps", intokens + context_tokens)
+    return estimates
@@ -1,31 +1,146 @@
 import ast
+import asyncio
+import functools
 import os
 from collections import defaultdict
+from typing import Callable, Iterable, Iterator, Optional, Union
 
-from pydantic import BaseModel, PrivateAttr
+from pydantic import BaseModel, Field, PrivateAttr
 
-from pycodedoc.llm import Llm
+from pycodedoc.cache import get_user_cache_dir
+from pycodedoc.context import ContextBuilder
+from pycodedoc.docstrings import count_words, is_usable_docstring
+from pycodedoc.graphs import GraphReducer
+from pycodedoc.llm import BudgetExceededError, Llm
 from pycodedoc.parser import Parser
+from pycodedoc.profiles import PHASES, PROFILES, PhaseProfile, Router
 from pycodedoc.prompts import (
     PROMPTS,
     get_classes_prompts,
+    get_docstrings_prompts,
     get_functions_prompts,
+    get_module_context,
     get_modules_deps_prompts,
     get_modules_prompts,
+    get_packages_prompts,
     get_project_prompt,
 )
-from pycodedoc.utils import set_logger
+from pycodedoc.store import DescriptionsStore, MemoryStore, PhaseView, SqliteStore
+from pycodedoc.utils import set_logger, unzip
 
 logger = set_logger()
 
+MISSING_DESCRIPTION = "_Description unavailable: the request failed._"
+PENDING_DESCRIPTION = (
+    "_Description not generated yet: the run reached its maximum cost._"
+)
+
 
 class Descriptions(BaseModel):
-    entities: dict = defaultdict(dict)
-    functions: dict = defaultdict(dict)
-    classes: dict = defaultdict(dict)
-    modules: dict = defaultdict(dict)
-    modules_deps: dict = defaultdict(dict)
-    project: str = ""
+    """
+    The descriptions generated for the project, held by a DescriptionsStore and exposed
+    as mappings: entities, functions and classes by module path then entity name,
+    modules, modules_deps and packages by path.
+
+    Attributes:
+        store (DescriptionsStore): The store holding the descriptions. Default is an in-memory store.
+    """
+
+    store: DescriptionsStore = Field(default_factory=MemoryStore)
+
+    @property
+    def entities(self):
+        return PhaseView(self.store, "entities", nested=True)
+
+    @property
+    def functions(self):
+        return PhaseView(self.store, "functions", nested=True)
+
+    @property
+    def classes(self):
+        return PhaseView(self.store, "classes", nested=True)
+
+    @property
+    def modules(self):
+        return PhaseView(self.store, "modules")
+
+    @property
+    def modules_deps(self):
+        return PhaseView(self.store, "modules_deps")
+
+    @property
+    def packages(self):
+        return PhaseView(self.store, "packages")
+
+    @property
+    def gaps(self):
+        """the descriptions whose requests failed, as phase -> key -> error"""
+        return PhaseView(self.store, "gaps", nested=True)
+
+    @property
+    def project(self):
+        return self.store.get("project", "") or ""
+
+    @project.setter
+    def project(self, value: str):
+        self.store.set("project", "", "", value)
+
+    def to_dict(self):
+        descriptions = {attr: getattr(self, attr).to_dict() for attr in NESTED_ATTRS}
+        descriptions.update(
+            {attr: getattr(self, attr).to_dict() for attr in PATH_ATTRS}
+        )
+        descriptions["project"] = self.project
+        return descriptions
+
+    def merge(self, descriptions: dict):
+        """merges descriptions, e.g. loaded from a partial results file, into these ones"""
+        for attr, value in descriptions.items():
+            if attr == "project":
+                self.project = value or self.project
+            else:
+                for module_path, module_value in value.items():
+                    if isinstance(module_value, dict):
+                        getattr(self, attr)[module_path].update(module_value)
+                    else:
+                        getattr(self, attr)[module_path] = module_value
+
+    def remove(self, module_path: str, entities_only: bool = False):
+        """removes the descriptions generated for the given module"""
+        attrs = ["entities", "functions", "classes"]
+        if not entities_only:
+            attrs += ["modules", "modules_deps"]
+        for attr in attrs:
+            getattr(self, attr).pop(module_path, None)
+        for phase_gaps in self.gaps.values():
+            for key in list(phase_gaps):
+                if key == module_path or key.startswith(f"{module_path}:"):
+                    del phase_gaps[key]
+
+    def retain(self, modules_paths: list):
+        """removes the descriptions of the modules which are not part of the project"""
+        modules_paths = set(modules_paths)
+        packages_paths = {os.path.dirname(path) for path in modules_paths}
+        for path in list(packages_paths):
+            while path:
+                path = os.path.dirname(path)
+                packages_paths.add(path)
+        for attr in MODULES_ATTRS:
+            for module_path in list(getattr(self, attr)):
+                if module_path not in modules_paths:
+                    self.remove(module_path)
+        for package_path in list(self.packages):
+            if package_path not in packages_paths:
+                del self.packages[package_path]
+
+    def has_gap(self, phase: str, key: str = "") -> bool:
+        return key in self.gaps.get(phase, {})
+
+
+NESTED_ATTRS = ["entities", "functions", "classes", "gaps"]
+PATH_ATTRS = ["modules", "modules_deps", "packages"]
+# the attributes holding descriptions by module path
+MODULES_ATTRS = ["entities", "functions", "classes", "modules", "modules_deps"]
 
 
 class DocGen(BaseModel, extra="forbid"):
@@ -33,6 +148,7 @@ class DocGen(BaseModel, extra="forbid"):
     The DocGen class is responsible for generating documentation for a Python project.
     It uses the OpenAI model to generate descriptions for functions, classes, and modules.
     It also creates execution graphs if Graphviz is installed.
+    Each phase also has a coroutine version (agenerate_*), running on the caller's event loop.
 
     Attributes:
         base_dir (str): The directory of the Python project you want to document.
@@ -40,11 +156,29 @@ class DocGen(BaseModel, extra="forbid"):
         no_relations (bool): Add description of the relationship between modules. Default is True.
         no_classes (bool): Create documentation for classes. Default is True.
         create_graphs (bool): Create execution graphs of the code. Default is True.
+        graph_reducer (GraphReducer): Reduces the graphs of large modules before writing them, see GraphReducer.
         prompts (dict): The prompts for the OpenAI model.
+        profiles (dict): The execution settings (model, max_in_flight, timeout, max_tokens) of each phase.
+        router (Router): Routes small prompts to a cheap model and large prompts to a long-context model.
         output_dir (str): The path of the output directory. Default is "./docs".
         model (str): The OpenAI model to use for generating the documentation. Default is "gpt-3.5-turbo-0125".
+        modules_paths (list): Only parse these modules of the project, e.g. when documenting a shard. Default is None (all modules).
+        include (list): Only document the modules matching these globs or directories, relative to base_dir. Default is None (all modules).
+        entries (list): Only document these modules and the modules they import, directly or not. Default is None (all modules).
+        package_rollup (bool): Summarize packages level by level and build the project overview from the top-level packages. Default is False.
+        deps_token_budget (int): The maximum number of tokens of code context when describing modules relations. Default is half of the model's context window.
+        deps_summaries (bool): Describe the dependencies of a module by their generated descriptions and the signatures of the entities it calls instead of their code. Default is False.
+        descriptions_db (str): The path of a SQLite database storing the descriptions, reused by later runs. Default is None (descriptions kept in memory).
+        no_cache (bool): Do not cache the parsed modules and execution flows on disk. Default is False.
+        cache_dir (str): The directory of the parse cache, outside of base_dir. Default is the user's cache directory, e.g. "~/.cache/pycodedoc".
+        resume (bool): Only generate the descriptions missing from the descriptions already stored, e.g. after reaching the maximum cost. Default is False.
+        use_docstrings (bool): Use the existing docstrings of the functions and classes as their descriptions when meaningful enough. Default is False.
+        docstring_min_words (int): The minimum number of words of a docstring's summary for it to be used. Default is 3.
+        docstring_max_words (int): The maximum number of words of a docstring used as is, longer ones being summarized. Default is 40.
+        prefix_caching (bool): Start the prompts about a module with its code, shared by the requests of all phases, so that providers caching prompt prefixes process it once. Default is False.
         llm (Llm): The language model.
         parser (Parser): The parser for the Python code.
+        context_builder (ContextBuilder): Selects the dependencies' code fitting into the token budget and records what was dropped.
         _descriptions (Descriptions): The descriptions generated by the OpenAI model.
     """
 
@@ -53,15 +187,94 @@ class DocGen(BaseModel, extra="forbid"):
     no_relations: bool = False
     no_classes: bool = False
     create_graphs: bool = True
+    graph_reducer: GraphReducer = Field(default_factory=GraphReducer)
     prompts: dict = PROMPTS
+    profiles: dict = PROFILES
+    router: Router = Field(default_factory=Router)
     output_dir: str = "./docs"
     model: str = "gpt-3.5-turbo-0125"
-    llm: Llm = Llm()
+    modules_paths: Optional[list] = None
+    include: Optional[list] = None
+    entries: Optional[list] = None
+    package_rollup: bool = False
+    deps_token_budget: Optional[int] = None
+    deps_summaries: bool = False
+    descriptions_db: Optional[str] = None
+    resume: bool = False
+    use_docstrings: bool = False
+    docstring_min_words: int = 3
+    docstring_max_words: int = 40
+    prefix_caching: bool = False
+    no_cache: bool = False
+    cache_dir: Optional[str] = None
+    llm: Llm = Field(default_factory=Llm)
     parser: Parser = None
-    _descriptions: Descriptions = PrivateAttr(Descriptions())
+    context_builder: ContextBuilder = None
+    _descriptions: Descriptions = PrivateAttr(default_factory=Descriptions)
+    _scope: Optional[list] = PrivateAttr(default=None)
 
     def model_post_init(self, __context):
-        self.parser = Parser(base_dir=self.base_dir)
+        # prompts configured before some phases existed fall back to the defaults
+        self.prompts = {**PROMPTS, **self.prompts}
+        # fails before parsing the project rather than on each request of the run
+        self.llm.check_prices(self.get_models())
+        if self.cache_dir is None and not self.no_cache:
+            self.cache_dir = get_user_cache_dir()
+        scoped = bool(self.include or self.entries)
+        self.parser = Parser(
+            base_dir=self.base_dir,
+            # a scoped run only parses the modules it needs, see set_scope
+            modules_paths=[] if scoped else self.modules_paths,
+            cache_dir=None if self.no_cache else self.cache_dir,
+            graph_reducer=self.graph_reducer,
+        )
+        self.context_builder = ContextBuilder(
+            # the budget follows the context window of the relations' model
+            model=self.get_profile("modules_deps").model or self.model,
+            budget=self.deps_token_budget,
+            summaries=self.deps_summaries,
+        )
+        if self.descriptions_db:
+            store = SqliteStore(path=self.descriptions_db)
+            self._descriptions = Descriptions(store=store)
+        if self.prefix_caching:
+            # the cached tokens are only reported with the usage
+            self.llm.track_usage = True
+        if scoped:
+            self.set_scope()
+
+    def set_scope(self):
+        """
+        selects the modules to document from include and entries, and parses the
+        modules they import, which give the context of their relations
+        """
+        self._scope = self.parser.select_modules(self.include, self.entries)
+        if not self._scope:
+            raise ValueError(
+                f"No module of {self.base_dir} matches the included paths or entries."
+            )
+        if not self.no_relations:
+            self.parser.add_modules(
+                [
+                    dep_path
+                    for module_path in self._scope
+                    for dep_path in self.parser.get_module_deps_paths(module_path)
+                ]
+            )
+        logger.info(
+            "DOCUMENTING %s SELECTED MODULES, %s PARSED IN TOTAL",
+            len(self._scope),
+            len(self.parser.get_modules()),
+        )
+        if not self.descriptions_db:
+            logger.warning(
+                "Only the selected modules will be documented. Use a descriptions "
+                "database to keep the descriptions of the rest of the project."
+            )
+
+    def get_scope(self) -> Optional[list]:
+        """the paths of the modules to document, None for the whole project"""
+        return self._scope
 
     def generate_documentation(self):
         """
@@ -74,19 +287,127 @@ class DocGen(BaseModel, extra="forbid"):
         The generation of descriptions for functions and classes can be toggled on or off using the `use_structure` and `no_classes` attributes respectively.
         The generation of descriptions for the relationships between modules can be toggled on or off using the `no_relations` attribute.
         """
+        try:
+            self.run_batches(self.iter_documentation_batches())
+        except BudgetExceededError as e:
+            self.log_budget_exceeded(e)
+        self.write_documentation()
+
+    async def agenerate_documentation(self):
+        """
+        Generates the documentation like generate_documentation, on the running event
+        loop. The requests of all the phases share the client of the llm's
+        async_session, so that several projects can be documented concurrently by
+        DocGen instances sharing the same Llm and its max_concurrency. The markdown and
+        graphs are written in a thread, not to stall the requests of the other projects.
+        """
+        async with self.llm.async_session():
+            try:
+                await self.arun_batches(self.iter_documentation_batches())
+            except BudgetExceededError as e:
+                self.log_budget_exceeded(e)
+        await asyncio.to_thread(self.write_documentation)
+
+    def iter_documentation_batches(self) -> Iterator[tuple]:
+        # descriptions stored by a previous run may belong to modules removed since
+        self._descriptions.retain(self.parser.get_modules_paths())
+        scope = self.get_scope()
+        # the stored descriptions of the rest of the project are kept as they are
+        for module_path in [] if self.resume else scope or []:
+            self._descriptions.remove(module_path, entities_only=True)
         if self.use_structure:
             logger.info("GENERATING FUNCTIONS DESCRIPTIONS")
-            self.generate_functions_desc()
+            yield from self.iter_functions_batches(scope)
         if not self.no_classes:
             logger.info("GENERATING CLASSES DESCRIPTIONS")
-            self.generate_classes_desc()
+            yield from self.iter_classes_batches(scope)
         logger.info("GENERATING MODULES DESCRIPTIONS")
-        self.generate_modules_desc()
+        yield from self.iter_modules_batches(scope)
         if not self.no_relations:
             logger.info("GENERATING MODULES RELATIONS DESCRIPTIONS")
-            self.generate_modules_deps_desc()
+            yield from self.iter_modules_deps_batches(scope)
+        if self.package_rollup:
+            logger.info("GENERATING PACKAGES DESCRIPTIONS")
+            yield from self.iter_packages_batches(scope)
         logger.info("GENERATING PROJECT OVERVIEW")
-        self.generate_project_desc()
+        yield from self.iter_project_batches()
+
+    def update_documentation(
+        self, modified_paths: list = None, removed_paths: list = None
+    ):
+        """
+        Updates the documentation after some modules of the project changed.
+
+        Only the modified modules are re-parsed and re-described. The relations are
+        regenerated for the modified modules and the modules depending on any of the
+        changed modules, after which the project overview and markdown are rewritten.
+
+        Args:
+            modified_paths (list, optional): The paths of the modified or added modules.
+            removed_paths (list, optional): The paths of the removed modules.
+        """
+        try:
+            self.run_batches(self.iter_update_batches(modified_paths, removed_paths))
+        except BudgetExceededError as e:
+            self.log_budget_exceeded(e)
+        self.write_documentation()
+
+    async def aupdate_documentation(
+        self, modified_paths: list = None, removed_paths: list = None
+    ):
+        """updates the documentation like update_documentation, on the running event loop"""
+        async with self.llm.async_session():
+            try:
+                await self.arun_batches(
+                    self.iter_update_batches(modified_paths, removed_paths)
+                )
+            except BudgetExceededError as e:
+                self.log_budget_exceeded(e)
+        await asyncio.to_thread(self.write_documentation)
+
+    def iter_update_batches(
+        self, modified_paths: list = None, removed_paths: list = None
+    ) -> Iterator[tuple]:
+        modified_paths, removed_paths = modified_paths or [], removed_paths or []
+        self.parser.update_modules(modified_paths, removed_paths)
+        for module_path in removed_paths:
+            self._descriptions.remove(module_path)
+        for module_path in modified_paths:
+            self._descriptions.remove(module_path, entities_only=True)
+        if modified_paths:
+            if self.use_structure:
+                logger.info("UPDATING FUNCTIONS DESCRIPTIONS")
+                yield from self.iter_functions_batches(modified_paths)
+            if not self.no_classes:
+                logger.info("UPDATING CLASSES DESCRIPTIONS")
+                yield from self.iter_classes_batches(modified_paths)
+            logger.info("UPDATING MODULES DESCRIPTIONS")
+            yield from self.iter_modules_batches(modified_paths)
+        if not self.no_relations:
+            dependents = self.parser.get_dependent_modules(
+                modified_paths + removed_paths
+            )
+            affected_paths = modified_paths + [
+                module.path
+                for module in dependents
+                if module.path not in modified_paths
+            ]
+            if affected_paths:
+                logger.info("UPDATING MODULES RELATIONS DESCRIPTIONS")
+                yield from self.iter_modules_deps_batches(affected_paths)
+        if self.package_rollup:
+            logger.info("UPDATING PACKAGES DESCRIPTIONS")
+            for module_path in removed_paths:
+                self._descriptions.packages.pop(os.path.dirname(module_path), None)
+            yield from self.iter_packages_batches(modified_paths + removed_paths)
+        logger.info("UPDATING PROJECT OVERVIEW")
+        yield from self.iter_project_batches()
+
+    def write_documentation(self):
+        self.llm.close_trace()
+        self.log_spent()
+        self.log_usage()
+        self.log_gaps()
         self.write_markdown()
 
     def generate_descriptions(self, attr: str, module_path: str = None):
@@ -94,7 +415,7 @@ class DocGen(BaseModel, extra="forbid"):
         Generate descriptions for the specified attribute.
 
         Args:
-            attr (str): The attribute for which to generate descriptions. Can be one of the following: functions, classes, modules, modules_relations, project.
+            attr (str): The attribute for which to generate descriptions. Can be one of the following: functions, classes, modules, modules_relations, packages, project.
             module_path (str, optional): The path of the module for which to generate descriptions. Defaults to None.
 
         Returns:
@@ -111,125 +432,568 @@ class DocGen(BaseModel, extra="forbid"):
             self.generate_modules_desc(module_path)
         elif attr == "modules_relations":
             self.generate_modules_deps_desc(module_path)
+        elif attr == "packages":
+            self.generate_packages_desc(module_path)
         elif attr == "project":
             self.generate_project_desc()
         else:
             raise ValueError(
-                f"Attribute {attr} not recognized. Please use one of the following: functions, classes, modules, modules_relations, project."
+                f"Attribute {attr} not recognized. Please use one of the following: functions, classes, modules, modules_relations, packages, project."
             )
         return self.get_descriptions(attr)
 
+    def get_profile(self, phase: str) -> PhaseProfile:
+        return PhaseProfile(
+            **{**PROFILES.get(phase, {}), **self.profiles.get(phase, {})}
+        )
+
+    def get_models(self) -> set:
+        """the models the requests of the phases may be sent to"""
+        models = {self.get_profile(phase).model or self.model for phase in PHASES}
+        models.update(
+            model
+            for model in [self.router.small_model, self.router.long_model]
+            if model is not None
+        )
+        return models
+
+    def get_phase_kwargs(self, phase: str) -> dict:
+        """the arguments of the batch completions of a phase, following its profile and the router"""
+        profile = self.get_profile(phase)
+        kwargs = profile.get_completions_kwargs(self.model)
+        route = None
+        if self.router.is_active():
+
+            def route(messages):
+                return self.router.route(messages, kwargs["model"], profile.max_tokens)
+
+        return dict(
+            max_in_flight=profile.max_in_flight, route=route, stream=True, **kwargs
+        )
+
+    def run_phase_completions(
+        self, phase: str, messages_batches: Iterable, on_response: Callable = None
+    ):
+        """
+        runs the completions of a phase following its profile and the router, calling
+        on_response(index, response) as soon as each response is complete
+        """
+        return self.llm.run_batch_completions(
+            messages_batches, on_response=on_response, **self.get_phase_kwargs(phase)
+        )
+
+    async def arun_phase_completions(
+        self, phase: str, messages_batches: Iterable, on_response: Callable = None
+    ):
+        """runs the completions of a phase like run_phase_completions, asynchronously"""
+        return await self.llm.arun_batch_completions(
+            messages_batches, on_response=on_response, **self.get_phase_kwargs(phase)
+        )
+
+    def run_batches(self, batches: Iterable[Union[tuple, Callable]]):
+        """
+        runs the (phase, messages_batches, on_response) batches yielded by the phases,
+        each batch being run once the previous one completed. The phases yield their
+        blocking work, e.g. laying out graphs, as callables run before their batch.
+        """
+        for batch in batches:
+            if callable(batch):
+                batch()
+            else:
+                self.run_phase_completions(*batch)
+
+    async def arun_batches(self, batches: Iterable[Union[tuple, Callable]]):
+        for batch in batches:
+            if callable(batch):
+                # run in a thread, so that the requests of the other projects sharing
+                # the event loop keep streaming meanwhile
+                await asyncio.to_thread(batch)
+            else:
+                await self.arun_phase_completions(*batch)
+
+    def get_content(self, phase: str, response: Optional[dict], key: str = ""):
+        """
+        returns the content of a response, or None if its request failed in which case
+        the description is recorded as a gap of the phase
+        """
+        if response is None:
+            self._descriptions.gaps[phase][key] = "request failed"
+            return None
+        self._descriptions.gaps[phase].pop(key, None)
+        return response["content"]
+
+    def log_budget_exceeded(self, error: BudgetExceededError):
+        logger.warning(
+            "MAXIMUM COST REACHED, STOPPING: %s The remaining descriptions can be "
+            "generated later by resuming the run.",
+            error,
+        )
+
+    def render_description(self, phase: str, description: Optional[str], key=""):
+        """the description, or why it is missing if it could not be generated"""
+        if description is not None:
+            return description
+        if self._descriptions.has_gap(phase, key):
+            return MISSING_DESCRIPTION
+        return PENDING_DESCRIPTION
+
+    def log_spent(self):
+        if self.llm.max_cost is not None:
+            logger.info(
+                "SPENT $%.4f OF THE $%.2f BUDGET",
+                self.llm.get_spent(),
+                self.llm.max_cost,
+            )
+
+    def log_usage(self):
+        usage = self.llm.get_usage()
+        if self.prefix_caching and usage.get("prompt_tokens"):
+            logger.info(
+                "%s PROMPT TOKENS, %s SERVED FROM THE PROVIDER'S CACHE (%.0f%%)",
+                usage["prompt_tokens"],
+                usage.get("cached_tokens", 0),
+                100 * usage.get("cached_tokens", 0) / usage["prompt_tokens"],
+            )
+
+    def get_modules_contexts(self, modules_paths: Iterable) -> Optional[Iterator[str]]:
+        """
+        the shared context starting the prompt of each request, given the path of its
+        module, None unless prefix_caching
+        """
+        if not self.prefix_caching:
+            return None
+        return self._iter_modules_contexts(modules_paths)
+
+    def _iter_modules_contexts(self, modules_paths: Iterable) -> Iterator[str]:
+        # the requests about a module are contiguous, as they share the same prefix
+        context_path = context = None
+        for module_path in modules_paths:
+            if module_path != context_path:
+                module_code = self.parser.get_module(module_path, "code")
+                context_path = module_path
+                context = get_module_context(module_path, module_code)
+            yield context
+
+    def is_described(self, attr: str, path: str, name: str = None) -> bool:
+        """whether a description was generated by the run being resumed"""
+        if not self.resume:
+            return False
+        description = getattr(self._descriptions, attr)[path]
+        if name is not None:
+            description = description.get(name)
+        return description is not None
+
+    def log_gaps(self):
+        n_gaps = sum(len(phase_gaps) for phase_gaps in self._descriptions.gaps.values())
+        if n_gaps:
+            logger.warning("%s DESCRIPTIONS COULD NOT BE GENERATED", n_gaps)
+
     def get_descriptions(self, attr: str = None):
         if attr is None:
             return self._descriptions
         else:
             return getattr(self._descriptions, attr)
 
-    def generate_functions_desc(self, module_path: str = None):
-        functions_code = self.parser.get_functions(module_path, attr="code")
-        prompts = get_functions_prompts(functions_code, **self.prompts["functions"])
-        responses = self.llm.run_batch_completions(
-            **prompts, timeout=10, stream=True, model=self.model
+    def generate_functions_desc(self, module_path: Union[str, list] = None):
+        self.run_batches(self.iter_functions_batches(module_path))
+
+    async def agenerate_functions_desc(self, module_path: Union[str, list] = None):
+        await self.arun_batches(self.iter_functions_batches(module_path))
+
+    def iter_functions_batches(
+        self, module_path: Union[str, list] = None
+    ) -> Iterator[tuple]:
+        functions = [
+            function
+            for function in self.parser.get_functions(module_path)
+            if not self.is_described("functions", function.path, function.uname)
+        ]
+        functions = yield from self.iter_docstrings_batches("functions", functions)
+        functions_code = (function.code for function in functions)
+        prompts = get_functions_prompts(
+            functions_code,
+            **self.prompts["functions"],
+            modules_contexts=self.get_modules_contexts(f.path for f in functions),
         )
-        functions = self.parser.get_functions(module_path)
-        for function, response in zip(functions, responses):
-            self._descriptions.entities[function.path][function.uname] = response[
-                "content"
-            ]
-            self._descriptions.functions[function.path][function.uname] = response[
-                "content"
-            ]
+        # descriptions are stored as they come, in the order of the reserved entries
+        for function in functions:
+            self._descriptions.entities[function.path][function.uname] = None
+            self._descriptions.functions[function.path][function.uname] = None
+
+        def store_description(i, response):
+            function = functions[i]
+            key = f"{function.path}:{function.uname}"
+            content = self.get_content("functions", response, key)
+            self._descriptions.entities[function.path][function.uname] = content
+            self._descriptions.functions[function.path][function.uname] = content
+
+        yield "functions", prompts["messages_batches"], store_description
+
+    def generate_classes_desc(self, module_path: Union[str, list] = None):
+        self.run_batches(self.iter_classes_batches(module_path))
+
+    async def agenerate_classes_desc(self, module_path: Union[str, list] = None):
+        await self.arun_batches(self.iter_classes_batches(module_path))
 
-    def generate_classes_desc(self, module_path: str = None):
-        classes = self.parser.get_classes(module_path)
+    def iter_classes_batches(
+        self, module_path: Union[str, list] = None
+    ) -> Iterator[tuple]:
+        classes = [
+            class_
+            for class_ in self.parser.get_classes(module_path)
+            if not self.is_described("classes", class_.path, class_.name)
+        ]
+        classes = yield from self.iter_docstrings_batches("classes", classes)
         classes_code = self.get_classes_code(classes)
-        prompts = get_classes_prompts(classes_code, **self.prompts["classes"])
-        responses = self.llm.run_batch_completions(
-            **prompts, timeout=10, stream=True, model=self.model
+        prompts = get_classes_prompts(
+            classes_code,
+            **self.prompts["classes"],
+            modules_contexts=self.get_modules_contexts(c.path for c in classes),
         )
-        for class_, response in zip(classes, responses):
-            self._descriptions.entities[class_.path][class_.name] = response["content"]
-            self._descriptions.classes[class_.path][class_.name] = response["content"]
+        for class_ in classes:
+            self._descriptions.entities[class_.path][class_.name] = None
+            self._descriptions.classes[class_.path][class_.name] = None
+
+        def store_description(i, response):
+            class_ = classes[i]
+            key = f"{class_.path}:{class_.name}"
+            content = self.get_content("classes", response, key)
+            self._descriptions.entities[class_.path][class_.name] = content
+            self._descriptions.classes[class_.path][class_.name] = content
+
+        yield "classes", prompts["messages_batches"], store_description
+
+    def get_docstring(self, entity) -> Optional[str]:
+        """the docstring of a function or class, if used and meaningful enough"""
+        if self.use_docstrings and is_usable_docstring(
+            entity.docstring, self.docstring_min_words
+        ):
+            return entity.docstring
+        return None
+
+    def needs_summary(self, docstring: str) -> bool:
+        return count_words(docstring) > self.docstring_max_words
+
+    def iter_docstrings_batches(self, attr: str, entities: list) -> Iterator[tuple]:
+        """
+        describes the entities of a phase with a usable docstring from it, the long
+        docstrings being summarized by a batch of requests. Returns the entities left
+        to describe from their code.
+        """
+        if not self.use_docstrings:
+            return entities
+        # descriptions are stored in the order of the project whatever their source
+        for entity in entities:
+            self.store_entity_description(attr, entity, None)
+        remaining, long_docstrings = [], []
+        for entity in entities:
+            docstring = self.get_docstring(entity)
+            if docstring is None:
+                remaining.append(entity)
+            elif self.needs_summary(docstring):
+                long_docstrings.append(entity)
+            else:
+                self.store_entity_description(attr, entity, docstring)
+        logger.info(
+            "REUSING %s DOCSTRINGS, SUMMARIZING %s OF THEM",
+            len(entities) - len(remaining),
+            len(long_docstrings),
+        )
+        if long_docstrings:
+            docstrings = (entity.docstring for entity in long_docstrings)
+            prompts = get_docstrings_prompts(docstrings, **self.prompts["docstrings"])
+
+            def store_description(i, response):
+                entity = long_docstrings[i]
+                # the docstring is still a better description than none
+                content = response["content"] if response else entity.docstring
+                self.store_entity_description(attr, entity, content)
 
-    def get_classes_code(self, classes):
-        classes_code = []
+            yield "docstrings", prompts["messages_batches"], store_description
+        return remaining
+
+    def store_entity_description(self, attr: str, entity, description: Optional[str]):
+        name = entity.uname if entity.type == "function" else entity.name
+        self._descriptions.entities[entity.path][name] = description
+        getattr(self._descriptions, attr)[entity.path][name] = description
+
+    def get_classes_code(self, classes) -> Iterator[str]:
         for class_ in classes:
             if self.use_structure:
                 descriptions = self._descriptions.entities[class_.path]
-                code = self.parser.get_code_structure(class_, descriptions=descriptions)
+                yield self.parser.get_code_structure(class_, descriptions=descriptions)
             else:
-                code = ast.unparse(class_.node)
-            classes_code.append(code)
-        return classes_code
+                yield ast.unparse(class_.node)
+
+    def generate_modules_desc(self, module_path: Union[str, list] = None):
+        self.run_batches(self.iter_modules_batches(module_path))
 
-    def generate_modules_desc(self, module_path: str = None):
-        modules = self.parser.get_modules(module_path)
+    async def agenerate_modules_desc(self, module_path: Union[str, list] = None):
+        await self.arun_batches(self.iter_modules_batches(module_path))
+
+    def iter_modules_batches(
+        self, module_path: Union[str, list] = None
+    ) -> Iterator[tuple]:
+        modules = [
+            module
+            for module in self.parser.get_modules(module_path)
+            if not self.is_described("modules", module.path)
+        ]
+        if self.create_graphs and modules:
+            yield functools.partial(self.write_modules_graphs, modules)
         modules_code = self.get_modules_code(modules)
-        prompts = get_modules_prompts(modules_code, **self.prompts["modules"])
-        responses = self.llm.run_batch_completions(
-            **prompts, timeout=10, stream=True, model=self.model
+        prompts = get_modules_prompts(
+            modules_code,
+            **self.prompts["modules"],
+            modules_contexts=self.get_modules_contexts(m.path for m in modules),
         )
-        for module, response in zip(modules, responses):
-            self._descriptions.modules[module.path] = response["content"]
+        for module in modules:
+            self._descriptions.modules[module.path] = None
+
+        def store_description(i, response):
+            module_path = modules[i].path
+            content = self.get_content("modules", response, module_path)
+            self._descriptions.modules[module_path] = content
 
-    def get_modules_code(self, modules):
-        modules_code = []
+        yield "modules", prompts["messages_batches"], store_description
+
+    def get_modules_code(self, modules) -> Iterator[Optional[str]]:
+        """
+        the structure or code of each module, None when the code is already given by
+        the prefix of the prompt
+        """
         for module in modules:
             if self.use_structure:
                 descriptions = self._descriptions.entities[module.path]
                 code = self.parser.get_code_structure(module, descriptions=descriptions)
+            elif self.prefix_caching:
+                code = None
             else:
                 code = ast.unparse(module.node)
+            yield code
+
+    def write_modules_graphs(self, modules):
+        """writes the execution graph of each module, before the modules phase"""
+        for module in modules:
+            graphviz_installed = self.parser.write_graphs(module, self.output_dir)
+            if graphviz_installed is False:
+                self.create_graphs = False
+                return
+
+    def generate_modules_deps_desc(self, module_path: Union[str, list] = None):
+        self.run_batches(self.iter_modules_deps_batches(module_path))
+
+    async def agenerate_modules_deps_desc(self, module_path: Union[str, list] = None):
+        await self.arun_batches(self.iter_modules_deps_batches(module_path))
+
+    def iter_modules_deps_batches(
+        self, module_path: Union[str, list] = None
+    ) -> Iterator[tuple]:
+        modules = [
+            module
+            for module in self.parser.get_modules(module_path)
+            if not self.is_described("modules_deps", module.path)
+        ]
+        if modules:
+            yield functools.partial(self.prepare_modules_deps, modules)
+        # filled as the contexts are built, before the requests of the modules are sent
+        modules_paths = []
+        contexts = self.get_modules_deps_contexts(modules, modules_paths)
+        modules_code, deps_code, execution_graphs = unzip(contexts, 3)
+        prompts = get_modules_deps_prompts(
+            modules_code,
+            deps_code,
+            execution_graphs,
+            **self.prompts["modules_deps"],
+            # iterated as the contexts are built, after the path of each module is added
+            modules_contexts=self.get_modules_contexts(iter(modules_paths)),
+        )
+
+        def store_description(i, response):
+            content = self.get_content("modules_deps", response, modules_paths[i])
+            self._descriptions.modules_deps[modules_paths[i]] = content
+
+        yield "modules_deps", prompts["messages_batches"], store_description
+
+    def prepare_modules_deps(self, modules):
+        """
+        computes the execution flows of the modules with their dependencies, writing
+        their graphs, and the token sizes of the dependencies, before the relations
+        phase so that building its prompts is only light work
+        """
+        # the sizes are only needed to select the entities fitting into a budget
+        count_sizes = (
+            self.deps_summaries or self.context_builder.get_budget() is not None
+        )
+        for module in modules:
+            deps = self.parser.get_module_deps(module.path)
+            if not any(deps):
+                continue
             if self.create_graphs:
-                graphviz_installed = self.parser.write_graphs(module, self.output_dir)
-                if graphviz_installed is False:
-                    self.create_graphs = False
-            modules_code.append(code)
-        return modules_code
-
-    def generate_modules_deps_desc(self, module_path: str = None):
-        modules = self.parser.get_modules(module_path)
-        modules_paths, modules_code, deps_code, execution_graphs = [], [], [], []
+                self.parser.write_deps_graphs(module, deps, self.output_dir)
+            else:
+                self.parser.parse_module_deps(module, deps)
+            if count_sizes:
+                for dep in deps:
+                    self.parser.get_token_sizes(dep.path, self.context_builder.model)
+
+    def get_modules_deps_contexts(
+        self, modules, modules_paths: list
+    ) -> Iterator[tuple]:
+        """
+        yields the module code, dependencies code and execution graph of each module
+        having relations, appending its path to modules_paths
+        """
         for module in modules:
+            if self.is_described("modules_deps", module.path):
+                continue
+            # modules without relations keep a None description
+            self._descriptions.modules_deps[module.path] = None
             deps = self.parser.get_module_deps(module.path)
             if any(deps):
+                # the flows are computed and the graphs written by prepare_modules_deps
                 module_code, dep_code, execution_graph = self.parser.get_deps_code(
-                    module, deps, self.output_dir, self.create_graphs
+                    module,
+                    deps,
+                    self.output_dir,
+                    builder=self.context_builder,
+                    descriptions=self._descriptions.entities,
+                    modules_descriptions=self._descriptions.modules,
+                    # the module's code is then given by the prefix of the prompt
+                    prefix=(
+                        get_module_context(module.path, module.code)
+                        if self.prefix_caching
+                        else None
+                    ),
                 )
                 if execution_graph != "":
-                    modules_code.append(module_code)
-                    deps_code.append(dep_code)
-                    execution_graphs.append(execution_graph)
                     modules_paths.append(module.path)
-                else:
-                    self._descriptions.modules_deps[module.path] = None
-            else:
-                self._descriptions.modules_deps[module.path] = None
-        prompts = get_modules_deps_prompts(
-            modules_code, deps_code, execution_graphs, **self.prompts["modules_deps"]
-        )
-        responses = self.llm.run_batch_completions(
-            **prompts, timeout=10, stream=True, model=self.model
-        )
-        for module_path, response in zip(modules_paths, responses):
-            self._descriptions.modules_deps[module_path] = response["content"]
+                    yield module_code, dep_code, execution_graph
+
+    def generate_packages_desc(self, module_path: Union[str, list] = None):
+        """
+        Summarizes the packages from the descriptions of their modules and the summaries
+        of their subpackages. Packages are processed level by level starting from the
+        deepest ones, all the packages of a level being summarized concurrently.
+
+        Args:
+            module_path (Union[str, list], optional): Only summarize the packages containing these modules and their parent packages. Defaults to None (all packages).
+        """
+        self.run_batches(self.iter_packages_batches(module_path))
+
+    async def agenerate_packages_desc(self, module_path: Union[str, list] = None):
+        await self.arun_batches(self.iter_packages_batches(module_path))
+
+    def iter_packages_batches(
+        self, module_path: Union[str, list] = None
+    ) -> Iterator[tuple]:
+        """yields the batch of each level once the deeper levels are summarized"""
+        packages = self.get_packages()
+        if module_path:
+            module_paths = (
+                [module_path] if isinstance(module_path, str) else module_path
+            )
+            selected = set()
+            for path in module_paths:
+                package_path = os.path.dirname(path)
+                while package_path:
+                    selected.add(package_path)
+                    package_path = os.path.dirname(package_path)
+            packages = {path: packages[path] for path in packages if path in selected}
+        depths = sorted({path.count("/") for path in packages}, reverse=True)
+        for depth in depths:
+            level = [
+                path
+                for path in packages
+                if path.count("/") == depth and not self.is_described("packages", path)
+            ]
+            if not level:
+                continue
+            packages_docu = (
+                self.get_package_docu(path, packages[path]) for path in level
+            )
+            prompts = get_packages_prompts(
+                level, packages_docu, **self.prompts["packages"]
+            )
+
+            def store_description(i, response):
+                content = self.get_content("packages", response, level[i])
+                self._descriptions.packages[level[i]] = content
+
+            yield "packages", prompts["messages_batches"], store_description
+
+    def get_packages(self):
+        """returns the packages of the documented modules as package path -> modules paths"""
+        packages = defaultdict(list)
+        for module_path in self._descriptions.modules:
+            package_path = os.path.dirname(module_path)
+            packages[package_path].append(module_path)
+            # parent packages without modules of their own are packages as well
+            while package_path:
+                package_path = os.path.dirname(package_path)
+                packages[package_path]
+        # the project's root is described by the project overview
+        packages.pop("", None)
+        return packages
+
+    def get_package_docu(self, package_path: str, modules_paths: list):
+        package_docu = ""
+        for path, package_desc in self._descriptions.packages.items():
+            if os.path.dirname(path) == package_path:
+                package_desc = self.render_description("packages", package_desc, path)
+                package_docu += f"\n\n**Package {path}**:\n\n{package_desc}\n"
+        package_docu += self.get_modules_descriptions(modules_paths)
+        return package_docu
+
+    def get_packages_descriptions(self, top_level_only: bool = False):
+        packages_docu = ""
+        for package_path in sorted(self._descriptions.packages):
+            if top_level_only and "/" in package_path:
+                continue
+            package_desc = self.render_description(
+                "packages", self._descriptions.packages[package_path], package_path
+            )
+            packages_docu += f"\n\n**Package {package_path}**:\n\n{package_desc}\n"
+        return packages_docu
 
     def generate_project_desc(self):
-        modules_docu = self.get_modules_descriptions()
-        prompt = get_project_prompt(
-            modules_docu, self.parser.get_tree(), **self.prompts["project"]
-        )
-        response = self.llm.run_completions(
-            **prompt, timeout=10, stream=True, model=self.model
-        )
-        self._descriptions.project = response["content"]
+        self.run_batches(self.iter_project_batches())
+
+    async def agenerate_project_desc(self):
+        await self.arun_batches(self.iter_project_batches())
+
+    def iter_project_batches(self) -> Iterator[tuple]:
+        if self.package_rollup:
+            # the top-level packages summarize everything below them
+            root_modules = [
+                path for path in self._descriptions.modules if not os.path.dirname(path)
+            ]
+            modules_docu = self.get_packages_descriptions(top_level_only=True)
+            modules_docu += self.get_modules_descriptions(root_modules)
+            tree = self.parser.get_tree(dirs_only=True)
+        else:
+            modules_docu = self.get_modules_descriptions()
+            tree = self.parser.get_tree()
+        prompt = get_project_prompt(modules_docu, tree, **self.prompts["project"])
 
-    def get_modules_descriptions(self):
+        def store_description(i, response):
+            self._descriptions.project = self.get_content("project", response) or ""
+
+        yield "project", [prompt["messages"]], store_description
+
+    def get_modules_descriptions(self, modules_paths: list = None):
         modules_docu = ""
+        if modules_paths is None:
+            modules_paths = list(self._descriptions.modules.keys())
         if not self.no_relations:
-            for module_path in self._descriptions.modules.keys():
-                module_desc = self._descriptions.modules[module_path]
+            for module_path in modules_paths:
+                module_desc = self.render_description(
+                    "modules", self._descriptions.modules[module_path], module_path
+                )
                 module_deps_desc = self._descriptions.modules_deps[module_path]
+                # a None relations description also means that the module has none
+                if self._descriptions.has_gap("modules_deps", module_path):
+                    module_deps_desc = MISSING_DESCRIPTION
                 modules_docu += (
                     f"\n\n**Module {module_path}**:\n\nDescription:\n{module_desc}\n"
                 )
@@ -238,7 +1002,10 @@ class DocGen(BaseModel, extra="forbid"):
                         f"\nRelations with other modules:\n{module_deps_desc}\n"
                     )
         else:
-            for module_path, module_desc in self._descriptions.modules.items():
+            for module_path in modules_paths:
+                module_desc = self.render_description(
+                    "modules", self._descriptions.modules[module_path], module_path
+                )
                 modules_docu += (
                     f"\n\n**Module {module_path}**:\n\nDescription:\n{module_desc}\n"
                 )
@@ -246,8 +1013,18 @@ class DocGen(BaseModel, extra="forbid"):
 
     def get_classes_descriptions(self):
         classes_docu = ""
-        for class_path, class_ in self._descriptions.classes.items():
-            for class_name, class_desc in class_.items():
+        # modules re-described by later runs are listed in the order of the project
+        order = {path: i for i, path in enumerate(self.parser.get_modules_paths())}
+        classes_paths = sorted(
+            self._descriptions.classes, key=lambda path: order.get(path, len(order))
+        )
+        for class_path in classes_paths:
+            for class_name, class_desc in self._descriptions.classes[
+                class_path
+            ].items():
+                class_desc = self.render_description(
+                    "classes", class_desc, f"{class_path}:{class_name}"
+                )
                 classes_docu += (
                     f"\n**class {class_name} [{class_path}]**:\n\n{class_desc}\n"
                 )
@@ -261,11 +1038,17 @@ class DocGen(BaseModel, extra="forbid"):
 
     def generate_markdown(self):
         md = "# PROJECT OVERVIEW\n\n"
-        md += f"{self.get_descriptions('project')}\n\n"
+        project_desc = self.get_descriptions("project") or None
+        md += f"{self.render_description('project', project_desc)}\n\n"
 
         md += "## PROJECT STRUCTURE\n\n"
         md += f"```\n{self.parser.get_tree()}```\n\n"
 
+        if self.package_rollup:
+            md += "## PACKAGES"
+            md += self.get_packages_descriptions()
+            md += "\n\n"
+
         md += "## MODULES"
         md += self.get_modules_descriptions()
 
@@ -281,8 +1064,7 @@ class DocGen(BaseModel, extra="forbid"):
                     f"{self.output_dir}/graphs/{os.path.splitext(module)[0]}.png"
                 )
                 if os.path.exists(file_path):
-                    rel_path = os.path.relpath(file_path, self.output_dir)
-                    graph_md += f"\n![Alt text]({rel_path})\n"
+                    graph_md += self.get_graph_md(file_path)
             # only add section if some graphs were added
             if graph_md != title:
                 md += graph_md
@@ -293,10 +1075,31 @@ class DocGen(BaseModel, extra="forbid"):
                 for module in self.parser.get_modules_paths():
                     file_path = f"{self.output_dir}/graphs/{os.path.splitext(module)[0]}_deps.png"
                     if os.path.exists(file_path):
-                        rel_path = os.path.relpath(file_path, self.output_dir)
-                        graph_md += f"\n![Alt text]({rel_path})\n"
+                        graph_md += self.get_graph_md(file_path)
                 # only add section if some graphs were added
                 if graph_md != title:
                     md += graph_md
 
+        gaps_md = self.get_gaps_descriptions()
+        if gaps_md:
+            md += "\n\n## MISSING DESCRIPTIONS\n\n"
+            md += "The requests generating these descriptions failed:\n"
+            md += gaps_md
+
         return md
+
+    def get_graph_md(self, file_path: str) -> str:
+        """the graph's image followed by its detail graphs, if split"""
+        graph_md = ""
+        for path in [file_path] + self.parser.get_graph_details(file_path):
+            if os.path.exists(path):
+                rel_path = os.path.relpath(path, self.output_dir)
+                graph_md += f"\n![Alt text]({rel_path})\n"
+        return graph_md
+
+    def get_gaps_descriptions(self):
+        gaps_docu = ""
+        for phase, phase_gaps in self._descriptions.gaps.items():
+            for key in phase_gaps:
+                gaps_docu += f"\n- {phase}: {key or 'project overview'}"
+        return gaps_docu
@@ -0,0 +1,36 @@
+"""
+Reuse of the docstrings already written in the code as descriptions of the functions and
+classes, so that only the entities without a usable docstring need a request.
+"""
+import re
+from typing import Optional
+
+# docstrings left as placeholders, e.g. by templates or code generators
+PLACEHOLDER_REGEX = re.compile(
+    r"^\W*(todo|tbd|fixme|xxx|wip|docstring|description|summary|placeholder|"
+    r"no description|add description|\.\.\.|_+|-+)\W*$",
+    re.IGNORECASE,
+)
+# markers of a docstring still to be written, anywhere in it, e.g. "TODO: document"
+PLACEHOLDER_MARKER_REGEX = re.compile(r"\b(todo|tbd|fixme|xxx|placeholder)\b", re.I)
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+def get_summary(docstring: str) -> str:
+    """the summary of a docstring, i.e. its first paragraph"""
+    return docstring.strip().split("\n\n")[0]
+
+
+def is_usable_docstring(docstring: Optional[str], min_words: int = 3) -> bool:
+    """whether a docstring is meaningful enough to be used as a description"""
+    if not docstring:
+        return False
+    summary = get_summary(docstring)
+    return (
+        count_words(summary) >= min_words
+        and not PLACEHOLDER_REGEX.match(summary)
+        and not PLACEHOLDER_MARKER_REGEX.search(summary)
+    )
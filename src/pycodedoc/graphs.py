@@ -0,0 +1,243 @@
+"""
+Reduction of the execution graphs before writing them, so that the graphs of large
+modules stay readable and quick to lay out by graphviz.
+
+The graphs are the (groups, nodes, edges) of code2flow: the file and class groups, the
+function nodes and the call edges. They are reduced on a copy, the parser caching the
+original ones.
+"""
+import copy
+import fnmatch
+from collections import Counter
+from functools import lru_cache
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+from pycodedoc.utils import set_logger
+
+logger = set_logger()
+
+
+class GraphReducer(BaseModel):
+    """
+    Reduces the execution graphs exceeding a number of nodes or edges.
+
+    The methods of each class are first collapsed into a single node when enabled. The
+    other reductions are then applied in order, each one only while the graph exceeds
+    the limits (or always when enabled): pruning the trivial nodes, pruning the leaves
+    (functions calling nothing), and finally keeping the most connected nodes.
+
+    With split, a module's graph is written as an overview, where the classes are
+    collapsed, and a detail graph per class showing its methods and their direct
+    callers and callees.
+
+    Attributes:
+        max_nodes (int): The maximum number of nodes of a graph. Default is 50, None for no limit.
+        max_edges (int): The maximum number of edges of a graph. Default is 100, None for no limit.
+        prune_trivial (bool): Always prune the trivial nodes. Default is False (only when exceeding the limits).
+        collapse_methods (bool): Collapse the methods into their class. Default is False (only in the overviews).
+        prune_leaves (bool): Always prune the leaves. Default is False (only when exceeding the limits).
+        trivial_patterns (list): The names of the trivial functions, e.g. dunder methods other than the constructors.
+        utility_min_callers (int): The number of callers from which a leaf is a trivial utility, e.g. a logging helper. Default is 5.
+        split (bool): Write an overview of the module and a detail graph per class. Default is False.
+    """
+
+    max_nodes: Optional[int] = 50
+    max_edges: Optional[int] = 100
+    prune_trivial: bool = False
+    collapse_methods: bool = False
+    prune_leaves: bool = False
+    trivial_patterns: List[str] = Field(default_factory=lambda: ["__*__"])
+    utility_min_callers: int = 5
+    split: bool = False
+
+    def exceeds(self, nodes: list, edges: list) -> bool:
+        return (self.max_nodes is not None and len(nodes) > self.max_nodes) or (
+            self.max_edges is not None and len(edges) > self.max_edges
+        )
+
+    def reduce(self, groups: list, nodes: list, edges: list) -> List[tuple]:
+        """
+        Returns the graphs to write as (suffix, groups, nodes, edges), the suffix being
+        appended to the graph's file name: an empty one for the module's graph, or the
+        name of the class for the detail graphs.
+        """
+        if not self.split:
+            if not self.reduces(nodes, edges):
+                # the graph is written as is, no copy needed
+                return [("", groups, nodes, edges)]
+            graph = copy.deepcopy((groups, nodes, edges))
+            return [("", *self.reduce_graph(*graph))]
+        graphs = [
+            ("", *self.reduce_graph(*copy.deepcopy((groups, nodes, edges)), True))
+        ]
+        for i, class_name in enumerate(get_class_names(groups)):
+            graph = copy.deepcopy((groups, nodes, edges))
+            graph = select_class(*graph, get_class_groups(graph[0])[i])
+            if any(graph[2]):
+                graphs.append((f"_{class_name}", *self.reduce_graph(*graph)))
+        return graphs
+
+    def reduces(self, nodes: list, edges: list) -> bool:
+        """whether a graph would be changed by the reductions, split aside"""
+        return (
+            self.collapse_methods
+            or self.prune_trivial
+            or self.prune_leaves
+            or self.exceeds(nodes, edges)
+        )
+
+    def reduce_graph(self, groups, nodes, edges, collapse: bool = False) -> tuple:
+        n_nodes, n_edges = len(nodes), len(edges)
+        if collapse or self.collapse_methods:
+            groups, nodes, edges = collapse_classes(groups, nodes, edges)
+        if self.prune_trivial or self.exceeds(nodes, edges):
+            trivial = {node for node in nodes if self.is_trivial(node, edges)}
+            groups, nodes, edges = remove_nodes(groups, nodes, edges, trivial)
+        if self.prune_leaves or self.exceeds(nodes, edges):
+            groups, nodes, edges = prune_leaves(groups, nodes, edges)
+        if self.exceeds(nodes, edges):
+            groups, nodes, edges = self.keep_connected(groups, nodes, edges)
+        if len(nodes) < n_nodes:
+            logger.info(
+                "Reduced graph from %s nodes and %s edges to %s nodes and %s edges",
+                n_nodes,
+                n_edges,
+                len(nodes),
+                len(edges),
+            )
+        return groups, nodes, edges
+
+    def is_trivial(self, node, edges: list) -> bool:
+        if node.is_constructor:
+            return False
+        if any(
+            fnmatch.fnmatch(node.token, pattern) for pattern in self.trivial_patterns
+        ):
+            return True
+        callers = {edge.node0 for edge in edges if edge.node1 is node}
+        return node.is_leaf and len(callers) >= self.utility_min_callers
+
+    def keep_connected(self, groups, nodes, edges) -> tuple:
+        """keeps the nodes with the most calls, and the edges between them"""
+        degrees = get_degrees(edges)
+        nodes = sorted(nodes, key=lambda node: (-degrees[node], node.name()))
+        kept = set(nodes[: self.max_nodes])
+        edges = [edge for edge in edges if edge.node0 in kept and edge.node1 in kept]
+        if self.max_edges is not None:
+            edges = sorted(
+                edges,
+                key=lambda edge: (
+                    -degrees[edge.node0] - degrees[edge.node1],
+                    edge.node0.name(),
+                    edge.node1.name(),
+                ),
+            )[: self.max_edges]
+        kept = {node for edge in edges for node in (edge.node0, edge.node1)}
+        return remove_nodes(groups, nodes, edges, set(nodes).difference(kept))
+
+
+def get_degrees(edges: list) -> Counter:
+    degrees = Counter()
+    for edge in edges:
+        degrees[edge.node0] += 1
+        degrees[edge.node1] += 1
+    return degrees
+
+
+def get_class_groups(groups: list) -> list:
+    """the top-level classes of the file groups"""
+    return [
+        subgroup
+        for group in groups
+        for subgroup in group.subgroups
+        if subgroup.group_type == "CLASS"
+    ]
+
+
+def get_class_names(groups: list) -> List[str]:
+    return [group.token for group in get_class_groups(groups)]
+
+
+def rebuild_edges(nodes: list, pairs) -> list:
+    """builds the edges between pairs of nodes, updating their leaf and trunk flags"""
+    from code2flow.model import Edge
+
+    for node in nodes:
+        node.is_leaf, node.is_trunk = True, True
+    return [Edge(node0, node1) for node0, node1 in pairs]
+
+
+def remove_nodes(groups, nodes, edges, removed: set) -> tuple:
+    """removes the nodes, their edges and the nodes and groups left without edges"""
+    from code2flow import engine
+
+    if not removed:
+        return groups, nodes, edges
+    pairs = [
+        (edge.node0, edge.node1)
+        for edge in edges
+        if edge.node0 not in removed and edge.node1 not in removed
+    ]
+    kept = {node for pair in pairs for node in pair}
+    nodes = [node for node in nodes if node in kept]
+    groups = engine._filter_groups_for_subset(kept, groups)
+    return groups, nodes, rebuild_edges(nodes, pairs)
+
+
+def prune_leaves(groups, nodes, edges) -> tuple:
+    """removes the functions calling nothing, unless no call would be left"""
+    leaves = {node for node in nodes if node.is_leaf}
+    if all(edge.node1 in leaves for edge in edges):
+        return groups, nodes, edges
+    return remove_nodes(groups, nodes, edges, leaves)
+
+
+@lru_cache(maxsize=None)
+def get_class_node_type() -> type:
+    """the type of the nodes of collapsed classes, code2flow being imported lazily"""
+    from code2flow.model import Node
+
+    class ClassNode(Node):
+        """A node standing for a class whose methods are collapsed."""
+
+        def label(self) -> str:
+            # the class is labelled as such rather than as a function call
+            if self.line_number is not None:
+                return f"{self.line_number}: class {self.token}"
+            return f"class {self.token}"
+
+    return ClassNode
+
+
+def collapse_classes(groups, nodes, edges) -> tuple:
+    """replaces the methods of each class by a node of the class"""
+    ClassNode = get_class_node_type()
+    replacements = {}
+    for group in get_class_groups(groups):
+        class_node = ClassNode(
+            group.token, [], [], group.parent, line_number=group.line_number
+        )
+        for node in group.all_nodes():
+            replacements[node] = class_node
+        group.remove_from_parent()
+        group.parent.add_node(class_node)
+    if not replacements:
+        return groups, nodes, edges
+    pairs = {}
+    for edge in edges:
+        node0 = replacements.get(edge.node0, edge.node0)
+        node1 = replacements.get(edge.node1, edge.node1)
+        if node0 is not node1:
+            pairs[(node0, node1)] = None
+    nodes = list({replacements.get(node, node): None for node in nodes})
+    return groups, nodes, rebuild_edges(nodes, pairs)
+
+
+def select_class(groups, nodes, edges, class_group) -> tuple:
+    """the methods of a class with their direct callers and callees"""
+    methods = set(class_group.all_nodes())
+    edges = [edge for edge in edges if edge.node0 in methods or edge.node1 in methods]
+    kept = {node for edge in edges for node in (edge.node0, edge.node1)}
+    return remove_nodes(groups, nodes, edges, set(nodes).difference(kept))
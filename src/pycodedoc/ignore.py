@@ -0,0 +1,148 @@
+import os
+import re
+from typing import Optional
+
+from pydantic import BaseModel, PrivateAttr
+
+IGNORE_FILES = [".gitignore", ".pycodedocignore"]
+
+
+class IgnoreRules(BaseModel):
+    """
+    The IgnoreRules class holds ignore patterns following the .gitignore semantics,
+    compiled into a single regex so that a path is matched in one pass.
+
+    Supported: comments, negation (!), directory-only patterns (trailing /),
+    anchored patterns (containing a /), *, ?, [...] and ** wildcards.
+    As in git, the last matching pattern decides whether a path is ignored.
+
+    Attributes:
+        patterns (list): The ignore patterns, in the order they are defined.
+        base (str): The directory the patterns are relative to, from the project root. Default is "" (root).
+    """
+
+    patterns: list
+    base: str = ""
+    _files_regex: Optional[re.Pattern] = PrivateAttr(default=None)
+    _dirs_regex: Optional[re.Pattern] = PrivateAttr(default=None)
+    _negated: dict = PrivateAttr(default_factory=dict)
+
+    @classmethod
+    def from_file(cls, file_path: str, base: str = ""):
+        with open(file_path, "r") as f:
+            return cls(patterns=f.read().splitlines(), base=base)
+
+    def model_post_init(self, __context):
+        files_regexes, dirs_regexes = [], []
+        # patterns are reversed so that the first matching alternative of the
+        # compiled regex is the last matching pattern
+        for i, pattern in reversed(list(enumerate(self.patterns))):
+            parsed = self._parse_pattern(pattern)
+            if parsed is None:
+                continue
+            regex, negated, dir_only = parsed
+            group = f"(?P<p{i}>{regex})"
+            self._negated[f"p{i}"] = negated
+            dirs_regexes.append(group)
+            if not dir_only:
+                files_regexes.append(group)
+        if files_regexes:
+            self._files_regex = re.compile("|".join(files_regexes))
+        if dirs_regexes:
+            self._dirs_regex = re.compile("|".join(dirs_regexes))
+
+    def match(self, rel_path: str, is_dir: bool = False) -> Optional[bool]:
+        """
+        returns True if the path (relative to the project root) is ignored, False if
+        it is re-included by a negated pattern and None if no pattern matches it
+        """
+        if self.base:
+            if not rel_path.startswith(self.base + "/"):
+                return None
+            rel_path = rel_path[len(self.base) + 1 :]
+        regex = self._dirs_regex if is_dir else self._files_regex
+        if regex is None:
+            return None
+        match = regex.fullmatch(rel_path)
+        if match is None:
+            return None
+        return not self._negated[match.lastgroup]
+
+    def _parse_pattern(self, pattern: str):
+        if pattern.endswith("\\ "):
+            pattern = pattern[:-2].rstrip() + " "
+        else:
+            pattern = pattern.rstrip()
+        if not pattern or pattern.startswith("#"):
+            return None
+        negated = pattern.startswith("!")
+        if negated:
+            pattern = pattern[1:]
+        elif pattern.startswith("\\"):
+            pattern = pattern[1:]
+        dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        if not pattern:
+            return None
+        # patterns containing a slash are relative to the base directory, other
+        # patterns match a file or directory name at any depth
+        anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+        regex = self._translate(pattern)
+        if not anchored:
+            regex = "(?:.*/)?" + regex
+        return regex, negated, dir_only
+
+    @staticmethod
+    def _translate(pattern: str):
+        regex, i, n = "", 0, len(pattern)
+        while i < n:
+            if pattern.startswith("**/", i):
+                regex += "(?:.*/)?"
+                i += 3
+            elif pattern.startswith("**", i) and i + 2 == n:
+                regex += ".*"
+                i += 2
+            elif pattern[i] == "*":
+                regex += "[^/]*"
+                i += 1
+            elif pattern[i] == "?":
+                regex += "[^/]"
+                i += 1
+            elif pattern[i] == "[":
+                end = pattern.find("]", i + 2)
+                if end == -1:
+                    regex += re.escape(pattern[i])
+                    i += 1
+                    continue
+                content = pattern[i + 1 : end]
+                if content.startswith("!"):
+                    content = "^" + content[1:]
+                regex += "[" + content.replace("\\", "\\\\") + "]"
+                i = end + 1
+            elif pattern[i] == "\\" and i + 1 < n:
+                regex += re.escape(pattern[i + 1])
+                i += 2
+            else:
+                regex += re.escape(pattern[i])
+                i += 1
+        return regex
+
+
+def load_ignore_rules(dir_path: str, rel_path: str = ""):
+    """loads the rules of the ignore files found in the given directory"""
+    rules = []
+    for file_name in IGNORE_FILES:
+        file_path = os.path.join(dir_path, file_name)
+        if os.path.isfile(file_path):
+            rules.append(IgnoreRules.from_file(file_path, base=rel_path))
+    return rules
+
+
+def is_ignored(rules: list, rel_path: str, is_dir: bool = False):
+    """the deepest rules take precedence over the ones defined higher in the tree"""
+    for rule in reversed(rules):
+        ignored = rule.match(rel_path, is_dir)
+        if ignored is not None:
+            return ignored
+    return False
@@ -1,11 +1,23 @@
 import asyncio
 import logging
-from typing import ClassVar
+import time
+from collections import defaultdict, deque
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Callable, Iterable, Optional
 
-from openai import AsyncOpenAI, OpenAI
 from pydantic import BaseModel, PrivateAttr
-from tenacity import retry, stop_after_attempt
-from tqdm.asyncio import tqdm_asyncio
+from tenacity import retry, retry_if_not_exception_type, stop_after_attempt
+
+from pycodedoc.costs import MODEL_INFO, calculate_cost
+from pycodedoc.tokens import get_token_index
+from pycodedoc.trace import (
+    RecordingClient,
+    ReplayClient,
+    Trace,
+    TraceMissError,
+    TraceRecorder,
+    get_usage_dict,
+)
 
 
 def log_retry(retry_state):
@@ -17,24 +29,287 @@ def log_retry(retry_state):
     )
 
 
+def get_usage(response) -> Optional[dict]:
+    """the token usage of a parsed or raw response, None if not reported"""
+    if isinstance(response, dict):
+        return response.get("usage")
+    return get_usage_dict(getattr(response, "usage", None))
+
+
+class BudgetExceededError(Exception):
+    """Raised when a request would exceed the maximum cost of a run."""
+
+
 class Llm(BaseModel):
+    """
+    Runs completions against the OpenAI API.
+
+    With adaptive_timeout, the timeout passed to the completions is a base which grows
+    with the size of the prompt, and with the 95th percentile of the latencies observed
+    for the model once enough requests completed. With hedge, a duplicate request is
+    sent when a request takes longer than that percentile: the first response wins and
+    the other request is cancelled.
+
+    With record_trace, every completed request is appended to a trace file with the
+    timing of its streamed chunks and its usage. With replay_trace, the responses are
+    served from such a trace instead of the OpenAI API, so that runs are deterministic
+    and need no network.
+
+    Attributes:
+        batch_size (int): The default maximum number of requests in flight. Default is 100.
+        max_retries (int): The number of retries of the OpenAI client. Default is 5.
+        adaptive_timeout (bool): Derive the timeouts from the prompt size and observed latencies. Default is True.
+        timeout_per_1k_tokens (float): The seconds added to the timeout per 1000 prompt tokens. Default is 2.
+        timeout_p95_factor (float): The timeout is at least this factor times the observed p95 latency. Default is 2.
+        hedge (bool): Send a duplicate request when a request exceeds the observed p95 latency. Default is False.
+        min_latency_samples (int): The number of latencies observed before using their percentiles. Default is 20.
+        retry_rounds (int): The number of times the failed requests of a batch are retried at its end. Default is 2.
+        retry_backoff (float): The seconds waited before the first retry round, doubled at each round. Default is 2.
+        max_cost (float): The maximum cost in $ of the requests, no request being sent once it would be exceeded. Default is None (no limit).
+        projected_output_tokens (int): The output tokens reserved for a request without max_tokens. Default is 500.
+        record_trace (str): The trace file the requests and responses are appended to. Default is None.
+        replay_trace (str): The trace file the responses are replayed from. Default is None.
+        replay_latency (bool): Replay the responses with their recorded latencies rather than instantly. Default is False.
+        max_concurrency (int): The maximum number of requests in flight across the batches run concurrently, e.g. by several DocGen sharing this Llm. Default is None (no limit).
+        track_usage (bool): Ask for the token usage of the streamed responses, including the prompt tokens served from the provider's cache. Default is False.
+    """
+
     batch_size: int = 100
     max_retries: int = 5
-    _client: ClassVar[OpenAI] = PrivateAttr(OpenAI())
+    adaptive_timeout: bool = True
+    timeout_per_1k_tokens: float = 2.0
+    timeout_p95_factor: float = 2.0
+    hedge: bool = False
+    min_latency_samples: int = 20
+    retry_rounds: int = 2
+    retry_backoff: float = 2.0
+    max_cost: Optional[float] = None
+    projected_output_tokens: int = 500
+    record_trace: Optional[str] = None
+    replay_trace: Optional[str] = None
+    replay_latency: bool = False
+    max_concurrency: Optional[int] = None
+    track_usage: bool = False
+    _recorder: Optional[TraceRecorder] = PrivateAttr(default=None)
+    _trace: Optional[Trace] = PrivateAttr(default=None)
+    _spent: float = PrivateAttr(default=0.0)
+    _reserved: float = PrivateAttr(default=0.0)
+    _reservations: int = PrivateAttr(default=0)
+    _usage: dict = PrivateAttr(default_factory=lambda: defaultdict(int))
+    _client: object = PrivateAttr(default=None)
+    _async_client: object = PrivateAttr(default=None)
+    _sessions: int = PrivateAttr(default=0)
+    _session_stack: Optional[AsyncExitStack] = PrivateAttr(default=None)
+    _limiter: Optional[tuple] = PrivateAttr(default=None)
+    _settled: Optional[tuple] = PrivateAttr(default=None)
+    _latencies: dict = PrivateAttr(
+        default_factory=lambda: defaultdict(lambda: deque(maxlen=500))
+    )
+
+    @property
+    def client(self):
+        """creates the OpenAI client on first use to keep imports and startup light"""
+        if self._client is None:
+            self._client = self.get_client()
+        return self._client
+
+    def get_client(self, is_async: bool = False, client=None):
+        """
+        the given or a new OpenAI client, replaced by a client replaying the trace or
+        wrapped by a client recording it when configured
+        """
+        if self.replay_trace is not None:
+            if self._trace is None:
+                self._trace = Trace(
+                    path=self.replay_trace, realtime=self.replay_latency
+                )
+            return ReplayClient(self._trace, is_async)
+        if client is None and is_async:
+            from openai import AsyncOpenAI
+
+            client = AsyncOpenAI(max_retries=self.max_retries)
+        elif client is None:
+            from openai import OpenAI
+
+            client = OpenAI()
+        if self.record_trace is not None:
+            if self._recorder is None:
+                self._recorder = TraceRecorder(path=self.record_trace)
+            return RecordingClient(client, self._recorder, is_async)
+        return client
+
+    @asynccontextmanager
+    async def async_session(self, client=None):
+        """
+        shares one async client between all the batches run within the session, e.g.
+        by several DocGen sharing this Llm. The client is the given one, left open for
+        its owner, or a new one closed when the last nested session exits, along with
+        the recorded trace.
+        """
+        if self._sessions == 0:
+            self._session_stack = AsyncExitStack()
+            if client is None:
+                client = await self._session_stack.enter_async_context(
+                    self.get_client(is_async=True)
+                )
+            else:
+                client = self.get_client(is_async=True, client=client)
+            self._async_client = client
+        self._sessions += 1
+        try:
+            yield self._async_client
+        finally:
+            self._sessions -= 1
+            if self._sessions == 0:
+                self._async_client = None
+                await self._session_stack.aclose()
+                self.close_trace()
+
+    def close_trace(self):
+        """closes the recorded trace, completing it when compressed"""
+        if self._recorder is not None:
+            self._recorder.close()
+
+    def get_limiter(self) -> Optional[asyncio.Semaphore]:
+        """the semaphore enforcing max_concurrency on the running event loop"""
+        if self.max_concurrency is None:
+            return None
+        loop = asyncio.get_running_loop()
+        # sync batches run each on their own event loop
+        if self._limiter is None or self._limiter[0] is not loop:
+            self._limiter = (loop, asyncio.Semaphore(self.max_concurrency))
+        return self._limiter[1]
+
+    def get_timeout(self, messages: list, model: str, timeout: float = None):
+        """derives the timeout of a request from its base timeout"""
+        if not self.adaptive_timeout or timeout is None:
+            return timeout
+        # the counts are memoized by the index, shared with the admission of the request
+        tokens = get_token_index(model).count_messages(messages)
+        timeout += self.timeout_per_1k_tokens * tokens / 1000
+        p95 = self.get_latency_percentile(model, 95)
+        if p95 is not None:
+            timeout = max(timeout, self.timeout_p95_factor * p95)
+        return timeout
+
+    def get_settled_event(self) -> asyncio.Event:
+        """the event set when the next reservation is settled, on the running loop"""
+        loop = asyncio.get_running_loop()
+        if self._settled is None or self._settled[0] is not loop:
+            self._settled = (loop, asyncio.Event())
+        return self._settled[1]
+
+    def get_latency_percentile(self, model: str, percentile: float) -> Optional[float]:
+        latencies = self._latencies[model]
+        if len(latencies) < self.min_latency_samples:
+            return None
+        latencies = sorted(latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * percentile / 100))
+        return latencies[index]
+
+    def record_latency(self, model: str, latency: float):
+        self._latencies[model].append(latency)
+
+    def get_spent(self) -> float:
+        """the cost of the requests sent so far, from their usage when reported"""
+        return self._spent
+
+    def check_prices(self, models: Iterable[str]):
+        """raises a ValueError if max_cost is set and the price of a model is unknown"""
+        if self.max_cost is None:
+            return
+        unknown = sorted({model for model in models if model not in MODEL_INFO})
+        if unknown:
+            raise ValueError(
+                f"Cannot enforce max_cost, the price of {', '.join(unknown)} is "
+                f"unknown. Known models: {', '.join(MODEL_INFO)}."
+            )
+
+    def reserve_cost(self, messages: list, model: str, max_tokens: int = None):
+        """
+        reserves the projected cost of a request, raising BudgetExceededError if it
+        would exceed max_cost together with the cost spent and reserved so far
+        """
+        if self.max_cost is None:
+            return 0.0
+        if model not in MODEL_INFO:
+            raise ValueError(
+                f"Cannot enforce max_cost, the price of {model} is unknown."
+            )
+        cost = calculate_cost(
+            get_token_index(model).count_messages(messages),
+            max_tokens or self.projected_output_tokens,
+            model,
+        )
+        if self._spent + self._reserved + cost > self.max_cost:
+            raise BudgetExceededError(
+                f"Spent ${self._spent:.4f} of ${self.max_cost:.4f}, "
+                f"the next request would exceed the budget."
+            )
+        self._reserved += cost
+        self._reservations += 1
+        return cost
+
+    def settle_cost(self, reserved: float, model: str, usage: dict = None):
+        """replaces a reservation by the actual cost, or keeps it if unknown"""
+        if self.max_cost is None:
+            return
+        self._reservations -= 1
+        # reset when nothing is reserved so that rounding errors do not add up
+        self._reserved = self._reserved - reserved if self._reservations else 0.0
+        if usage is None:
+            self._spent += reserved
+        else:
+            self._spent += calculate_cost(
+                usage["prompt_tokens"], usage["completion_tokens"], model
+            )
+        if self._settled is not None:
+            # wakes up the requests waiting for budget, the next ones get a new event
+            self._settled[1].set()
+            self._settled = None
+
+    def record_usage(self, usage: dict = None):
+        for key, value in (usage or {}).items():
+            self._usage[key] += value
+
+    def get_usage(self) -> dict:
+        """the total prompt, cached and completion tokens of the responses reporting them"""
+        return dict(self._usage)
+
+    def get_request_kwargs(self, kwargs: dict) -> dict:
+        if (self.max_cost is not None or self.track_usage) and kwargs.get("stream"):
+            # streamed responses only report their usage when asked
+            return dict(kwargs, stream_options={"include_usage": True})
+        return kwargs
 
     def run_completions(self, messages, model="gpt-3.5-turbo-0125", **kwargs) -> list:
         """runs completions synchronously"""
-        response = self._client.chat.completions.create(
-            messages=messages, model=model, **kwargs
-        )
-        if "stream" in kwargs and kwargs["stream"]:
-            response = self._parse_stream(response)
+        if "timeout" in kwargs:
+            kwargs["timeout"] = self.get_timeout(messages, model, kwargs["timeout"])
+        reserved = self.reserve_cost(messages, model, kwargs.get("max_tokens"))
+        response = None
+        try:
+            start = time.perf_counter()
+            response = self.client.chat.completions.create(
+                messages=messages, model=model, **self.get_request_kwargs(kwargs)
+            )
+            if "stream" in kwargs and kwargs["stream"]:
+                response = self._parse_stream(response)
+            self.record_latency(model, time.perf_counter() - start)
+        finally:
+            usage = get_usage(response)
+            self.settle_cost(reserved, model, usage)
+            self.record_usage(usage)
         return response
 
     def _parse_stream(self, stream):
         """parses stream response from completions"""
         response = {"role": "assistant", "content": None, "tool_calls": None}
         for chunk in stream:
+            if getattr(chunk, "usage", None):
+                response["usage"] = get_usage(chunk)
+            if not chunk.choices:
+                continue
             choice = chunk.choices[0]
             if choice.delta and choice.delta.content:
                 self._parse_delta_content(choice.delta, response)
@@ -42,38 +317,237 @@ class Llm(BaseModel):
                 self._parse_delta_tools(choice.delta, response)
         return response
 
-    def run_batch_completions(self, messages_batches: list, **kwargs) -> list:
+    def run_batch_completions(
+        self,
+        messages_batches: Iterable,
+        max_in_flight: int = None,
+        route: Callable = None,
+        on_response: Callable = None,
+        **kwargs,
+    ) -> Optional[list]:
         """run completions by batch asynchronously"""
-        return asyncio.run(self._run_batch_completions(messages_batches, **kwargs))
-
-    async def _run_batch_completions(self, messages_batches: list, **kwargs) -> list:
-        """runs completions by batch asynchronously"""
-        async with AsyncOpenAI(max_retries=self.max_retries) as client:
-            coroutines = [
-                self._run_async_completions(client, messages, **kwargs)
-                for messages in messages_batches
-            ]
-            responses = []
-            async for batch_responses in self._run_batches(coroutines):
-                responses.extend(batch_responses)
-            return responses
-
-    @retry(stop=stop_after_attempt(3), after=log_retry)
+        return asyncio.run(
+            self.arun_batch_completions(
+                messages_batches, max_in_flight, route, on_response, **kwargs
+            )
+        )
+
+    async def arun_batch_completions(
+        self,
+        messages_batches: Iterable,
+        max_in_flight: int = None,
+        route: Callable = None,
+        on_response: Callable = None,
+        **kwargs,
+    ) -> Optional[list]:
+        """
+        runs completions asynchronously, with at most max_in_flight (default batch_size)
+        requests in flight. route(messages) optionally returns the model of a request.
+
+        The messages are consumed lazily, each one when a request slot is free, and
+        on_response(index, response) is called as soon as each response is complete, so
+        that memory stays proportional to max_in_flight rather than to the batch size.
+        Without on_response, the responses are returned as a list.
+
+        A failing request does not abort the batch: it is queued and retried once all
+        the other requests completed. Requests still failing after the retry rounds get
+        a None response.
+
+        Once max_cost would be exceeded, no new request is sent: the requests in flight
+        complete, the others get no response, and BudgetExceededError is raised.
+
+        The batch runs on the running event loop, with the client of the current
+        async_session if any, and at most max_concurrency requests are in flight across
+        all the batches run concurrently.
+        """
+        from tqdm import tqdm
+
+        if route is None:
+            self.check_prices([kwargs.get("model", "gpt-3.5-turbo-0125")])
+        responses = None
+        if on_response is None:
+            responses = {}
+            on_response = responses.__setitem__
+        n_workers = max_in_flight or self.batch_size
+        total = len(messages_batches) if hasattr(messages_batches, "__len__") else None
+        failed, stopped = {}, asyncio.Event()
+        with tqdm(total=total, desc="Running completions") as progress:
+            async with self.async_session() as client:
+                requests = self._iter_requests(messages_batches, route, kwargs)
+                await self._run_workers(
+                    client, requests, n_workers, on_response, failed, stopped, progress
+                )
+                for retry_round in range(self.retry_rounds):
+                    if not failed or stopped.is_set():
+                        break
+                    await asyncio.sleep(self.retry_backoff * 2**retry_round)
+                    logging.warning(
+                        "Retrying %s failed requests (round %s)",
+                        len(failed),
+                        retry_round + 1,
+                    )
+                    requests = [(i, *failed[i][:2]) for i in sorted(failed)]
+                    failed = {}
+                    await self._run_workers(
+                        client,
+                        requests,
+                        n_workers,
+                        on_response,
+                        failed,
+                        stopped,
+                        progress,
+                    )
+            if stopped.is_set():
+                # the unsent and failed requests are left to a later run
+                raise BudgetExceededError(
+                    f"Stopped after spending ${self._spent:.4f} of ${self.max_cost:.4f}."
+                )
+            for i in sorted(failed):
+                logging.error("Request failed permanently: %r", failed[i][2])
+                on_response(i, None)
+                progress.update()
+        if responses is not None:
+            return [responses[i] for i in sorted(responses)]
+
+    def _iter_requests(self, messages_batches: Iterable, route: Callable, kwargs):
+        for i, messages in enumerate(messages_batches):
+            if route is not None:
+                yield i, messages, dict(kwargs, model=route(messages))
+            else:
+                yield i, messages, kwargs
+
+    async def _run_workers(
+        self, client, requests, n_workers, on_response, failed, stopped, progress
+    ):
+        """
+        runs the requests with n_workers workers pulling them from a bounded queue, the
+        failed requests being added to failed as index -> (messages, kwargs, error).
+        stopped is set, and the remaining requests skipped, once the budget is spent.
+        """
+        queue = asyncio.Queue(maxsize=n_workers)
+
+        async def produce():
+            for request in requests:
+                if stopped.is_set():
+                    break
+                await queue.put(request)
+            for _ in range(n_workers):
+                await queue.put(None)
+
+        async def consume():
+            while (request := await queue.get()) is not None:
+                i, messages, kwargs = request
+                if stopped.is_set():
+                    continue
+                try:
+                    response = await self._run_limited_request(
+                        client, messages, **kwargs
+                    )
+                except BudgetExceededError:
+                    stopped.set()
+                    continue
+                except Exception as e:
+                    failed[i] = (messages, kwargs, e)
+                    continue
+                on_response(i, response)
+                progress.update()
+
+        await asyncio.gather(produce(), *[consume() for _ in range(n_workers)])
+
+    async def _run_limited_request(self, client, messages, **kwargs):
+        limiter = self.get_limiter()
+        if limiter is None:
+            return await self._run_budgeted_request(client, messages, **kwargs)
+        async with limiter:
+            return await self._run_budgeted_request(client, messages, **kwargs)
+
+    async def _run_budgeted_request(self, client, messages, **kwargs):
+        """
+        the requests in flight usually cost less than reserved, so a request exceeding
+        the budget waits for them to complete before giving up
+        """
+        while True:
+            # taken before trying, so that a settlement in between is not missed
+            settled = self.get_settled_event()
+            try:
+                return await self._run_request(client, messages, **kwargs)
+            except BudgetExceededError:
+                if self._reservations == 0:
+                    raise
+                await settled.wait()
+
+    async def _run_request(self, client, messages, **kwargs):
+        if self.hedge:
+            return await self._run_hedged_completions(client, messages, **kwargs)
+        return await self._run_async_completions(client, messages, **kwargs)
+
+    async def _run_hedged_completions(self, client, messages, **kwargs):
+        """sends a duplicate request if the first one exceeds the p95 latency"""
+        model = kwargs.get("model", "gpt-3.5-turbo-0125")
+        p95 = self.get_latency_percentile(model, 95)
+        first = asyncio.ensure_future(
+            self._run_async_completions(client, messages, **kwargs)
+        )
+        if p95 is None:
+            return await first
+        done, _ = await asyncio.wait({first}, timeout=p95)
+        if done:
+            return first.result()
+        logging.info("Hedging request to %s exceeding %.1fs", model, p95)
+        second = asyncio.ensure_future(
+            self._run_async_completions(client, messages, **kwargs)
+        )
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                # a failed request still leaves a chance to the other one
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            return done.pop().result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    @retry(
+        stop=stop_after_attempt(3),
+        retry=retry_if_not_exception_type((BudgetExceededError, TraceMissError)),
+        after=log_retry,
+    )
     async def _run_async_completions(
         self, client, messages, model="gpt-3.5-turbo-0125", **kwargs
     ):
         """runs completions asynchronously"""
-        response = await client.chat.completions.create(
-            messages=messages, model=model, **kwargs
-        )
-        if "stream" in kwargs and kwargs["stream"]:
-            response = await self._parse_async_stream(response)
+        if "timeout" in kwargs:
+            kwargs["timeout"] = self.get_timeout(messages, model, kwargs["timeout"])
+        # every attempt is paid for, including the failed and cancelled ones
+        reserved = self.reserve_cost(messages, model, kwargs.get("max_tokens"))
+        response = None
+        try:
+            start = time.perf_counter()
+            response = await client.chat.completions.create(
+                messages=messages, model=model, **self.get_request_kwargs(kwargs)
+            )
+            if "stream" in kwargs and kwargs["stream"]:
+                response = await self._parse_async_stream(response)
+            self.record_latency(model, time.perf_counter() - start)
+        finally:
+            usage = get_usage(response)
+            self.settle_cost(reserved, model, usage)
+            self.record_usage(usage)
         return response
 
     async def _parse_async_stream(self, stream):
         """parses stream response from async completions"""
         response = {"role": "assistant", "content": None, "tool_calls": None}
         async for chunk in stream:
+            if getattr(chunk, "usage", None):
+                response["usage"] = get_usage(chunk)
+            if not chunk.choices:
+                continue
             choice = chunk.choices[0]
             if choice.delta and choice.delta.content:
                 self._parse_delta_content(choice.delta, response)
@@ -81,16 +555,6 @@ class Llm(BaseModel):
                 self._parse_delta_tools(choice.delta, response)
         return response
 
-    async def _run_batches(self, coroutines: list):
-        for batch_nr, batch in enumerate(self._batches(coroutines, self.batch_size)):
-            yield await tqdm_asyncio.gather(
-                *batch, desc=f"Running completions for batch nr {batch_nr+1}"
-            )
-
-    def _batches(self, items, batch_size):
-        for i in range(0, len(items), batch_size):
-            yield items[i : i + batch_size]
-
     def _parse_delta_content(self, delta, response):
         if response["content"] is None:
             response["content"] = ""
@@ -1,14 +1,22 @@
 import ast
-import copy
+import fnmatch
 import os
-from fnmatch import fnmatch
-from pathlib import Path
-from typing import Any, List, Union
+import re
+from typing import Any, List, Optional, Union
 
-from code2flow import engine
 from pydantic import BaseModel, Field, PrivateAttr
 
-from pycodedoc.utils import set_logger
+from pycodedoc.cache import Cache, is_within
+from pycodedoc.graphs import GraphReducer
+from pycodedoc.ignore import IgnoreRules, is_ignored, load_ignore_rules
+from pycodedoc.skeleton import render_filtered, render_structure
+from pycodedoc.tokens import (
+    TokenSizes,
+    get_encoding_name,
+    get_entity_key,
+    get_token_index,
+)
+from pycodedoc.utils import paused_gc, set_logger
 
 CONFIG = {
     "include_file_patterns": ["*.py"],
@@ -26,6 +34,7 @@ class Function(BaseModel):
     code: str
     type: str = "function"
     is_method: bool
+    docstring: Optional[str] = None
 
 
 class Class(BaseModel):
@@ -34,6 +43,7 @@ class Class(BaseModel):
     node: object
     code: str
     type: str = "class"
+    docstring: Optional[str] = None
     methods: List[Function] = Field(default_factory=list)
 
     def parse_methods(self):
@@ -47,6 +57,7 @@ class Class(BaseModel):
                         node=node,
                         code=ast.unparse(node),
                         is_method=True,
+                        docstring=ast.get_docstring(node),
                     )
                 )
 
@@ -65,7 +76,11 @@ class Module(BaseModel):
         for node in self.node.body:
             if isinstance(node, ast.ClassDef):
                 class_ = Class(
-                    name=node.name, path=self.path, node=node, code=ast.unparse(node)
+                    name=node.name,
+                    path=self.path,
+                    node=node,
+                    code=ast.unparse(node),
+                    docstring=ast.get_docstring(node),
                 )
                 class_.parse_methods()
                 self.entities.append(class_)
@@ -78,6 +93,7 @@ class Module(BaseModel):
                         node=node,
                         code=ast.unparse(node),
                         is_method=False,
+                        docstring=ast.get_docstring(node),
                     )
                 )
 
@@ -88,33 +104,133 @@ class Parser(BaseModel):
     include_file_patterns: list = CONFIG["include_file_patterns"]
     strip_imports: bool = False
     strip_globals: bool = True
+    use_ignore_files: bool = True
+    modules_paths: Optional[list] = None
+    cache_dir: Optional[str] = None
+    graph_reducer: GraphReducer = Field(default_factory=GraphReducer)
     _modules: List[Module] = PrivateAttr(default_factory=list)
+    _flows: dict = PrivateAttr(default_factory=dict)
+    _graph_details: dict = PrivateAttr(default_factory=dict)
+    _token_sizes: dict = PrivateAttr(default_factory=dict)
+    _index: dict = PrivateAttr(default=None)
+    _trees: dict = PrivateAttr(default_factory=dict)
+    _include_regex: Any = PrivateAttr(default=None)
+    _cache: Optional[Cache] = PrivateAttr(default=None)
+    _abspaths: dict = PrivateAttr(default_factory=dict)
 
     def model_post_init(self, __context: Any) -> None:
+        if self.cache_dir is not None:
+            if is_within(self.cache_dir, self.base_dir):
+                raise ValueError(
+                    f"The cache directory {self.cache_dir} is within the documented "
+                    f"directory {self.base_dir}: its pickles could be planted by "
+                    "anyone able to change the code. Use a directory outside of it."
+                )
+            self._cache = Cache(cache_dir=self.cache_dir)
         self.parse_modules()
 
     def parse_modules(self):
-        for module_path in self.get_modules_paths():
-            self._modules.append(self.parse_module(module_path))
+        if self.modules_paths is None:
+            modules_paths = self.get_modules_paths()
+        else:
+            # only parse a subset of the project, e.g. a shard of a large codebase
+            modules_paths = self.modules_paths
+        with paused_gc():
+            for module_path in modules_paths:
+                self._modules.append(self.parse_module(module_path))
 
     def parse_module(self, module_path: str) -> Module:
+        if self._cache is not None:
+            key = self._cache.get_key("modules", [module_path], self.base_dir)
+            module = self._cache.load("modules", key)
+            if module is not None:
+                return module
         with open(os.path.join(self.base_dir, module_path), "r") as source:
             module = source.read()
         node = ast.parse(module)
         module = Module(path=module_path, node=node, code=ast.unparse(node))
         module.parse_entities()
+        if self._cache is not None:
+            self._cache.save("modules", key, module)
         return module
 
-    def get_modules(self, module_path: str = None, attr: str = None):
+    def add_modules(self, modules_paths: list):
+        """parses the given modules if not parsed yet, keeping the modules in project order"""
+        parsed = {module.path for module in self._modules}
+        with paused_gc():
+            for module_path in modules_paths:
+                if module_path not in parsed:
+                    self._modules.append(self.parse_module(module_path))
+                parsed.add(module_path)
+        order = {path: i for i, path in enumerate(self.get_modules_paths())}
+        self._modules.sort(key=lambda module: order.get(module.path, len(order)))
+
+    def select_modules(self, include: list = None, entries: list = None) -> list:
+        """
+        returns the paths of the modules matching the include patterns, which are globs
+        or directories relative to base_dir, and of the entry modules together with the
+        modules they import directly or not. The selected modules are parsed.
+        """
+        modules_paths = self.get_modules_paths()
+        selected = set()
+        for pattern in include or []:
+            pattern = pattern.rstrip("/")
+            selected.update(
+                path
+                for path in modules_paths
+                if fnmatch.fnmatch(path, pattern) or path.startswith(f"{pattern}/")
+            )
+        unknown = set(entries or []).difference(modules_paths)
+        if unknown:
+            raise ValueError(f"Entry modules not found in the project: {unknown}")
+        pending = set(entries or [])
+        while pending:
+            self.add_modules(sorted(pending))
+            selected.update(pending)
+            pending = {
+                dep_path
+                for path in pending
+                for dep_path in self.get_module_deps_paths(path)
+            }.difference(selected)
+        selected = [path for path in modules_paths if path in selected]
+        self.add_modules(selected)
+        return selected
+
+    def update_modules(self, modified_paths: list = None, removed_paths: list = None):
+        """re-parses modified or added modules and drops removed ones"""
+        modified_paths, removed_paths = modified_paths or [], removed_paths or []
+        changed = set(modified_paths) | set(removed_paths)
+        self.reset_index()
+        self._modules = [
+            module for module in self._modules if module.path not in removed_paths
+        ]
+        positions = {module.path: i for i, module in enumerate(self._modules)}
+        for module_path in modified_paths:
+            module = self.parse_module(module_path)
+            if module_path in positions:
+                self._modules[positions[module_path]] = module
+            else:
+                self._modules.append(module)
+        # drop the execution flows involving any of the changed files
+        changed_paths = {os.path.join(self.base_dir, path) for path in changed}
+        for paths in list(self._flows):
+            if changed_paths.intersection(paths):
+                del self._flows[paths]
+        for module_path, encoding_name in list(self._token_sizes):
+            if module_path in changed:
+                del self._token_sizes[(module_path, encoding_name)]
+
+    def get_modules(self, module_path: Union[str, list] = None, attr: str = None):
         if module_path:
-            absolute_module_path = os.path.abspath(
-                os.path.join(self.base_dir, module_path)
+            module_paths = (
+                [module_path] if isinstance(module_path, str) else module_path
             )
+            absolute_module_paths = {self.get_abspath(path) for path in module_paths}
+            abspaths = self.get_abspaths()
             modules = [
                 module
                 for module in self._modules
-                if os.path.abspath(os.path.join(self.base_dir, module.path))
-                == absolute_module_path
+                if abspaths[module.path] in absolute_module_paths
             ]
         else:
             modules = self._modules
@@ -123,6 +239,17 @@ class Parser(BaseModel):
         else:
             return modules
 
+    def get_abspath(self, module_path: str) -> str:
+        return os.path.abspath(os.path.join(self.base_dir, module_path))
+
+    def get_abspaths(self) -> dict:
+        """the absolute path of each parsed module, memoized as they are looked up often"""
+        abspaths = self._abspaths
+        for module in self._modules:
+            if module.path not in abspaths:
+                abspaths[module.path] = self.get_abspath(module.path)
+        return abspaths
+
     def get_module(self, module_path: str, attr: str = None):
         if attr is None:
             return self.get_modules(module_path)[0]
@@ -168,21 +295,59 @@ class Parser(BaseModel):
         else:
             return entities
 
+    def get_token_sizes(self, module_path: str, model: str) -> TokenSizes:
+        """
+        the token sizes of a module and its entities for the model's encoding, computed
+        once and cached on disk along with the parsed module
+        """
+        encoding_name = get_encoding_name(model)
+        if (module_path, encoding_name) in self._token_sizes:
+            return self._token_sizes[(module_path, encoding_name)]
+        sizes = None
+        if self._cache is not None:
+            # the structures depend on the settings of the parser
+            variant = f"{encoding_name}-{self.strip_imports}-{self.strip_globals}"
+            key = self._cache.get_key("tokens", [module_path], self.base_dir, variant)
+            sizes = self._cache.load("tokens", key)
+        if sizes is None:
+            sizes = self._count_tokens(self.get_module(module_path), model)
+            if self._cache is not None:
+                self._cache.save("tokens", key, sizes)
+        self._token_sizes[(module_path, encoding_name)] = sizes
+        return sizes
+
+    def _count_tokens(self, module: Module, model: str) -> TokenSizes:
+        index = get_token_index(model)
+        sizes = TokenSizes(
+            module=index.count(module.code),
+            structure=index.count(self.get_code_structure(module)),
+        )
+        for entity in module.entities:
+            entities = [entity]
+            if isinstance(entity, Class):
+                structure = self.get_code_structure(entity)
+                sizes.structures[get_entity_key(entity)] = index.count(structure)
+                entities += entity.methods
+            for sized in entities:
+                sizes.entities[get_entity_key(sized)] = index.count(sized.code)
+                if sized.docstring:
+                    sizes.docstrings[get_entity_key(sized)] = index.count(
+                        sized.docstring
+                    )
+        return sizes
+
     def get_code_structure(
         self,
         entity: Union[Function, Module, Class],
         descriptions: dict = None,
-        copy_entity: bool = False,
     ):
-        if copy_entity:
-            entity = copy.deepcopy(entity)
-        if isinstance(entity, Module):
-            self.parse_module_structure(entity.node, descriptions)
-        elif isinstance(entity, Class):
-            self.parse_class_structure(entity.node, descriptions)
-        elif isinstance(entity, Function):
-            self.parse_function_structure(entity.node, descriptions)
-        return ast.unparse(entity.node)
+        return render_structure(
+            entity.node,
+            descriptions,
+            strip_imports=self.strip_imports,
+            strip_globals=self.strip_globals,
+            name=entity.uname if isinstance(entity, Function) else None,
+        )
 
     def get_deps_code(
         self,
@@ -190,21 +355,49 @@ class Parser(BaseModel):
         deps: List[Module],
         output_dir: str,
         create_graphs: bool = False,
+        builder=None,
+        descriptions: dict = None,
+        modules_descriptions: dict = None,
+        prefix: str = None,
     ):
-        module = copy.deepcopy(module)
-        deps = [copy.deepcopy(dep) for dep in deps]
-        groups, nodes, edges, execution_graph = self.parse_module_deps(module, deps)
         if create_graphs:
-            file_path = os.path.join(output_dir, "graphs", f"{module.name}_deps.gv")
-            self._write_graphs(groups, nodes, edges, file_path)
-        deps_code = self.concat_dep_code(deps)
-        return ast.unparse(module.node), deps_code, execution_graph
+            self.write_deps_graphs(module, deps, output_dir)
+        groups, nodes, edges, execution_graph = self.parse_module_deps(module, deps)
+        functions, classes = self.get_related_names(groups, nodes)
+        module_code = self.get_filtered_code(module, functions, classes)
+        deps_code = self.concat_dep_code(deps, functions, classes)
+        if builder is not None:
+            # fit the dependencies' code into the builder's token budget
+            deps_code = builder.build(
+                self,
+                module,
+                module_code,
+                deps,
+                nodes,
+                edges,
+                execution_graph,
+                deps_code,
+                descriptions,
+                modules_descriptions,
+                prefix,
+            ).code
+        return module_code, deps_code, execution_graph
+
+    def get_filtered_code(self, module: Module, functions: set, classes: set):
+        """returns the code of the module containing only the given entities"""
+        return render_filtered(
+            module.node,
+            functions,
+            classes,
+            strip_imports=self.strip_imports,
+            strip_globals=self.strip_globals,
+        )
 
-    def concat_dep_code(self, deps):
+    def concat_dep_code(self, deps, functions: set, classes: set):
         deps_code = ""
         for dep in deps:
             deps_code += f"\n\nFILE {dep.name}.py:\n\n"
-            deps_code += ast.unparse(dep.node)
+            deps_code += self.get_filtered_code(dep, functions, classes)
         return deps_code
 
     def write_graphs(self, module: Module, output_dir: str):
@@ -214,149 +407,180 @@ class Parser(BaseModel):
         file_path = os.path.join(output_dir, "graphs", f"{module.name}.gv")
         return self._write_graphs(groups, nodes, edges, file_path)
 
+    def write_deps_graphs(self, module: Module, deps: List[Module], output_dir: str):
+        groups, nodes, edges, _ = self.parse_module_deps(module, deps)
+        file_path = os.path.join(output_dir, "graphs", f"{module.name}_deps.gv")
+        return self._write_graphs(groups, nodes, edges, file_path)
+
     def _write_graphs(self, groups, nodes, edges, file_path):
+        # large graphs are reduced, possibly into an overview and detail graphs
         if any(edges):
-            if not os.path.exists(os.path.dirname(file_path)):
-                os.makedirs(os.path.dirname(file_path))
-            try:
-                with open(file_path, "w") as fh:
-                    engine.write_file(
-                        fh,
-                        nodes=nodes,
-                        edges=edges,
-                        groups=groups,
-                        hide_legend=False,
-                        no_grouping=False,
-                        as_json=False,
-                    )
-                png_file_path = os.path.splitext(file_path)[0] + ".png"
-                engine._generate_final_img(file_path, "png", png_file_path, len(edges))
-            except FileNotFoundError as e:
-                if e.filename == "dot":
-                    logger.error(
-                        "Graphviz is not installed correctly. Please install it to generate the graphs."
-                    )
-                    os.remove(file_path)
-                    os.remove(png_file_path)
+            stem, ext = os.path.splitext(file_path)
+            details = []
+            for suffix, *graph in self.graph_reducer.reduce(groups, nodes, edges):
+                if not self._write_graph(*graph, stem + suffix + ext):
                     return False
-                else:
-                    raise e
-            except Exception as e:
-                raise e
+                if suffix:
+                    details.append(stem + suffix + ".png")
+            self._graph_details[os.path.normpath(stem + ".png")] = details
         return True
 
-    def parse_function_structure(
-        self,
-        node: Union[ast.FunctionDef, ast.AsyncFunctionDef],
-        descriptions: dict = None,
-    ):
-        node.body = []
-        if descriptions:
-            # add docstring to function body
-            docstring = descriptions[node.name]
-            node.body.append(ast.Expr(ast.Constant(docstring)))
-        # add ellipsis to function body
-        node.body.append(ast.Expr(ast.Constant(...)))
-
-    def parse_class_structure(self, node: ast.ClassDef, descriptions: dict = None):
-        for child in node.body:
-            if type(child) in (ast.FunctionDef, ast.AsyncFunctionDef):
-                child.body = []
-                if descriptions:
-                    # add docstring to child body
-                    docstring = descriptions[f"{node.name}.{child.name}"]
-                    child.body.append(ast.Expr(ast.Constant(docstring)))
-                # add ellipsis to child body
-                child.body.append(ast.Expr(ast.Constant(...)))
-
-    def parse_module_structure(self, node: ast.Module, descriptions: dict = None):
-        for child in node.body[:]:
-            if type(child) in (ast.FunctionDef, ast.AsyncFunctionDef):
-                self.parse_function_structure(child, descriptions)
-            elif type(child) == ast.ClassDef:
-                self.parse_class_structure(child, descriptions)
-            elif type(child) in (ast.Import, ast.ImportFrom):
-                if self.strip_imports:
-                    node.body.pop(node.body.index(child))
+    def get_graph_details(self, png_file_path: str) -> List[str]:
+        """the detail graphs written along with a graph, when split"""
+        return self._graph_details.get(os.path.normpath(png_file_path), [])
+
+    def _write_graph(self, groups, nodes, edges, file_path):
+        from code2flow import engine
+
+        if not os.path.exists(os.path.dirname(file_path)):
+            os.makedirs(os.path.dirname(file_path))
+        try:
+            with open(file_path, "w") as fh:
+                engine.write_file(
+                    fh,
+                    nodes=nodes,
+                    edges=edges,
+                    groups=groups,
+                    hide_legend=False,
+                    no_grouping=False,
+                    as_json=False,
+                )
+            png_file_path = os.path.splitext(file_path)[0] + ".png"
+            engine._generate_final_img(file_path, "png", png_file_path, len(edges))
+        except FileNotFoundError as e:
+            if e.filename == "dot":
+                logger.error(
+                    "Graphviz is not installed correctly. Please install it to generate the graphs."
+                )
+                os.remove(file_path)
+                os.remove(png_file_path)
+                return False
             else:
-                if self.strip_globals:
-                    node.body.pop(node.body.index(child))
+                raise e
+        except Exception as e:
+            raise e
+        return True
 
     def get_modules_paths(self):
-        paths = []
-        for path in self._get_paths_recursively(self.base_dir):
-            paths.append(os.path.relpath(path, self.base_dir))
-        return paths
-
-    def _get_paths_recursively(self, path: str):
-        paths = self._get_matching_paths(path)
-        for path in paths:
-            if path.is_dir():
+        return list(self._get_paths_recursively(""))
+
+    def _get_paths_recursively(self, rel_path: str):
+        for name, is_dir, _ in self.get_index()[rel_path]:
+            path = os.path.join(rel_path, name)
+            if is_dir:
                 yield from self._get_paths_recursively(path)
             else:
-                yield str(path)
-
-    def _get_matching_paths(self, path):
-        return list(
-            path
-            for path in Path(path).iterdir()
-            if self._not_match(path, self.exclude_patterns)
-            and self._match(path, self.include_file_patterns)
-        )
-
-    def _not_match(self, path: Path, patterns: list):
-        if any(patterns):
-            for pattern in patterns:
-                if fnmatch(path.name, pattern):
-                    return False
-            return True
-        else:
-            return True
-
-    def _match(self, path: Path, file_patterns: list, match_dir: bool = False):
-        if any(file_patterns):
-            if path.is_file():
-                return any([fnmatch(path.name, pattern) for pattern in file_patterns])
-            if match_dir and path.is_dir():
-                return any(
-                    [any(list(path.glob(f"**/{pattern}"))) for pattern in file_patterns]
-                )
-        return True
-
-    def get_tree(self):
-        tree = ""
-        for path_element in self._get_tree_recursively(self.base_dir):
-            tree += f"{path_element}\n"
-        return tree
-
-    def _get_tree_recursively(self, path: str, prefix: str = ""):
-        paths = self._get_matching_paths(path)
+                yield path
+
+    def get_index(self):
+        """
+        returns the matching entries of each directory of the project as a dict of
+        relative directory path -> [(name, is_dir, contains_matching_files)],
+        walking the project only once
+        """
+        if self._index is None:
+            self._index = {}
+            self._index_directory(self.base_dir, "")
+        return self._index
+
+    def reset_index(self):
+        """forgets the walked project, e.g. after files have been added or removed"""
+        self._index = None
+        self._trees = {}
+
+    def _index_directory(self, path: str, rel_path: str, rules: list = None):
+        """indexes the directory and returns whether it contains matching files"""
+        rules = list(rules or self._get_base_rules())
+        if self.use_ignore_files:
+            rules.extend(load_ignore_rules(path, rel_path))
+        entries = []
+        # scandir entries know whether they are directories without an extra stat call
+        with os.scandir(path) as it:
+            children = list(it)
+        for child in children:
+            child_rel_path = f"{rel_path}/{child.name}" if rel_path else child.name
+            is_dir = child.is_dir()
+            # ignored directories are pruned before descending into them
+            if is_ignored(rules, child_rel_path, is_dir):
+                continue
+            if is_dir:
+                has_files = self._index_directory(child.path, child_rel_path, rules)
+                entries.append((child.name, True, has_files))
+            elif self._get_include_regex().fullmatch(child.name):
+                entries.append((child.name, False, True))
+        self._index[rel_path] = entries
+        return any(has_files for _, _, has_files in entries)
+
+    def _get_base_rules(self):
+        return [IgnoreRules(patterns=self.exclude_patterns)]
+
+    def _get_include_regex(self):
+        if self._include_regex is None:
+            patterns = self.include_file_patterns or ["*"]
+            self._include_regex = re.compile(
+                "|".join(f"(?:{fnmatch.translate(pattern)})" for pattern in patterns)
+            )
+        return self._include_regex
+
+    def get_tree(self, dirs_only: bool = False):
+        if dirs_only not in self._trees:
+            tree = ""
+            for path_element in self._get_tree_recursively("", dirs_only=dirs_only):
+                tree += f"{path_element}\n"
+            self._trees[dirs_only] = tree
+        return self._trees[dirs_only]
+
+    def _get_tree_recursively(
+        self, rel_path: str, prefix: str = "", dirs_only: bool = False
+    ):
+        # directories without any matching files are not part of the tree
+        entries = [
+            entry
+            for entry in self.get_index()[rel_path]
+            if entry[2] and (entry[1] or not dirs_only)
+        ]
         space = "    "
         branch = "│   "
         tee = "├── "
         last = "└── "
-        # paths each get pointers that are ├── with a final └── :
-        pointers = [tee] * (len(paths) - 1) + [last]
-        for pointer, path in zip(pointers, paths):
-            if path.is_dir() and self._match(path, self.include_file_patterns, True):
-                yield prefix + pointer + path.name + "/"
-            elif path.is_file():
-                yield prefix + pointer + path.name
-
-            if path.is_dir():  # extend the prefix and recurse:
+        # entries each get pointers that are ├── with a final └── :
+        pointers = [tee] * (len(entries) - 1) + [last]
+        for pointer, (name, is_dir, _) in zip(pointers, entries):
+            if is_dir:
+                yield prefix + pointer + name + "/"
                 extension = branch if pointer == tee else space
                 # i.e. space because last, └── , above so no more |
-                yield from self._get_tree_recursively(path, prefix=prefix + extension)
+                yield from self._get_tree_recursively(
+                    os.path.join(rel_path, name), prefix + extension, dirs_only
+                )
+            else:
+                yield prefix + pointer + name
 
     def get_module_deps(self, module_path: str):
+        module_deps = []
+        for dep_path in self.get_module_deps_paths(module_path):
+            module_deps.extend(self.get_modules(dep_path))
+        return module_deps
+
+    def get_module_deps_paths(self, module_path: str):
+        """returns the paths of the project's modules imported by the given module"""
         import_names = self.get_import_names(module_path)
         module_paths = self.get_modules_paths()
         module_names = self.get_module_names(module_paths)
-        module_deps = []
-        for module_name, module_path in zip(module_names, module_paths):
-            if module_name in import_names:
-                module_deps.extend(self.get_modules(module_path))
-        return module_deps
+        return [
+            module_path
+            for module_name, module_path in zip(module_names, module_paths)
+            if module_name in import_names
+        ]
+
+    def get_dependent_modules(self, module_paths: list):
+        """returns the modules importing any of the given modules"""
+        module_names = set(self.get_module_names(module_paths))
+        return [
+            module
+            for module in self._modules
+            if module_names.intersection(self.get_import_names(module.path))
+        ]
 
     def get_import_names(self, module_path: str):
         module = self.get_module(module_path)
@@ -383,54 +607,64 @@ class Parser(BaseModel):
         # groups, nodes, edges = self._deps_parser.get_cross_entities(module_paths)
         groups, nodes, edges = self.parse_files_flows(module_paths)
         groups, nodes, edges = self.get_related_entities(groups, edges)
-        nodes_in_common = [edge_node.token for edge_node in nodes]
-        classes_in_common = [
-            subgroup.token for group in groups for subgroup in group.subgroups
-        ]
-
-        for module in module, *deps:
-            for child in module.node.body[:]:
-                if type(child) in (ast.FunctionDef, ast.AsyncFunctionDef):
-                    if child.name not in nodes_in_common:
-                        module.node.body.remove(child)
-                elif type(child) == ast.ClassDef:
-                    if child.name not in classes_in_common:
-                        module.node.body.remove(child)
-                    else:
-                        for subchild in child.body[:]:
-                            if type(subchild) in (
-                                ast.FunctionDef,
-                                ast.AsyncFunctionDef,
-                            ):
-                                if subchild.name not in nodes_in_common:
-                                    child.body.remove(subchild)
-
-                elif type(child) in (ast.Import, ast.ImportFrom):
-                    if self.strip_imports:
-                        module.node.body.remove(child)
-                else:
-                    if self.strip_globals:
-                        module.node.body.remove(child)
         execution_flow = ""
         for edge in edges:
             execution_flow += f"{edge.node0.file_token}.py {edge.node0.token}() -> {edge.node1.file_token}.py {edge.node1.token}()\n"
         return groups, nodes, edges, execution_flow
 
+    def get_related_names(self, groups, nodes):
+        """returns the names of the functions and classes involved in the related entities"""
+        functions = {node.token for node in nodes}
+        classes = {subgroup.token for group in groups for subgroup in group.subgroups}
+        return functions, classes
+
     def parse_files_flows(self, paths: list):
-        # paths = [os.path.join(self.base_dir, file_) for file_ in files]
-        return engine.map_it(
-            paths,
-            extension="py",
-            no_trimming=False,
-            exclude_namespaces=[],
-            exclude_functions=[],
-            include_only_namespaces=[],
-            include_only_functions=[],
-            skip_parse_errors=False,
-            lang_params=engine.LanguageParams(),
-        )
+        # flows are kept in memory so that unchanged files are not graphed twice, and
+        # on disk so that unchanged files are not graphed again by the next runs
+        key = tuple(paths)
+        if key in self._flows:
+            return self._flows[key]
+        flows = None
+        if self._cache is not None:
+            cache_key = self._cache.get_key("flows", paths)
+            flows = self._cache.load("flows", cache_key)
+        if flows is None:
+            from code2flow import engine
+
+            flows = engine.map_it(
+                paths,
+                extension="py",
+                no_trimming=True,
+                exclude_namespaces=[],
+                exclude_functions=[],
+                include_only_namespaces=[],
+                include_only_functions=[],
+                skip_parse_errors=False,
+                lang_params=engine.LanguageParams(),
+            )
+            flows = self._trim_flows(paths, *flows)
+            if self._cache is not None:
+                self._cache.save("flows", cache_key, flows)
+        self._flows[key] = flows
+        return flows
+
+    def _trim_flows(self, paths: list, groups, nodes, edges):
+        """
+        records the path of each file group, as code2flow names them after the file
+        only, then drops the functions without any call as code2flow does
+        """
+        from code2flow import engine
+
+        # without trimming, code2flow returns a file group per path, in order
+        for group, path in zip(groups, paths):
+            group.path = os.path.normpath(os.path.relpath(path, self.base_dir))
+        connected = {node for edge in edges for node in (edge.node0, edge.node1)}
+        groups = engine._filter_groups_for_subset(connected, groups)
+        return groups, list(connected), edges
 
     def get_related_entities(self, groups, edges):
+        from code2flow import engine
+
         cross_edges = self._find_cross_edges(edges)
         cross_nodes = self._get_edge_nodes(cross_edges)
         cross_groups = engine._filter_groups_for_subset(cross_nodes, groups)
@@ -441,7 +675,7 @@ class Parser(BaseModel):
         self._add_parents_attr(edges)
         cross_edges = []
         for edge in edges:
-            if edge.node0.file_token != edge.node1.file_token:
+            if edge.node0.file_path != edge.node1.file_path:
                 cross_edges.append(edge)
         return cross_edges
 
@@ -455,7 +689,7 @@ class Parser(BaseModel):
         """recursively adds attributes from parent nodes"""
         if node.parent.group_type == "FILE":
             orig_node.file_token = node.parent.token
-            # orig_node.path = node.parent.path
+            orig_node.file_path = node.parent.path
         else:
             self._add_nodes_attrs(orig_node, node.parent)
 
@@ -0,0 +1,84 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+from pycodedoc.costs import MODEL_INFO
+from pycodedoc.tokens import get_token_index
+
+PHASES = [
+    "docstrings",
+    "functions",
+    "classes",
+    "modules",
+    "modules_deps",
+    "packages",
+    "project",
+]
+
+PROFILES = {
+    "docstrings": {"max_in_flight": 100, "timeout": 10},
+    "functions": {"max_in_flight": 100, "timeout": 10},
+    "classes": {"max_in_flight": 100, "timeout": 10},
+    "modules": {"max_in_flight": 100, "timeout": 10},
+    "modules_deps": {"max_in_flight": 100, "timeout": 10},
+    "packages": {"max_in_flight": 100, "timeout": 10},
+    "project": {"max_in_flight": 1, "timeout": 10},
+}
+
+
+class PhaseProfile(BaseModel):
+    """
+    The execution settings of a documentation phase.
+
+    Attributes:
+        model (str): The model used for the phase. Default is None (the DocGen model).
+        max_in_flight (int): The maximum number of concurrent requests. Default is 100.
+        timeout (float): The timeout of each request in seconds. Default is 10.
+        max_tokens (int): The maximum number of output tokens of each request. Default is None (no limit).
+    """
+
+    model: Optional[str] = None
+    max_in_flight: int = 100
+    timeout: float = 10
+    max_tokens: Optional[int] = None
+
+    def get_completions_kwargs(self, model: str) -> dict:
+        kwargs = {"model": self.model or model, "timeout": self.timeout}
+        if self.max_tokens is not None:
+            kwargs["max_tokens"] = self.max_tokens
+        return kwargs
+
+
+class Router(BaseModel):
+    """
+    Routes each request to a model based on the size of its prompt: tiny prompts go to
+    a fast and cheap model, prompts exceeding the context window of the phase's model
+    go to a long-context model, the others stay on the phase's model.
+
+    Attributes:
+        small_model (str): The model used for small prompts. Default is None (no routing).
+        small_max_tokens (int): The maximum number of prompt tokens routed to the small model. Default is 500.
+        long_model (str): The model used for prompts exceeding the context window. Default is None (no routing).
+    """
+
+    small_model: Optional[str] = None
+    small_max_tokens: int = 500
+    long_model: Optional[str] = None
+
+    def is_active(self):
+        return self.small_model is not None or self.long_model is not None
+
+    def route(self, messages: list, model: str, max_tokens: int = None) -> str:
+        if not self.is_active():
+            return model
+        tokens = get_token_index(model).count_messages(messages)
+        return self.route_tokens(tokens, model, max_tokens)
+
+    def route_tokens(self, tokens: int, model: str, max_tokens: int = None) -> str:
+        """routes a prompt of the given number of tokens"""
+        if self.small_model and tokens <= self.small_max_tokens:
+            return self.small_model
+        if self.long_model and model in MODEL_INFO:
+            if tokens + (max_tokens or 0) > MODEL_INFO[model]["context"]:
+                return self.long_model
+        return model
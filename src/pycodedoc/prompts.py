@@ -1,3 +1,5 @@
+from typing import Iterable, Iterator
+
 SYSTEM_PROMPT = """
 You are a senior software engineer specialised in documenting large complex codebases.
 You will be given some instructions as well as the specific part of the codebase to use as context.
@@ -5,6 +7,10 @@ You will be given some instructions as well as the specific part of the codebase
 """.strip()
 
 PROMPTS = {
+    "docstrings": {
+        "instructions": "Summarize what the function or class does in around 10 words, based on its docstring. Only add the description, no titles.",
+        "system_prompt": SYSTEM_PROMPT,
+    },
     "functions": {
         "instructions": "Write a concise description of what the function does in around 10 words. Only add the description, no titles.",
         "system_prompt": SYSTEM_PROMPT,
@@ -28,6 +34,15 @@ Focus on the high level functionality of the module, not the implementation deta
 Write a short description on how a given module interacts with other modules it depends on in maximum 50 words. Only add the description, no titles.
 Focus on how the modules are interacting at a high level, not the implementation details such as the specific function calls.
 
+""".strip(),
+        "system_prompt": SYSTEM_PROMPT,
+    },
+    "packages": {
+        "instructions": """
+
+Write a short description explaining what this package does in maximum 80 words, based on the descriptions of its modules and subpackages. Only add the description, no titles.
+Focus on the high level functionality of the package and how its parts fit together, not the implementation details.
+
 """.strip(),
         "system_prompt": SYSTEM_PROMPT,
     },
@@ -52,55 +67,106 @@ TEMPLATE_CODE = """
 """
 
 
+# the context shared by the requests about a module, placed at the start of their
+# prompts so that providers caching prompt prefixes only process it once
+TEMPLATE_MODULE_CONTEXT = """
+### MODULE {module_path}:
+{module_code}
+"""
+
+TEMPLATE_INSTRUCTIONS = """
+### INSTRUCTIONS:
+{instructions}
+"""
+
+
+def get_module_context(module_path: str, module_code: str) -> str:
+    return TEMPLATE_MODULE_CONTEXT.format(
+        module_path=module_path, module_code=module_code
+    )
+
+
+def get_messages_batches(
+    prompts: Iterable, system_prompt: str, prefixes: Iterable = None
+) -> Iterator[list]:
+    """
+    lazily wraps the prompts into messages, built only when a request is sent. The
+    prefixes, if any, are prepended to the prompts after the static system prompt.
+    """
+    if prefixes is not None:
+        # the prompts are built first as they may determine the prefixes
+        prompts = (prefix + prompt for prompt, prefix in zip(prompts, prefixes))
+    for prompt in prompts:
+        yield [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt},
+        ]
+
+
+def get_docstrings_prompts(
+    docstrings: Iterable, instructions: str, system_prompt: str
+) -> dict:
+    prompts = (
+        TEMPLATE_CODE.format(code=docstring, instructions=instructions)
+        for docstring in docstrings
+    )
+    return {"messages_batches": get_messages_batches(prompts, system_prompt)}
+
+
 def get_functions_prompts(
-    functions_code: list, instructions: str, system_prompt: str
+    functions_code: Iterable,
+    instructions: str,
+    system_prompt: str,
+    modules_contexts: Iterable = None,
 ) -> dict:
-    prompts = [
+    prompts = (
         TEMPLATE_CODE.format(code=code, instructions=instructions)
         for code in functions_code
-    ]
-    messages_batches = [
-        [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": prompt},
-        ]
-        for prompt in prompts
-    ]
-    return {"messages_batches": messages_batches}
+    )
+    return {
+        "messages_batches": get_messages_batches(
+            prompts, system_prompt, modules_contexts
+        )
+    }
 
 
 def get_classes_prompts(
-    classes_code: list, instructions: str, system_prompt: str
+    classes_code: Iterable,
+    instructions: str,
+    system_prompt: str,
+    modules_contexts: Iterable = None,
 ) -> dict:
-    prompts = [
+    prompts = (
         TEMPLATE_CODE.format(code=code, instructions=instructions)
         for code in classes_code
-    ]
-    messages_batches = [
-        [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": prompt},
-        ]
-        for prompt in prompts
-    ]
-    return {"messages_batches": messages_batches}
+    )
+    return {
+        "messages_batches": get_messages_batches(
+            prompts, system_prompt, modules_contexts
+        )
+    }
 
 
 def get_modules_prompts(
-    modules_code: list, instructions: str, system_prompt: str
+    modules_code: Iterable,
+    instructions: str,
+    system_prompt: str,
+    modules_contexts: Iterable = None,
 ) -> dict:
-    prompts = [
-        TEMPLATE_CODE.format(code=code, instructions=instructions)
+    # a None code is given by the module's context: only the instructions follow it
+    prompts = (
+        (
+            TEMPLATE_INSTRUCTIONS.format(instructions=instructions)
+            if code is None
+            else TEMPLATE_CODE.format(code=code, instructions=instructions)
+        )
         for code in modules_code
-    ]
-    messages_batches = [
-        [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": prompt},
-        ]
-        for prompt in prompts
-    ]
-    return {"messages_batches": messages_batches}
+    )
+    return {
+        "messages_batches": get_messages_batches(
+            prompts, system_prompt, modules_contexts
+        )
+    }
 
 
 TEMPLATE_CODE_DEPS = """
@@ -120,15 +186,32 @@ TEMPLATE_CODE_DEPS = """
 """
 
 
+# the module's code is already given by the context starting the prompt
+TEMPLATE_DEPS = """
+### INSTRUCTIONS: 
+{instructions}
+
+### CONTEXT:
+
+# DEPENDENT MODULES:
+{dep_code}
+
+# INTERACTION BETWEEN MODULES:
+{execution_graph}
+"""
+
+
 def get_modules_deps_prompts(
-    modules_code: list,
-    deps_code: list,
-    execution_graphs: list,
+    modules_code: Iterable,
+    deps_code: Iterable,
+    execution_graphs: Iterable,
     instructions: str,
     system_prompt: str,
+    modules_contexts: Iterable = None,
 ) -> dict:
-    prompts = [
-        TEMPLATE_CODE_DEPS.format(
+    template = TEMPLATE_CODE_DEPS if modules_contexts is None else TEMPLATE_DEPS
+    prompts = (
+        template.format(
             module_code=module_code,
             dep_code=dep_code,
             execution_graph=execution_graph,
@@ -137,15 +220,40 @@ def get_modules_deps_prompts(
         for module_code, dep_code, execution_graph in zip(
             modules_code, deps_code, execution_graphs
         )
-    ]
-    messages_batches = [
-        [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": prompt},
-        ]
-        for prompt in prompts
-    ]
-    return {"messages_batches": messages_batches}
+    )
+    return {
+        "messages_batches": get_messages_batches(
+            prompts, system_prompt, modules_contexts
+        )
+    }
+
+
+TEMPLATE_PACKAGE = """
+### INSTRUCTIONS:
+{instructions}
+
+### CONTEXT:
+
+# PACKAGE {package_path}:
+{package_docu}
+"""
+
+
+def get_packages_prompts(
+    packages_paths: Iterable,
+    packages_docu: Iterable,
+    instructions: str,
+    system_prompt: str,
+) -> dict:
+    prompts = (
+        TEMPLATE_PACKAGE.format(
+            package_path=package_path,
+            package_docu=package_docu,
+            instructions=instructions,
+        )
+        for package_path, package_docu in zip(packages_paths, packages_docu)
+    )
+    return {"messages_batches": get_messages_batches(prompts, system_prompt)}
 
 
 TEMPLATE_PROJECT = """
@@ -0,0 +1,262 @@
+"""
+Quick estimate of the cost of documenting very large projects, from a sample of their
+modules: only the sampled modules are parsed and tokenized.
+
+The modules are stratified by top-level package and size, and the totals of each phase
+are extrapolated with the stratified estimator, whose variance gives the confidence
+intervals.
+"""
+import math
+import os
+import random
+from collections import defaultdict
+from typing import TYPE_CHECKING, List
+
+from pydantic import BaseModel
+
+from pycodedoc.costs import (
+    OUTPUT_TOKENS,
+    estimate_module,
+    estimate_packages,
+    estimate_project,
+)
+
+if TYPE_CHECKING:
+    from pycodedoc.docgen import DocGen
+
+# the size quantiles splitting the modules of each package into strata
+SIZE_BUCKETS = 4
+# z-score of the 95% confidence intervals
+Z_95 = 1.96
+# latency model of a request, used for the expected wall time
+BASE_LATENCY = 0.5
+OUTPUT_TOKENS_PER_SECOND = 50
+
+
+class PhaseEstimate(BaseModel):
+    """
+    The extrapolated totals of a phase with their 95% confidence intervals.
+
+    Attributes:
+        cost (float): The estimated cost in $.
+        cost_margin (float): The half-width of the confidence interval of the cost.
+        requests (float): The estimated number of requests.
+        requests_margin (float): The half-width of the confidence interval of the requests.
+        wall_time (float): The expected duration of the phase in seconds.
+    """
+
+    cost: float = 0.0
+    cost_margin: float = 0.0
+    requests: float = 0.0
+    requests_margin: float = 0.0
+    wall_time: float = 0.0
+
+
+class SampledEstimate(BaseModel):
+    """
+    The estimate of the cost of documenting a project from a sample of its modules.
+
+    Attributes:
+        n_modules (int): The number of modules of the project.
+        n_sampled (int): The number of sampled modules.
+        phases (dict): The PhaseEstimate of each phase.
+    """
+
+    n_modules: int
+    n_sampled: int
+    phases: dict
+
+    @property
+    def cost(self) -> float:
+        return sum(phase.cost for phase in self.phases.values())
+
+    @property
+    def cost_margin(self) -> float:
+        # the phases are estimated from the same sample, so their errors add up
+        return sum(phase.cost_margin for phase in self.phases.values())
+
+    @property
+    def wall_time(self) -> float:
+        return sum(phase.wall_time for phase in self.phases.values())
+
+    def format(self) -> str:
+        lines = [
+            f"Estimate from {self.n_sampled} of {self.n_modules} modules "
+            "(95% confidence intervals):",
+            f"{'phase':<14}{'requests':>20}{'cost ($)':>24}{'time (s)':>12}",
+        ]
+        for name, phase in self.phases.items():
+            requests = f"{phase.requests:.0f} ± {phase.requests_margin:.0f}"
+            cost = f"{phase.cost:.4f} ± {phase.cost_margin:.4f}"
+            lines.append(f"{name:<14}{requests:>20}{cost:>24}{phase.wall_time:>12.0f}")
+        cost = f"{self.cost:.4f} ± {self.cost_margin:.4f}"
+        lines.append(f"{'total':<14}{'':>20}{cost:>24}{self.wall_time:>12.0f}")
+        return "\n".join(lines)
+
+
+def stratify(base_dir: str, modules_paths: List[str], by_package: bool = True) -> dict:
+    """groups the modules by top-level package and size quantile within the package"""
+    packages = defaultdict(list)
+    for path in modules_paths:
+        package = path.split("/")[0] if by_package and "/" in path else ""
+        packages[package].append(path)
+    strata = {}
+    for package, paths in packages.items():
+        paths = sorted(paths, key=lambda p: os.path.getsize(os.path.join(base_dir, p)))
+        n_buckets = min(SIZE_BUCKETS, len(paths))
+        for bucket in range(n_buckets):
+            start = bucket * len(paths) // n_buckets
+            end = (bucket + 1) * len(paths) // n_buckets
+            strata[(package, bucket)] = paths[start:end]
+    return strata
+
+
+def allocate(strata: dict, sample_size: int) -> dict:
+    """
+    allocates the sample to the strata in proportion to their number of modules, with
+    at least one module per stratum when the sample is large enough
+    """
+    n_modules = sum(len(paths) for paths in strata.values())
+    if n_modules == 0 or sample_size <= 0:
+        return {key: 0 for key in strata}
+    floor = 1 if sample_size >= len(strata) else 0
+    quotas = {
+        key: max(floor, sample_size * len(paths) / n_modules)
+        for key, paths in strata.items()
+    }
+    allocation = {
+        key: min(len(strata[key]), int(quota)) for key, quota in quotas.items()
+    }
+    # the remaining modules go to the largest remainders
+    remainders = sorted(quotas, key=lambda key: quotas[key] - int(quotas[key]))
+    while sum(allocation.values()) < sample_size and remainders:
+        key = remainders.pop()
+        if allocation[key] < len(strata[key]):
+            allocation[key] += 1
+    return allocation
+
+
+def get_variance(values: list) -> float:
+    if len(values) < 2:
+        return 0.0
+    mean = sum(values) / len(values)
+    return sum((value - mean) ** 2 for value in values) / (len(values) - 1)
+
+
+def extrapolate(strata: dict, samples: dict, values: dict) -> tuple:
+    """
+    the stratified estimate of the total of values (module path -> value) and the
+    half-width of its 95% confidence interval
+    """
+    total, variance, pooled = 0.0, 0.0, []
+    for key, sample in samples.items():
+        sample_values = [values[path] for path in sample]
+        mean = sum(sample_values) / len(sample_values)
+        total += len(strata[key]) * mean
+        if len(sample_values) > 1:
+            pooled.append(get_variance(sample_values))
+    # strata with a single sampled module use the average variance of the others, or
+    # the variance of the whole sample when no stratum has several sampled modules
+    if pooled:
+        pooled_variance = sum(pooled) / len(pooled)
+    else:
+        all_values = [values[path] for sample in samples.values() for path in sample]
+        pooled_variance = get_variance(all_values)
+    for key, sample in samples.items():
+        n, size = len(sample), len(strata[key])
+        if n > 1:
+            stratum_variance = get_variance([values[path] for path in sample])
+        else:
+            stratum_variance = pooled_variance
+        variance += size**2 * (1 - n / size) * stratum_variance / n
+    return total, Z_95 * math.sqrt(variance)
+
+
+def get_wall_time(docgen: "DocGen", phase: str, requests: float) -> float:
+    """the expected duration of the requests of a phase under the concurrency limits"""
+    if requests <= 0:
+        return 0.0
+    concurrency = docgen.get_profile(phase).max_in_flight
+    if docgen.llm.max_concurrency is not None:
+        concurrency = min(concurrency, docgen.llm.max_concurrency)
+    latency = BASE_LATENCY + OUTPUT_TOKENS[phase] / OUTPUT_TOKENS_PER_SECOND
+    return math.ceil(requests / concurrency) * latency
+
+
+def estimate_sampled_cost(
+    docgen: "DocGen", sample_size: int, seed: int = 0
+) -> SampledEstimate:
+    """
+    Estimates the cost of documenting the project from a sample of its modules.
+
+    The docgen should be created with modules_paths=[], so that no module is parsed
+    before sampling: only the sampled modules, and the modules they import when the
+    relations are documented, are parsed.
+
+    Args:
+        docgen (DocGen): The DocGen instance holding the settings of the run.
+        sample_size (int): The number of modules to sample.
+        seed (int, optional): The seed of the sampling, for reproducible estimates. Defaults to 0.
+
+    Returns:
+        SampledEstimate: The extrapolated costs, requests and wall time of each phase.
+    """
+    if sample_size < 1:
+        raise ValueError("The sample size must be at least 1.")
+    parser = docgen.parser
+    modules_paths = parser.get_modules_paths()
+    if not modules_paths:
+        return SampledEstimate(n_modules=0, n_sampled=0, phases={})
+    strata = stratify(parser.base_dir, modules_paths)
+    if len(strata) > sample_size:
+        # too many packages to sample each of them, the modules are only split by size
+        strata = stratify(parser.base_dir, modules_paths, by_package=False)
+    rng = random.Random(seed)
+    samples = {
+        key: sorted(rng.sample(strata[key], n))
+        for key, n in allocate(strata, sample_size).items()
+        if n > 0
+    }
+    # strata left without any module are estimated like the sampled ones
+    sampled_strata = {key: strata[key] for key in samples}
+    scale = len(modules_paths) / sum(len(paths) for paths in sampled_strata.values())
+    sampled_paths = [path for sample in samples.values() for path in sample]
+    parser.add_modules(sampled_paths)
+    if not docgen.no_relations:
+        parser.add_modules(
+            [
+                dep
+                for path in sampled_paths
+                for dep in parser.get_module_deps_paths(path)
+            ]
+        )
+    estimates = {
+        path: estimate_module(docgen, parser.get_module(path)) for path in sampled_paths
+    }
+    phases = {}
+    for phase in next(iter(estimates.values())):
+        estimate = PhaseEstimate()
+        for metric in ["cost", "requests"]:
+            values = {path: estimates[path][phase][metric] for path in sampled_paths}
+            total, margin = extrapolate(sampled_strata, samples, values)
+            setattr(estimate, metric, total * scale)
+            setattr(estimate, f"{metric}_margin", margin * scale)
+        estimate.wall_time = get_wall_time(docgen, phase, estimate.requests)
+        phases[phase] = estimate
+    if docgen.package_rollup:
+        # the packages are known from the paths of all the modules, not sampled
+        packages = estimate_packages(docgen, modules_paths)
+        phases["packages"] = PhaseEstimate(
+            cost=packages["cost"],
+            requests=packages["requests"],
+            wall_time=get_wall_time(docgen, "packages", packages["requests"]),
+        )
+    project = estimate_project(docgen)
+    phases["project"] = PhaseEstimate(
+        cost=project["cost"],
+        requests=project["requests"],
+        wall_time=get_wall_time(docgen, "project", project["requests"]),
+    )
+    return SampledEstimate(
+        n_modules=len(modules_paths), n_sampled=len(sampled_paths), phases=phases
+    )
@@ -0,0 +1,235 @@
+import json
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+from pycodedoc.docgen import DocGen
+from pycodedoc.llm import BudgetExceededError, Llm
+from pycodedoc.parser import Parser
+from pycodedoc.utils import set_logger
+
+logger = set_logger()
+
+
+def get_shard_file(output_dir: str, shard_index: int, n_shards: int):
+    file_name = f"shard-{shard_index}-of-{n_shards}.json"
+    return os.path.join(output_dir, "shards", file_name)
+
+
+def get_max_cost(docgen_kwargs: dict):
+    llm = docgen_kwargs.get("llm") or {}
+    return llm.max_cost if isinstance(llm, Llm) else llm.get("max_cost")
+
+
+def with_max_cost(docgen_kwargs: dict, max_cost: float) -> dict:
+    """the arguments of a DocGen whose llm is limited to max_cost"""
+    llm = docgen_kwargs.get("llm") or {}
+    if isinstance(llm, Llm):
+        llm = llm.model_copy(update={"max_cost": max_cost})
+    else:
+        llm = dict(llm, max_cost=max_cost)
+    return dict(docgen_kwargs, llm=llm)
+
+
+def get_shard_max_cost(max_cost: float, n_shards: int) -> float:
+    """
+    the budget of each shard: the shards and the merge step get an equal share, the
+    merge step getting in addition what the shards did not spend
+    """
+    return max_cost / (n_shards + 1)
+
+
+def partition_modules(base_dir: str, n_shards: int) -> List[list]:
+    """
+    Partitions the modules of the project into n shards.
+
+    Modules are grouped by package (the directory containing them) so that modules
+    which usually depend on each other end up in the same shard. Packages are then
+    assigned, largest first, to the shard with the smallest total size of code.
+    """
+    # an empty subset of modules only lists the project's modules without parsing them
+    modules_paths = Parser(base_dir=base_dir, modules_paths=[]).get_modules_paths()
+    packages = defaultdict(list)
+    for module_path in modules_paths:
+        packages[os.path.dirname(module_path)].append(module_path)
+
+    def package_size(package):
+        return sum(
+            os.path.getsize(os.path.join(base_dir, path)) for path in packages[package]
+        )
+
+    shards, sizes = [[] for _ in range(n_shards)], [0] * n_shards
+    for package in sorted(packages, key=lambda p: (-package_size(p), p)):
+        smallest = sizes.index(min(sizes))
+        shards[smallest].extend(packages[package])
+        sizes[smallest] += package_size(package)
+    return shards
+
+
+def document_shard(docgen_kwargs: dict, shard_index: int, n_shards: int):
+    """
+    Documents a single shard of the project and writes its partial results file.
+
+    The relations of modules depending on modules from other shards cannot be
+    described within the shard: they are listed as pending and described in the
+    merge step.
+
+    With a max_cost, the shard gets its share of it. Once reached, the descriptions
+    generated so far are written, the others being left to a resumed run.
+
+    Args:
+        docgen_kwargs (dict): The arguments used for creating the DocGen instance.
+        shard_index (int): The index of the shard to document, starting from 0.
+        n_shards (int): The total number of shards.
+
+    Returns:
+        str: The path of the partial results file.
+    """
+    modules_paths = partition_modules(docgen_kwargs["base_dir"], n_shards)[shard_index]
+    max_cost = get_max_cost(docgen_kwargs)
+    if max_cost is not None:
+        max_cost = get_shard_max_cost(max_cost, n_shards)
+        docgen_kwargs = with_max_cost(docgen_kwargs, max_cost)
+    docgen = DocGen(**docgen_kwargs, modules_paths=modules_paths)
+    pending_deps = []
+    try:
+        document_shard_modules(docgen, modules_paths, pending_deps, shard_index)
+    except BudgetExceededError as e:
+        docgen.log_budget_exceeded(e)
+    file_path = get_shard_file(docgen.output_dir, shard_index, n_shards)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w") as f:
+        json.dump(
+            {
+                "shard_index": shard_index,
+                "n_shards": n_shards,
+                "modules_paths": modules_paths,
+                "pending_deps": pending_deps,
+                "spent": docgen.llm.get_spent(),
+                "descriptions": docgen.get_descriptions().to_dict(),
+            },
+            f,
+        )
+    return file_path
+
+
+def document_shard_modules(
+    docgen: DocGen, modules_paths: list, pending_deps: list, shard_index: int
+):
+    """describes the modules of a shard, appending the cross-shard ones to pending_deps"""
+    if modules_paths:
+        if docgen.use_structure:
+            logger.info("GENERATING FUNCTIONS DESCRIPTIONS [SHARD %s]", shard_index)
+            docgen.generate_functions_desc()
+        if not docgen.no_classes:
+            logger.info("GENERATING CLASSES DESCRIPTIONS [SHARD %s]", shard_index)
+            docgen.generate_classes_desc()
+        logger.info("GENERATING MODULES DESCRIPTIONS [SHARD %s]", shard_index)
+        docgen.generate_modules_desc()
+        if not docgen.no_relations:
+            local_paths = []
+            for module_path in modules_paths:
+                deps_paths = docgen.parser.get_module_deps_paths(module_path)
+                if set(deps_paths).issubset(modules_paths):
+                    local_paths.append(module_path)
+                else:
+                    pending_deps.append(module_path)
+            if local_paths:
+                logger.info(
+                    "GENERATING MODULES RELATIONS DESCRIPTIONS [SHARD %s]", shard_index
+                )
+                docgen.generate_modules_deps_desc(local_paths)
+
+
+def merge_shards(docgen_kwargs: dict, n_shards: int):
+    """
+    Merges the partial results of all shards into the project's documentation.
+
+    The pending relations between modules of different shards are described here,
+    parsing only the modules involved, before generating the project overview and
+    writing the markdown. With a max_cost, the merge step spends what the shards left
+    of it, and the markdown is written even once it is reached.
+
+    Args:
+        docgen_kwargs (dict): The arguments used for creating the DocGen instances.
+        n_shards (int): The total number of shards.
+
+    Returns:
+        DocGen: The DocGen instance holding the merged descriptions.
+    """
+    output_dir = docgen_kwargs.get(
+        "output_dir", DocGen.model_fields["output_dir"].default
+    )
+    shards = []
+    for shard_index in range(n_shards):
+        file_path = get_shard_file(output_dir, shard_index, n_shards)
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(
+                f"Partial results of shard {shard_index} not found at {file_path}. "
+                "Please document all shards before merging them."
+            )
+        with open(file_path, "r") as f:
+            shards.append(json.load(f))
+
+    max_cost = get_max_cost(docgen_kwargs)
+    if max_cost is not None:
+        spent = sum(shard.get("spent", 0.0) for shard in shards)
+        docgen_kwargs = with_max_cost(docgen_kwargs, max(max_cost - spent, 0.0))
+    pending_deps = [path for shard in shards for path in shard["pending_deps"]]
+    # only parse the modules with pending relations and the modules they depend on
+    docgen = DocGen(**docgen_kwargs, modules_paths=pending_deps)
+    deps_paths = []
+    for module_path in pending_deps:
+        for dep_path in docgen.parser.get_module_deps_paths(module_path):
+            if dep_path not in pending_deps and dep_path not in deps_paths:
+                deps_paths.append(dep_path)
+    docgen.parser.update_modules(deps_paths)
+
+    descriptions = docgen.get_descriptions()
+    # merge the modules first to keep them in the order of the project rather than
+    # the order of the shards
+    order = {path: i for i, path in enumerate(docgen.parser.get_modules_paths())}
+    modules = {
+        path: module_desc
+        for shard in shards
+        for path, module_desc in shard["descriptions"]["modules"].items()
+    }
+    descriptions.merge(
+        {"modules": dict(sorted(modules.items(), key=lambda x: order.get(x[0], -1)))}
+    )
+    for shard in shards:
+        descriptions.merge(shard["descriptions"])
+    try:
+        if pending_deps and not docgen.no_relations:
+            logger.info("GENERATING CROSS-SHARD MODULES RELATIONS DESCRIPTIONS")
+            docgen.generate_modules_deps_desc(pending_deps)
+        if docgen.package_rollup:
+            logger.info("GENERATING PACKAGES DESCRIPTIONS")
+            docgen.generate_packages_desc()
+        logger.info("GENERATING PROJECT OVERVIEW")
+        docgen.generate_project_desc()
+    except BudgetExceededError as e:
+        docgen.log_budget_exceeded(e)
+    docgen.write_markdown()
+    return docgen
+
+
+def run_sharded(docgen_kwargs: dict, n_shards: int, n_workers: int = None):
+    """
+    Documents the project in n shards using local processes as workers, then merges
+    the partial results.
+
+    Args:
+        docgen_kwargs (dict): The arguments used for creating the DocGen instances.
+        n_shards (int): The number of shards to split the project into.
+        n_workers (int, optional): The number of worker processes. Defaults to the number of shards.
+    """
+    with ProcessPoolExecutor(max_workers=n_workers or n_shards) as executor:
+        futures = [
+            executor.submit(document_shard, docgen_kwargs, shard_index, n_shards)
+            for shard_index in range(n_shards)
+        ]
+        for future in futures:
+            logger.info("SHARD RESULTS WRITTEN TO %s", future.result())
+    return merge_shards(docgen_kwargs, n_shards)
@@ -0,0 +1,214 @@
+"""
+Read-only rendering of code views from the parsed ASTs.
+
+The views are built from shallow copies of the nodes which share their children with
+the original tree: the parsed modules are never copied nor mutated, so the views can
+be rendered any number of times and in any order.
+"""
+import ast
+from typing import Union
+
+FUNCTION_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef)
+IMPORT_TYPES = (ast.Import, ast.ImportFrom)
+
+
+def render_structure(
+    node: Union[ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef],
+    descriptions: dict = None,
+    strip_imports: bool = False,
+    strip_globals: bool = True,
+    name: str = None,
+) -> str:
+    """
+    Renders the structure of a module, class or function: signatures only, with the
+    descriptions of the functions injected as docstrings if given.
+
+    Args:
+        node: The node of the module, class or function to render.
+        descriptions (dict, optional): The descriptions of the functions by unique name (e.g. "Class.method").
+        strip_imports (bool): Remove the imports of a module. Default is False.
+        strip_globals (bool): Remove the statements of a module other than imports, functions and classes. Default is True.
+        name (str, optional): The unique name of a function, used for finding its description. Defaults to the function's name.
+    """
+    if isinstance(node, ast.Module):
+        node = module_structure(node, descriptions, strip_imports, strip_globals)
+    elif isinstance(node, ast.ClassDef):
+        node = class_structure(node, descriptions)
+    elif isinstance(node, FUNCTION_TYPES):
+        node = function_structure(node, descriptions, name)
+    return ast.unparse(node)
+
+
+def render_filtered(
+    node: ast.Module,
+    functions: set,
+    classes: set,
+    strip_imports: bool = False,
+    strip_globals: bool = True,
+) -> str:
+    """
+    Renders the code of a module keeping only the given functions and classes, and
+    within the kept classes only the given methods.
+    """
+    body = []
+    for child in node.body:
+        if isinstance(child, FUNCTION_TYPES):
+            if child.name in functions:
+                body.append(child)
+        elif isinstance(child, ast.ClassDef):
+            if child.name in classes:
+                class_body = [
+                    subchild
+                    for subchild in child.body
+                    if not isinstance(subchild, FUNCTION_TYPES)
+                    or subchild.name in functions
+                ]
+                body.append(replace_body(child, class_body or [ellipsis()]))
+        elif isinstance(child, IMPORT_TYPES):
+            if not strip_imports:
+                body.append(child)
+        elif not strip_globals:
+            body.append(child)
+    return ast.unparse(replace_body(node, body))
+
+
+def render_selected(
+    node: ast.Module,
+    full: set,
+    stubs: set = None,
+    descriptions: dict = None,
+    strip_imports: bool = False,
+    strip_globals: bool = True,
+) -> str:
+    """
+    Renders the code of a module keeping only the selected functions by unique name
+    (e.g. "Class.method"): the ones in `full` with their code, the ones in `stubs` as
+    signatures with their descriptions injected as docstrings if given.
+    """
+    stubs = stubs or set()
+
+    def select(child, name):
+        if name in full:
+            return child
+        elif name in stubs:
+            return function_structure(child, descriptions, name)
+        return None
+
+    body = []
+    for child in node.body:
+        if isinstance(child, FUNCTION_TYPES):
+            selected = select(child, child.name)
+            if selected is not None:
+                body.append(selected)
+        elif isinstance(child, ast.ClassDef):
+            class_body, has_methods = [], False
+            for subchild in child.body:
+                if isinstance(subchild, FUNCTION_TYPES):
+                    selected = select(subchild, f"{child.name}.{subchild.name}")
+                    if selected is not None:
+                        class_body.append(selected)
+                        has_methods = True
+                else:
+                    class_body.append(subchild)
+            if has_methods:
+                body.append(replace_body(child, class_body))
+        elif isinstance(child, IMPORT_TYPES):
+            if not strip_imports:
+                body.append(child)
+        elif not strip_globals:
+            body.append(child)
+    return ast.unparse(replace_body(node, body))
+
+
+def render_summary(
+    node: ast.Module,
+    names: set,
+    descriptions: dict = None,
+    description: str = None,
+) -> str:
+    """
+    Renders a summary of a module: its description as docstring, followed by the
+    signatures of the selected functions by unique name (e.g. "Class.method") with their
+    descriptions, within their classes described likewise. The imports, globals and
+    class attributes are left out.
+    """
+    descriptions = descriptions or {}
+    body = [docstring(description)] if description else []
+    for child in node.body:
+        if isinstance(child, FUNCTION_TYPES):
+            if child.name in names:
+                body.append(function_structure(child, descriptions))
+        elif isinstance(child, ast.ClassDef):
+            methods = [
+                function_structure(
+                    subchild, descriptions, f"{child.name}.{subchild.name}"
+                )
+                for subchild in child.body
+                if isinstance(subchild, FUNCTION_TYPES)
+                and f"{child.name}.{subchild.name}" in names
+            ]
+            if methods:
+                class_description = descriptions.get(child.name)
+                if class_description:
+                    methods.insert(0, docstring(class_description))
+                body.append(replace_body(child, methods))
+    return ast.unparse(replace_body(node, body))
+
+
+def module_structure(
+    node: ast.Module,
+    descriptions: dict = None,
+    strip_imports: bool = False,
+    strip_globals: bool = True,
+) -> ast.Module:
+    body = []
+    for child in node.body:
+        if isinstance(child, FUNCTION_TYPES):
+            body.append(function_structure(child, descriptions))
+        elif isinstance(child, ast.ClassDef):
+            body.append(class_structure(child, descriptions))
+        elif isinstance(child, IMPORT_TYPES):
+            if not strip_imports:
+                body.append(child)
+        elif not strip_globals:
+            body.append(child)
+    return replace_body(node, body)
+
+
+def class_structure(node: ast.ClassDef, descriptions: dict = None) -> ast.ClassDef:
+    body = [
+        function_structure(child, descriptions, f"{node.name}.{child.name}")
+        if isinstance(child, FUNCTION_TYPES)
+        else child
+        for child in node.body
+    ]
+    return replace_body(node, body)
+
+
+def function_structure(
+    node: Union[ast.FunctionDef, ast.AsyncFunctionDef],
+    descriptions: dict = None,
+    name: str = None,
+) -> Union[ast.FunctionDef, ast.AsyncFunctionDef]:
+    body = []
+    if descriptions:
+        description = descriptions.get(name or node.name)
+        if description:
+            body.append(docstring(description))
+    body.append(ellipsis())
+    return replace_body(node, body)
+
+
+def replace_body(node: ast.AST, body: list) -> ast.AST:
+    """returns a shallow copy of the node with a new body, leaving the node untouched"""
+    fields = {field: getattr(node, field, None) for field in node._fields}
+    fields["body"] = body
+    return ast.copy_location(type(node)(**fields), node)
+
+
+def ellipsis():
+    return ast.Expr(ast.Constant(...))
+
+
+def docstring(text: str):
+    return ast.Expr(ast.Constant(text))
@@ -0,0 +1,249 @@
+"""
+Storage of the generated descriptions, keyed by (phase, path, entity).
+
+The path-level descriptions (modules, relations, packages, project) use an empty
+entity. The descriptions are read and written through mapping views, so that the rest
+of the code handles them as nested dicts whatever the store behind them.
+"""
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections.abc import MutableMapping
+from typing import Iterator, Optional
+
+from pydantic import BaseModel, PrivateAttr
+
+_MISSING = object()
+
+
+class DescriptionsStore(BaseModel, ABC):
+    """The interface of the stores holding the descriptions."""
+
+    @abstractmethod
+    def get(self, phase: str, path: str, entity: str = "", default=None):
+        """the value of the entity, or default if not stored"""
+
+    @abstractmethod
+    def set(self, phase: str, path: str, entity: str, value: Optional[str]):
+        """stores the value of the entity, keeping its position if already stored"""
+
+    @abstractmethod
+    def contains(self, phase: str, path: str, entity: Optional[str] = "") -> bool:
+        """whether the entity, or any entity of the path if entity is None, is stored"""
+
+    @abstractmethod
+    def delete(self, phase: str, path: str, entity: Optional[str] = None):
+        """deletes the entity, or all the entities of the path if entity is None"""
+
+    @abstractmethod
+    def paths(self, phase: str) -> Iterator[str]:
+        """the paths of a phase in insertion order"""
+
+    @abstractmethod
+    def entities(self, phase: str, path: str) -> Iterator[tuple]:
+        """the (entity, value) of a path in insertion order"""
+
+    def close(self):
+        pass
+
+
+class MemoryStore(DescriptionsStore):
+    """Keeps the descriptions in memory as phase -> path -> entity -> value."""
+
+    _data: dict = PrivateAttr(default_factory=dict)
+
+    def get(self, phase, path, entity="", default=None):
+        return self._data.get(phase, {}).get(path, {}).get(entity, default)
+
+    def set(self, phase, path, entity, value):
+        self._data.setdefault(phase, {}).setdefault(path, {})[entity] = value
+
+    def contains(self, phase, path, entity=""):
+        entities = self._data.get(phase, {}).get(path)
+        if entities is None:
+            return False
+        return entity is None or entity in entities
+
+    def delete(self, phase, path, entity=None):
+        paths = self._data.get(phase, {})
+        if entity is None:
+            paths.pop(path, None)
+        elif path in paths:
+            paths[path].pop(entity, None)
+            if not paths[path]:
+                del paths[path]
+
+    def paths(self, phase):
+        return iter(list(self._data.get(phase, {})))
+
+    def entities(self, phase, path):
+        return iter(list(self._data.get(phase, {}).get(path, {}).items()))
+
+
+class SqliteStore(DescriptionsStore):
+    """
+    Keeps the descriptions in a SQLite database, so that memory stays flat on large
+    projects and the descriptions can be reused by later runs. The connection is shared
+    by the threads using the store, e.g. the markdown being written in a worker thread.
+
+    Attributes:
+        path (str): The path of the database file, created if it does not exist.
+    """
+
+    path: str
+    _connection: Optional[sqlite3.Connection] = PrivateAttr(default=None)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._connection = sqlite3.connect(
+                self.path, isolation_level=None, check_same_thread=False
+            )
+            # a crash can lose the last writes but never corrupts the database
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS descriptions ("
+                "phase TEXT, path TEXT, entity TEXT, value TEXT, "
+                "PRIMARY KEY (phase, path, entity))"
+            )
+        return self._connection
+
+    def execute(self, query: str, params: tuple) -> list:
+        """runs a query, one thread at a time, and returns its rows"""
+        with self._lock:
+            return self.connection.execute(query, params).fetchall()
+
+    def get(self, phase, path, entity="", default=None):
+        rows = self.execute(
+            "SELECT value FROM descriptions WHERE phase=? AND path=? AND entity=?",
+            (phase, path, entity),
+        )
+        return default if not rows else rows[0][0]
+
+    def set(self, phase, path, entity, value):
+        # updating in place keeps the insertion order given by the rowid
+        self.execute(
+            "INSERT INTO descriptions VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (phase, path, entity) DO UPDATE SET value=excluded.value",
+            (phase, path, entity, value),
+        )
+
+    def contains(self, phase, path, entity=""):
+        if entity is None:
+            query = "SELECT 1 FROM descriptions WHERE phase=? AND path=? LIMIT 1"
+            params = (phase, path)
+        else:
+            query = "SELECT 1 FROM descriptions WHERE phase=? AND path=? AND entity=?"
+            params = (phase, path, entity)
+        return bool(self.execute(query, params))
+
+    def delete(self, phase, path, entity=None):
+        if entity is None:
+            self.execute(
+                "DELETE FROM descriptions WHERE phase=? AND path=?", (phase, path)
+            )
+        else:
+            self.execute(
+                "DELETE FROM descriptions WHERE phase=? AND path=? AND entity=?",
+                (phase, path, entity),
+            )
+
+    def paths(self, phase):
+        rows = self.execute(
+            "SELECT path FROM descriptions WHERE phase=? "
+            "GROUP BY path ORDER BY MIN(rowid)",
+            (phase,),
+        )
+        return iter([row[0] for row in rows])
+
+    def entities(self, phase, path):
+        rows = self.execute(
+            "SELECT entity, value FROM descriptions WHERE phase=? AND path=? "
+            "ORDER BY rowid",
+            (phase, path),
+        )
+        return iter([tuple(row) for row in rows])
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class PhaseView(MutableMapping):
+    """
+    The descriptions of a phase by path. With nested=True, each path maps to the
+    descriptions of its entities, otherwise to its own description (None if missing).
+    """
+
+    def __init__(self, store: DescriptionsStore, phase: str, nested: bool = False):
+        self.store, self.phase, self.nested = store, phase, nested
+
+    def __getitem__(self, path):
+        if self.nested:
+            return EntitiesView(self.store, self.phase, path)
+        return self.store.get(self.phase, path)
+
+    def __setitem__(self, path, value):
+        if self.nested:
+            self.store.delete(self.phase, path)
+            for entity, entity_value in dict(value).items():
+                self.store.set(self.phase, path, entity, entity_value)
+        else:
+            self.store.set(self.phase, path, "", value)
+
+    def __delitem__(self, path):
+        self.store.delete(self.phase, path)
+
+    def __contains__(self, path):
+        return self.store.contains(self.phase, path, None)
+
+    def __iter__(self):
+        return self.store.paths(self.phase)
+
+    def __len__(self):
+        return sum(1 for _ in self.store.paths(self.phase))
+
+    def to_dict(self):
+        if self.nested:
+            return {path: dict(self[path]) for path in self}
+        return dict(self)
+
+
+class EntitiesView(MutableMapping):
+    """The descriptions of the entities of a path by entity name."""
+
+    def __init__(self, store: DescriptionsStore, phase: str, path: str):
+        self.store, self.phase, self.path = store, phase, path
+
+    def __getitem__(self, entity):
+        value = self.store.get(self.phase, self.path, entity, _MISSING)
+        if value is _MISSING:
+            raise KeyError(entity)
+        return value
+
+    def __setitem__(self, entity, value):
+        self.store.set(self.phase, self.path, entity, value)
+
+    def __delitem__(self, entity):
+        if not self.store.contains(self.phase, self.path, entity):
+            raise KeyError(entity)
+        self.store.delete(self.phase, self.path, entity)
+
+    def __contains__(self, entity):
+        return self.store.contains(self.phase, self.path, entity)
+
+    def __iter__(self):
+        return (entity for entity, _ in self.store.entities(self.phase, self.path))
+
+    def __len__(self):
+        return sum(1 for _ in self.store.entities(self.phase, self.path))
+
+    def items(self):
+        return list(self.store.entities(self.phase, self.path))
@@ -0,0 +1,112 @@
+"""
+Token sizes shared by the components planning the requests, so that the same text is
+never encoded twice.
+
+The TokenIndex of an encoding memoizes the size of any text by the hash of its content,
+e.g. the system prompts repeated in every request or the prompts counted both when
+routed and when their cost is reserved. The sizes of the parsed entities are
+precomputed by the parser as TokenSizes, cached on disk along with the parsed modules.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from pydantic import BaseModel, Field, PrivateAttr
+
+# the number of texts whose size is kept in memory
+MAX_TEXTS = 100_000
+
+
+class TokenSizes(BaseModel):
+    """
+    The number of tokens of a module and of its entities' views for an encoding.
+
+    The entities are keyed by unique name (e.g. "Class.method") and line, as a property
+    and its setter share their name.
+
+    Attributes:
+        module (int): The code of the module.
+        structure (int): The structure of the module, without descriptions.
+        entities (dict): The code of each function and class.
+        structures (dict): The structure of each class, without descriptions.
+        docstrings (dict): The docstring of each function and class having one.
+    """
+
+    module: int
+    structure: int
+    entities: dict = Field(default_factory=dict)
+    structures: dict = Field(default_factory=dict)
+    docstrings: dict = Field(default_factory=dict)
+
+    def code(self, entity) -> int:
+        return self.entities[get_entity_key(entity)]
+
+    def class_structure(self, class_) -> int:
+        return self.structures[get_entity_key(class_)]
+
+    def docstring(self, entity) -> int:
+        return self.docstrings.get(get_entity_key(entity), 0)
+
+
+def get_entity_key(entity) -> str:
+    name = getattr(entity, "uname", entity.name)
+    return f"{name}:{entity.node.lineno}"
+
+
+class TokenIndex(BaseModel):
+    """
+    Counts the tokens of texts for an encoding, memoizing the most recent counts.
+
+    Attributes:
+        encoding_name (str): The name of the tiktoken encoding.
+    """
+
+    encoding_name: str
+    _encoding: object = PrivateAttr(default=None)
+    _sizes: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    # the index is shared with the blocking work run in threads, e.g. by DocGen
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def count(self, text: str) -> int:
+        key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+        with self._lock:
+            size = self._sizes.get(key)
+            if size is not None:
+                self._sizes.move_to_end(key)
+                return size
+        if self._encoding is None:
+            import tiktoken
+
+            self._encoding = tiktoken.get_encoding(self.encoding_name)
+        size = len(self._encoding.encode(text))
+        with self._lock:
+            self._sizes[key] = size
+            if len(self._sizes) > MAX_TEXTS:
+                self._sizes.popitem(last=False)
+        return size
+
+    def count_messages(self, messages: list) -> int:
+        """the tokens of the contents of the messages, each one counted separately"""
+        return sum(self.count(message["content"] or "") for message in messages)
+
+
+@lru_cache(maxsize=None)
+def get_encoding_name(model: str) -> str:
+    import tiktoken
+
+    try:
+        return tiktoken.encoding_for_model(model).name
+    except KeyError:
+        # unknown models are counted with the encoding of the recent OpenAI models
+        return "cl100k_base"
+
+
+@lru_cache(maxsize=None)
+def _get_index(encoding_name: str) -> TokenIndex:
+    return TokenIndex(encoding_name=encoding_name)
+
+
+def get_token_index(model: str) -> TokenIndex:
+    """the index shared by all the models with the same encoding"""
+    return _get_index(get_encoding_name(model))
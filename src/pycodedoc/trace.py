@@ -0,0 +1,267 @@
+"""
+Record and replay of completions, so that runs can be benchmarked and regression-tested
+offline and deterministically.
+
+A trace file holds one JSON line per completed request: the hash of its model and
+messages, the content of its streamed chunks with the delay before each of them, and its
+usage. Traces ending with .gz are compressed.
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Optional
+
+from pydantic import BaseModel, PrivateAttr
+
+
+class TraceMissError(Exception):
+    """Raised when a replayed request was not recorded in the trace."""
+
+
+def get_request_key(model: str, messages: list) -> str:
+    request = json.dumps({"model": model, "messages": messages}, sort_keys=True)
+    return hashlib.sha256(request.encode()).hexdigest()
+
+
+def open_trace(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class TraceRecorder(BaseModel):
+    """
+    Appends the completed requests to a trace file. The file must be closed for a
+    compressed trace to be complete; recording after closing it appends to it again.
+
+    Attributes:
+        path (str): The path of the trace file.
+    """
+
+    path: str
+    _file: object = PrivateAttr(default=None)
+    # the file may be closed by a thread writing the documentation while recording
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def record(self, model: str, messages: list, chunks: list, usage: dict = None):
+        """records the (delay, content) of each chunk, the delays being in seconds"""
+        entry = {
+            "key": get_request_key(model, messages),
+            "model": model,
+            "chunks": [[round(delay, 4), content] for delay, content in chunks],
+            "usage": usage,
+        }
+        with self._lock:
+            if self._file is None:
+                self._file = open_trace(self.path, "a")
+            self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class Trace(BaseModel):
+    """
+    The recorded responses of a trace file, by request. Requests recorded several times
+    (e.g. retries) are replayed in the order they were recorded, cycling when exhausted.
+
+    Attributes:
+        path (str): The path of the trace file.
+        realtime (bool): Replay the responses with their recorded latencies. Default is False (instantly).
+    """
+
+    path: str
+    realtime: bool = False
+    _entries: dict = PrivateAttr(default=None)
+    _positions: dict = PrivateAttr(default_factory=lambda: defaultdict(int))
+
+    def get_entry(self, model: str, messages: list) -> dict:
+        if self._entries is None:
+            self._entries = defaultdict(list)
+            with open_trace(self.path, "r") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self._entries[entry["key"]].append(entry)
+        key = get_request_key(model, messages)
+        if key not in self._entries:
+            raise TraceMissError(f"Request to {model} not recorded in {self.path}.")
+        entries = self._entries[key]
+        entry = entries[self._positions[key] % len(entries)]
+        self._positions[key] += 1
+        return entry
+
+
+def get_usage_dict(usage) -> Optional[dict]:
+    if usage is None:
+        return None
+    usage_dict = {
+        "prompt_tokens": usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+    }
+    # the prompt tokens served from the provider's prefix cache, if reported
+    details = getattr(usage, "prompt_tokens_details", None)
+    if getattr(details, "cached_tokens", None):
+        usage_dict["cached_tokens"] = details.cached_tokens
+    return usage_dict
+
+
+def make_usage(usage: dict):
+    """builds a usage with the attributes of the usage of the OpenAI client"""
+    details = SimpleNamespace(cached_tokens=usage.get("cached_tokens", 0))
+    return SimpleNamespace(
+        prompt_tokens=usage["prompt_tokens"],
+        completion_tokens=usage["completion_tokens"],
+        prompt_tokens_details=details,
+    )
+
+
+def make_chunk(content: str = None, usage: dict = None):
+    """builds a chunk with the attributes of the streamed chunks of the OpenAI client"""
+    if usage is not None:
+        return SimpleNamespace(choices=[], usage=make_usage(usage))
+    delta = SimpleNamespace(content=content, tool_calls=None)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+
+
+def make_completion(entry: dict):
+    """builds a non-streamed completion from a recorded entry"""
+    content = "".join(content for _, content in entry["chunks"])
+    message = SimpleNamespace(role="assistant", content=content, tool_calls=None)
+    usage = make_usage(entry["usage"]) if entry["usage"] else None
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+class _ChunksRecorder:
+    """accumulates the chunks of a streamed response and records them once complete"""
+
+    def __init__(self, recorder: TraceRecorder, model: str, messages: list):
+        self.recorder, self.model, self.messages = recorder, model, messages
+        self.chunks, self.usage = [], None
+        self.last = time.perf_counter()
+
+    def add(self, chunk):
+        now = time.perf_counter()
+        if chunk.choices and chunk.choices[0].delta:
+            content = chunk.choices[0].delta.content
+            if content:
+                self.chunks.append((now - self.last, content))
+                self.last = now
+        if getattr(chunk, "usage", None):
+            self.usage = get_usage_dict(chunk.usage)
+
+    def done(self):
+        self.recorder.record(self.model, self.messages, self.chunks, self.usage)
+
+
+class RecordingClient:
+    """Wraps an OpenAI client, sync or async, recording its chat completions."""
+
+    def __init__(self, client, recorder: TraceRecorder, is_async: bool = False):
+        self._client, self.recorder, self.is_async = client, recorder, is_async
+        create = self.acreate if is_async else self.create
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=create))
+
+    async def __aenter__(self):
+        await self._client.__aenter__()
+        return self
+
+    async def __aexit__(self, *args):
+        return await self._client.__aexit__(*args)
+
+    def create(self, messages, model, stream=False, **kwargs):
+        chunks = _ChunksRecorder(self.recorder, model, messages)
+        response = self._client.chat.completions.create(
+            messages=messages, model=model, stream=stream, **kwargs
+        )
+        if not stream:
+            self._record_completion(chunks, response)
+            return response
+
+        def iterate():
+            for chunk in response:
+                chunks.add(chunk)
+                yield chunk
+            chunks.done()
+
+        return iterate()
+
+    async def acreate(self, messages, model, stream=False, **kwargs):
+        chunks = _ChunksRecorder(self.recorder, model, messages)
+        response = await self._client.chat.completions.create(
+            messages=messages, model=model, stream=stream, **kwargs
+        )
+        if not stream:
+            self._record_completion(chunks, response)
+            return response
+
+        async def iterate():
+            async for chunk in response:
+                chunks.add(chunk)
+                yield chunk
+            chunks.done()
+
+        return iterate()
+
+    def _record_completion(self, chunks: _ChunksRecorder, response):
+        content = response.choices[0].message.content or ""
+        chunks.chunks.append((time.perf_counter() - chunks.last, content))
+        chunks.usage = get_usage_dict(getattr(response, "usage", None))
+        chunks.done()
+
+
+class ReplayClient:
+    """Serves the chat completions recorded in a trace, sync or async."""
+
+    def __init__(self, trace: Trace, is_async: bool = False):
+        self.trace, self.is_async = trace, is_async
+        create = self.acreate if is_async else self.create
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=create))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def create(self, messages, model, stream=False, **kwargs):
+        entry = self.trace.get_entry(model, messages)
+        if not stream:
+            if self.trace.realtime:
+                time.sleep(sum(delay for delay, _ in entry["chunks"]))
+            return make_completion(entry)
+
+        def iterate():
+            for delay, content in entry["chunks"]:
+                if self.trace.realtime:
+                    time.sleep(delay)
+                yield make_chunk(content)
+            if entry["usage"]:
+                yield make_chunk(usage=entry["usage"])
+
+        return iterate()
+
+    async def acreate(self, messages, model, stream=False, **kwargs):
+        entry = self.trace.get_entry(model, messages)
+        if not stream:
+            if self.trace.realtime:
+                await asyncio.sleep(sum(delay for delay, _ in entry["chunks"]))
+            return make_completion(entry)
+
+        async def iterate():
+            for delay, content in entry["chunks"]:
+                if self.trace.realtime:
+                    await asyncio.sleep(delay)
+                yield make_chunk(content)
+            if entry["usage"]:
+                yield make_chunk(usage=entry["usage"])
+
+        return iterate()
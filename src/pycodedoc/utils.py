@@ -1,4 +1,8 @@
+import gc
 import logging
+from contextlib import contextmanager
+from itertools import tee
+from operator import itemgetter
 
 from rich.logging import RichHandler
 
@@ -21,3 +25,26 @@ def set_logger():
 
     logger.addHandler(handler)
     return logger
+
+
+def unzip(iterable, n: int):
+    """
+    splits an iterable of n-tuples into n iterators, which only buffer the items not
+    consumed yet by all of them when iterated in lockstep (e.g. zipped)
+    """
+    return [map(itemgetter(i), it) for i, it in enumerate(tee(iterable, n))]
+
+
+@contextmanager
+def paused_gc():
+    """
+    pauses the cyclic garbage collector while allocating many long-lived objects, e.g.
+    the ASTs of a project, which it would otherwise traverse again and again
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
@@ -0,0 +1,87 @@
+import os
+import time
+
+from pydantic import BaseModel, PrivateAttr
+
+from pycodedoc.docgen import DocGen
+from pycodedoc.utils import set_logger
+
+logger = set_logger()
+
+
+class Watcher(BaseModel):
+    """
+    The Watcher class keeps a DocGen instance alive and updates the documentation
+    whenever the modules of the project change.
+
+    Changes are detected by polling the modification times of the project's modules.
+    Bursts of changes (e.g. saving several files, switching branches) are debounced so
+    that the documentation is only updated once the files stop changing.
+
+    Attributes:
+        docgen (DocGen): The DocGen instance holding the parsed project and its descriptions.
+        interval (float): The number of seconds between two polls. Default is 1.0.
+        debounce (float): The number of seconds without changes to wait for before updating. Default is 0.5.
+    """
+
+    docgen: DocGen
+    interval: float = 1.0
+    debounce: float = 0.5
+    _mtimes: dict = PrivateAttr(default_factory=dict)
+
+    def run(self):
+        """generates the documentation and updates it on every change until interrupted"""
+        self.docgen.generate_documentation()
+        self._mtimes = self.snapshot()
+        logger.info("WATCHING %s FOR CHANGES", self.docgen.base_dir)
+        try:
+            while True:
+                modified_paths, removed_paths = self.wait_for_changes()
+                logger.info(
+                    "DETECTED CHANGES IN %s",
+                    ", ".join(sorted(modified_paths + removed_paths)),
+                )
+                start = time.perf_counter()
+                self.docgen.update_documentation(modified_paths, removed_paths)
+                logger.info(
+                    "DOCUMENTATION UPDATED IN %.1fs", time.perf_counter() - start
+                )
+        except KeyboardInterrupt:
+            logger.info("STOPPED WATCHING")
+
+    def wait_for_changes(self):
+        """blocks until some changes are detected and the files stopped changing"""
+        modified, removed = set(), set()
+        while True:
+            time.sleep(self.interval)
+            new_modified, new_removed = self.poll()
+            if new_modified or new_removed:
+                break
+        while new_modified or new_removed:
+            modified = (modified | new_modified) - new_removed
+            removed = (removed | new_removed) - new_modified
+            time.sleep(self.debounce)
+            new_modified, new_removed = self.poll()
+        return sorted(modified), sorted(removed)
+
+    def poll(self):
+        """returns the modules modified (or added) and removed since the last poll"""
+        mtimes = self.snapshot()
+        modified = {
+            path for path, mtime in mtimes.items() if self._mtimes.get(path) != mtime
+        }
+        removed = set(self._mtimes) - set(mtimes)
+        self._mtimes = mtimes
+        return modified, removed
+
+    def snapshot(self):
+        # walk the project again so that added and removed modules are detected
+        self.docgen.parser.reset_index()
+        mtimes = {}
+        for module_path in self.docgen.parser.get_modules_paths():
+            try:
+                stat = os.stat(os.path.join(self.docgen.base_dir, module_path))
+            except FileNotFoundError:
+                continue
+            mtimes[module_path] = (stat.st_mtime_ns, stat.st_size)
+        return mtimes
@@ -0,0 +1,81 @@
+import pytest
+
+from pycodedoc import tokens
+
+
+class WhitespaceEncoding:
+    """counts one token per whitespace-separated word, without any download"""
+
+    name = "whitespace"
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, text):
+        self.calls += 1
+        return text.split()
+
+
+@pytest.fixture
+def encoding(monkeypatch):
+    import tiktoken
+
+    encoding = WhitespaceEncoding()
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: encoding)
+    monkeypatch.setattr(tiktoken, "encoding_for_model", lambda model: encoding)
+    tokens.get_encoding_name.cache_clear()
+    tokens._get_index.cache_clear()
+    yield encoding
+    tokens.get_encoding_name.cache_clear()
+    tokens._get_index.cache_clear()
+
+
+def write(root, files: dict):
+    for path, content in files.items():
+        file_path = root / path
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(content)
+
+
+class FakeClient:
+    """
+    streams a short description of each prompt, failing the requests whose prompt
+    contains any of the given texts
+    """
+
+    def __init__(self, fail: tuple = ()):
+        self.fail = fail
+        self.prompts = []
+        self.chat = self.completions = self
+
+    async def create(self, messages, model, stream=False, **kwargs):
+        from pycodedoc.trace import make_chunk
+
+        prompt = messages[-1]["content"]
+        self.prompts.append(prompt)
+        if any(text in prompt for text in self.fail):
+            raise RuntimeError("request failed")
+        content = f"description {len(self.prompts)}"
+        if not stream:
+            return {"role": "assistant", "content": content}
+
+        async def iterate():
+            yield make_chunk(content)
+
+        return iterate()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    """the fake client replacing the async OpenAI client created by the Llm"""
+    import openai
+
+    client = FakeClient()
+    monkeypatch.setattr(openai, "AsyncOpenAI", lambda **kwargs: client)
+    return client
@@ -0,0 +1,37 @@
+import pytest
+
+from pycodedoc.batch import document_repos, load_manifest
+
+
+def write_manifest(tmp_path, content: str) -> str:
+    path = tmp_path / "repos.toml"
+    path.write_text(content)
+    return str(path)
+
+
+def test_manifest_paths_are_relative_to_it(tmp_path):
+    manifest = write_manifest(
+        tmp_path,
+        '[[repos]]\nbase_dir = "api"\ndescriptions_db = "api.db"\n'
+        '[[repos]]\nbase_dir = "worker"\noutput_dir = "docs/worker"\n',
+    )
+    api, worker = load_manifest(manifest)
+    assert api["output_dir"] == str(tmp_path / "api" / "docs")
+    assert api["descriptions_db"] == str(tmp_path / "api.db")
+    assert worker["output_dir"] == str(tmp_path / "docs" / "worker")
+
+
+def test_repositories_cannot_share_a_descriptions_db(tmp_path):
+    manifest = write_manifest(
+        tmp_path,
+        '[[repos]]\nbase_dir = "api"\ndescriptions_db = "d.db"\n'
+        '[[repos]]\nbase_dir = "worker"\ndescriptions_db = "./d.db"\n',
+    )
+    with pytest.raises(ValueError, match="share a descriptions_db"):
+        load_manifest(manifest)
+
+
+def test_global_descriptions_db_is_rejected(tmp_path):
+    manifest = write_manifest(tmp_path, '[[repos]]\nbase_dir = "api"\n')
+    with pytest.raises(ValueError, match="cannot be shared"):
+        document_repos(manifest, {"descriptions_db": str(tmp_path / "d.db")})
@@ -0,0 +1,59 @@
+import ast
+import os
+
+import pytest
+from conftest import write
+
+from pycodedoc import cache
+from pycodedoc.parser import Parser
+
+
+def test_user_cache_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(cache.sys, "platform", "linux")
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    assert cache.get_user_cache_dir() == os.path.join(str(tmp_path), "pycodedoc")
+
+
+def test_cache_is_ignored_by_git(tmp_path):
+    entries = cache.Cache(cache_dir=str(tmp_path / "cache"))
+    entries.save("modules", "key", {"a": 1})
+    assert (tmp_path / "cache" / ".gitignore").read_text() == "*\n"
+    assert entries.load("modules", "key") == {"a": 1}
+
+
+def test_parser_reuses_cache(tmp_path, monkeypatch):
+    from code2flow import engine
+
+    write(
+        tmp_path / "project",
+        {"a.py": "def f():\n    return g()\n\n\ndef g():\n    pass\n"},
+    )
+    base_dir, cache_dir = str(tmp_path / "project"), str(tmp_path / "cache")
+    paths = [str(tmp_path / "project" / "a.py")]
+    first = Parser(base_dir=base_dir, cache_dir=cache_dir)
+    flows = first.parse_files_flows(paths)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the cache was not used")
+
+    # a warm run neither parses the files nor maps their flows
+    monkeypatch.setattr(ast, "parse", fail)
+    monkeypatch.setattr(engine, "map_it", fail)
+    second = Parser(base_dir=base_dir, cache_dir=cache_dir)
+    assert [m.path for m in second.get_modules()] == ["a.py"]
+    assert second.get_functions("a.py", attr="name") == ["f", "g"]
+    assert [str(edge.node0.token) for edge in second.parse_files_flows(paths)[2]] == [
+        str(edge.node0.token) for edge in flows[2]
+    ]
+    # a modified file is parsed again
+    monkeypatch.undo()
+    write(tmp_path / "project", {"a.py": "def h():\n    pass\n"})
+    third = Parser(base_dir=base_dir, cache_dir=cache_dir)
+    assert third.get_functions("a.py", attr="name") == ["h"]
+
+
+@pytest.mark.parametrize("cache_dir", ["cache", "pkg/cache", "."])
+def test_cache_within_project_is_rejected(tmp_path, cache_dir):
+    write(tmp_path, {"a.py": "x = 1\n"})
+    with pytest.raises(ValueError, match="within the documented directory"):
+        Parser(base_dir=str(tmp_path), cache_dir=str(tmp_path / cache_dir))
@@ -0,0 +1,20 @@
+from typer.testing import CliRunner
+
+from pycodedoc.cli import app
+
+runner = CliRunner()
+
+
+def test_shards_reject_watch(tmp_path):
+    result = runner.invoke(app, ["-d", str(tmp_path), "--shards", "2", "--watch"])
+    assert result.exit_code != 0
+    assert "--watch option cannot be used with --shards" in result.output
+
+
+def test_shards_reject_record(tmp_path):
+    trace = str(tmp_path / "trace.jsonl.gz")
+    result = runner.invoke(
+        app, ["-d", str(tmp_path), "--shards", "2", "--record", trace]
+    )
+    assert result.exit_code != 0
+    assert "--record option cannot be used with --shards" in result.output
@@ -0,0 +1,98 @@
+import textwrap
+
+from conftest import write
+
+from pycodedoc.context import ContextBuilder
+from pycodedoc.parser import Parser
+from pycodedoc.prompts import get_module_context, get_modules_deps_prompts
+
+FILES = {
+    "a/utils.py": "def load():\n    return 1\n",
+    "b/utils.py": "def save():\n    return 2\n",
+    "main.py": textwrap.dedent(
+        """
+        from a.utils import load
+        from b.utils import save
+
+
+        def run():
+            load()
+            save()
+        """
+    ),
+}
+
+
+def get_context(tmp_path, prefix=None, descriptions=None, **kwargs):
+    write(tmp_path, FILES)
+    parser = Parser(base_dir=str(tmp_path), exclude_patterns=[])
+    module = parser.get_module("main.py")
+    deps = parser.get_module_deps("main.py")
+    builder = ContextBuilder(model="gpt-4", **kwargs)
+    module_code, _, graph = parser.get_deps_code(
+        module,
+        deps,
+        str(tmp_path / "docs"),
+        builder=builder,
+        prefix=prefix,
+        **(descriptions or {}),
+    )
+    module_code = module_code if prefix is None else prefix
+    return builder.reports["main.py"], len((module_code + graph).split())
+
+
+def test_dependencies_sharing_a_name(tmp_path, encoding):
+    # a budget barely fitting the module forces the entities to be selected one by one
+    context, module_tokens = get_context(tmp_path, budget=30)
+    assert 30 - module_tokens < 10
+    assert "return 1" in context.code
+    assert "return 2" in context.code
+    assert not context.dropped
+
+
+def test_budget_includes_the_module_and_graph(tmp_path, encoding):
+    context, module_tokens = get_context(tmp_path, budget=1000)
+    assert context.budget == 1000 - module_tokens
+    context, module_tokens = get_context(tmp_path, budget=module_tokens)
+    assert context.code == ""
+    assert len(context.dropped) == 2
+
+
+def test_budget_includes_the_prefix(tmp_path, encoding):
+    prefix = get_module_context("main.py", FILES["main.py"])
+    context, prefix_tokens = get_context(tmp_path, prefix=prefix, budget=1000)
+    _, module_tokens = get_context(tmp_path, budget=1000)
+    assert prefix_tokens > module_tokens
+    assert context.budget == 1000 - prefix_tokens
+
+
+def test_dependencies_described_by_their_summaries(tmp_path, encoding):
+    descriptions = {
+        "descriptions": {"a/utils.py": {"load": "loads the value"}},
+        "modules_descriptions": {"a/utils.py": "loading helpers"},
+    }
+    context, _ = get_context(
+        tmp_path, descriptions=descriptions, budget=1000, summaries=True
+    )
+    # the code of the dependencies is never given, even when it fits
+    assert "return 1" not in context.code and "return 2" not in context.code
+    assert "loading helpers" in context.code and "loads the value" in context.code
+    # the dependencies not described yet are given by their signatures
+    assert "def save" in context.code
+    assert not context.summarized and not context.dropped
+
+
+def test_deps_prompts_skip_the_module_given_by_the_prefix():
+    kwargs = dict(instructions="describe", system_prompt="system")
+    args = (["MODULE CODE"], ["DEPS CODE"], ["a.py f() -> b.py g()"])
+    (messages,) = get_modules_deps_prompts(*args, **kwargs)["messages_batches"]
+    assert "# MODULE:" in messages[1]["content"]
+    assert "MODULE CODE" in messages[1]["content"]
+    contexts = [get_module_context("a.py", "PREFIX CODE")]
+    (messages,) = get_modules_deps_prompts(*args, modules_contexts=contexts, **kwargs)[
+        "messages_batches"
+    ]
+    prompt = messages[1]["content"]
+    assert prompt.startswith(contexts[0])
+    assert "MODULE CODE" not in prompt and "# MODULE:" not in prompt
+    assert "DEPS CODE" in prompt and "a.py f() -> b.py g()" in prompt
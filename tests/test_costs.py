@@ -0,0 +1,97 @@
+import pytest
+from conftest import write
+
+from pycodedoc.costs import (
+    calculate_cost,
+    estimate_cost,
+    estimate_module,
+    estimate_packages,
+    estimate_project,
+)
+from pycodedoc.docgen import DocGen
+
+FILES = {
+    "shop.py": (
+        "class Cart:\n"
+        "    def add(self, item):\n"
+        "        self.items.append(item)\n\n\n"
+        "def total(cart):\n"
+        "    return sum(cart.items)\n"
+    )
+}
+
+
+@pytest.fixture
+def make_docgen(tmp_path, encoding):
+    write(tmp_path, FILES)
+
+    def make_docgen(**kwargs):
+        return DocGen(
+            base_dir=str(tmp_path),
+            output_dir=str(tmp_path / "docs"),
+            no_relations=True,
+            no_cache=True,
+            use_structure=True,
+            **kwargs,
+        )
+
+    return make_docgen
+
+
+def get_costs(docgen):
+    module = docgen.parser.get_module("shop.py")
+    return {
+        phase: estimate["cost"]
+        for phase, estimate in estimate_module(docgen, module).items()
+    }
+
+
+def test_phases_are_priced_with_their_profile_model(make_docgen):
+    default = get_costs(make_docgen(model="gpt-3.5-turbo-0125"))
+    profiled = get_costs(
+        make_docgen(
+            model="gpt-3.5-turbo-0125", profiles={"functions": {"model": "gpt-4"}}
+        )
+    )
+    assert profiled["functions"] > 10 * default["functions"]
+    assert profiled["classes"] == default["classes"]
+    assert profiled["modules"] == default["modules"]
+
+
+def test_small_prompts_are_priced_with_the_small_model(make_docgen):
+    routed = get_costs(
+        make_docgen(model="gpt-4", router={"small_model": "gpt-3.5-turbo"})
+    )
+    default = get_costs(make_docgen(model="gpt-4"))
+    for phase in ["functions", "classes", "modules"]:
+        assert 0 < routed[phase] < default[phase] / 10
+
+
+def test_project_is_priced_with_its_profile_model(make_docgen):
+    docgen = make_docgen(profiles={"project": {"model": "gpt-4"}})
+    assert estimate_project(docgen)["cost"] == calculate_cost(100, 50, "gpt-4")
+
+
+def test_package_rollup_estimates_one_request_per_package(tmp_path, make_docgen):
+    write(
+        tmp_path,
+        {"shop/cart.py": "CART = []\n", "shop/payments/card.py": "CARD = None\n"},
+    )
+    docgen = make_docgen(package_rollup=True)
+    model = docgen.model
+    # shop has a module and a subpackage, shop/payments a module
+    packages = estimate_packages(docgen)
+    assert packages["requests"] == 2
+    assert packages["cost"] == pytest.approx(
+        calculate_cost(100 + 80, 80, model) + calculate_cost(100, 80, model)
+    )
+    # the overview is built from the root module and the top-level package
+    assert estimate_project(docgen)["cost"] == calculate_cost(100 + 80, 50, model)
+    flat = make_docgen()
+    assert estimate_cost(docgen) == pytest.approx(
+        estimate_cost(flat)
+        + packages["cost"]
+        + estimate_project(docgen)["cost"]
+        - estimate_project(flat)["cost"],
+        abs=2e-6,
+    )
@@ -0,0 +1,189 @@
+import asyncio
+import textwrap
+
+import pytest
+from conftest import FakeClient, write
+
+from pycodedoc.docgen import MISSING_DESCRIPTION, DocGen
+
+FILES = {
+    "shop/cart.py": textwrap.dedent(
+        """
+        from shop.prices import price
+
+
+        class Cart:
+            def __init__(self):
+                self.items = []
+
+            def total(self):
+                return sum(price(item) for item in self.items)
+        """
+    ),
+    "shop/prices.py": "def price(item):\n    return item.price\n",
+}
+
+
+@pytest.fixture
+def project(tmp_path, encoding):
+    write(tmp_path / "project", FILES)
+    return tmp_path
+
+
+def make_docgen(tmp_path, **kwargs):
+    (tmp_path / "docs").mkdir(exist_ok=True)
+    kwargs.setdefault("llm", {"retry_backoff": 0})
+    return DocGen(
+        base_dir=str(tmp_path / "project"),
+        output_dir=str(tmp_path / "docs"),
+        create_graphs=False,
+        no_cache=True,
+        use_structure=True,
+        **kwargs,
+    )
+
+
+def run(docgen, client, method: str = "agenerate_documentation", *args):
+    async def run_documentation():
+        async with docgen.llm.async_session(client=client):
+            await getattr(docgen, method)(*args)
+
+    asyncio.run(run_documentation())
+
+
+def read_markdown(tmp_path) -> str:
+    return (tmp_path / "docs" / "project-doc.md").read_text()
+
+
+def test_async_generation_with_a_database(project):
+    # the markdown is written in a worker thread, the descriptions on the loop's one
+    db = str(project / "descriptions.db")
+    docgen = make_docgen(project, descriptions_db=db)
+    run(docgen, FakeClient())
+    markdown = read_markdown(project)
+    assert "shop/cart.py" in markdown and "description" in markdown
+    resumed = make_docgen(project, descriptions_db=db)
+    assert resumed._descriptions.modules["shop/cart.py"].startswith("description")
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store_kwargs(request, project):
+    if request.param == "memory":
+        return {}
+    return {"descriptions_db": str(project / "db" / "descriptions.db")}
+
+
+def get_modules(docgen) -> dict:
+    return dict(docgen.get_descriptions().modules.to_dict())
+
+
+def test_async_generation(project, store_kwargs):
+    docgen = make_docgen(project, **store_kwargs)
+    client = FakeClient()
+    run(docgen, client)
+    descriptions = docgen.get_descriptions()
+    # 3 methods and functions, 1 class, 2 modules, 1 relation and the overview
+    assert len(client.prompts) == 8
+    assert set(get_modules(docgen)) == {"shop/cart.py", "shop/prices.py"}
+    assert descriptions.modules_deps["shop/cart.py"] is not None
+    assert descriptions.project is not None
+    markdown = read_markdown(project)
+    for description in get_modules(docgen).values():
+        assert description in markdown
+
+
+def test_async_update(project, store_kwargs):
+    docgen = make_docgen(project, **store_kwargs)
+    run(docgen, FakeClient())
+    modules = get_modules(docgen)
+    prices = project / "project" / "shop" / "prices.py"
+    prices.write_text(prices.read_text() + "\n\ndef discount(item):\n    return 0\n")
+    client = FakeClient()
+    run(docgen, client, "aupdate_documentation", ["shop/prices.py"])
+    # the modified module, its 2 functions, the relations of its dependent module
+    # and the overview are described again
+    assert len(client.prompts) == 5
+    updated = get_modules(docgen)
+    assert updated["shop/cart.py"] == modules["shop/cart.py"]
+    assert updated["shop/prices.py"] != modules["shop/prices.py"]
+    assert "discount" in docgen.get_descriptions().functions["shop/prices.py"]
+    assert updated["shop/prices.py"] in read_markdown(project)
+
+
+def test_async_batches_run_their_blocking_work_first(project, store_kwargs):
+    docgen = make_docgen(project, **store_kwargs)
+    done = []
+
+    def prepare():
+        done.append("prepare")
+
+    def store(i, response):
+        done.append(response["content"])
+
+    messages = [[{"role": "user", "content": "hello"}]]
+    batches = [prepare, ("modules", iter(messages), store)]
+    run(docgen, FakeClient(), "arun_batches", batches)
+    assert done == ["prepare", "description 1"]
+
+
+def test_prefix_caching_keeps_the_structure_view(project):
+    docgen = make_docgen(project, prefix_caching=True)
+    client = FakeClient()
+    run(docgen, client)
+    # the module's prompt starts with its code, then describes its structure
+    prompt = next(p for p in client.prompts if "what this module does" in p)
+    prefix, context = prompt.split("### CONTEXT:")
+    assert "self.items = []" in prefix
+    assert '"""description 1"""' in context and "self.items" not in context
+
+
+def test_failed_requests_are_marked_as_gaps(project):
+    docgen = make_docgen(project)
+    # only the relations of shop/cart.py are described from the code of prices.py
+    client = FakeClient(fail=("FILE prices.py",))
+    run(docgen, client)
+    # 3 attempts in the batch and in each of the 2 retry rounds
+    assert sum("FILE prices.py" in prompt for prompt in client.prompts) == 9
+    descriptions = docgen.get_descriptions()
+    assert dict(descriptions.gaps.to_dict()) == {
+        "modules_deps": {"shop/cart.py": "request failed"}
+    }
+    assert descriptions.modules_deps["shop/cart.py"] is None
+    assert set(get_modules(docgen)) == {"shop/cart.py", "shop/prices.py"}
+    markdown = read_markdown(project)
+    assert MISSING_DESCRIPTION in markdown
+    missing = markdown.split("## MISSING DESCRIPTIONS")[1]
+    gaps = [line for line in missing.splitlines() if line.startswith("- ")]
+    assert gaps == ["- modules_deps: shop/cart.py"]
+
+
+def test_gaps_are_cleared_once_described(project):
+    docgen = make_docgen(project)
+    run(docgen, FakeClient(fail=("FILE prices.py",)))
+    run(docgen, FakeClient(), "agenerate_modules_deps_desc")
+    assert not any(docgen.get_descriptions().gaps.values())
+    assert "MISSING DESCRIPTIONS" not in docgen.generate_markdown()
+
+
+def test_scope_keeps_the_descriptions_of_the_rest_of_the_project(project):
+    db = str(project / "descriptions.db")
+    write(project / "project", {"shop/orders.py": "ORDERS = []\n"})
+    docgen = make_docgen(project, descriptions_db=db)
+    run(docgen, FakeClient())
+    modules = get_modules(docgen)
+    (project / "project" / "shop" / "orders.py").unlink()
+    scoped = make_docgen(project, descriptions_db=db, include=["shop/prices.py"])
+    assert scoped.get_scope() == ["shop/prices.py"]
+    assert [module.path for module in scoped.parser.get_modules()] == ["shop/prices.py"]
+    run(scoped, FakeClient())
+    updated = get_modules(scoped)
+    # the removed module is dropped, the module out of the scope kept as it was
+    assert set(updated) == {"shop/cart.py", "shop/prices.py"}
+    assert updated["shop/cart.py"] == modules["shop/cart.py"]
+    assert updated["shop/prices.py"] != modules["shop/prices.py"]
+    assert modules["shop/cart.py"] in read_markdown(project)
+
+
+def test_scope_without_any_module(project):
+    with pytest.raises(ValueError, match="No module"):
+        make_docgen(project, include=["docs"])
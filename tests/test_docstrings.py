@@ -0,0 +1,41 @@
+import pytest
+
+from pycodedoc.docstrings import get_summary, is_usable_docstring
+
+
+@pytest.mark.parametrize(
+    "docstring",
+    [
+        None,
+        "",
+        "TODO",
+        "Docstring.",
+        "...",
+        "Short summary.",
+        "TODO: write docstring",
+        "FIXME: document this",
+        "Placeholder docstring, fill me",
+        "Parses the config. TBD whether it validates it.",
+        "todo - describe the arguments",
+    ],
+)
+def test_unusable_docstrings(docstring):
+    assert not is_usable_docstring(docstring)
+
+
+@pytest.mark.parametrize(
+    "docstring",
+    [
+        "Parses the configuration file of the project.",
+        "Returns the todos of the user, sorted by date.",
+        "Fixes the mtime of the written files.\n\nTODO: handle symlinks.",
+    ],
+)
+def test_usable_docstrings(docstring):
+    assert is_usable_docstring(docstring)
+
+
+def test_summary_is_the_first_paragraph():
+    assert get_summary("\n  First line\n  continued.\n\n  Details.\n") == (
+        "First line\n  continued."
+    )
@@ -0,0 +1,135 @@
+import textwrap
+
+from conftest import write
+
+from pycodedoc.graphs import GraphReducer, get_class_names
+from pycodedoc.parser import Parser
+
+CODE = textwrap.dedent(
+    """
+    def log(message):
+        print(message)
+
+
+    class Store:
+        def __init__(self):
+            log("init")
+
+        def __repr__(self):
+            return "Store"
+
+        def save(self, item):
+            log("save")
+            self.check(item)
+            repr(self)
+            self.__repr__()
+
+        def check(self, item):
+            log("check")
+            return item
+
+
+    class Cache:
+        def get(self, key):
+            log("get")
+            return Store().save(key)
+
+
+    def run():
+        store = Store()
+        store.save(1)
+        Cache().get(2)
+        log("run")
+
+
+    def main():
+        log("main")
+        run()
+    """
+)
+
+
+def get_graph(tmp_path):
+    write(tmp_path, {"app.py": CODE})
+    parser = Parser(base_dir=str(tmp_path))
+    return parser.parse_files_flows([str(tmp_path / "app.py")])
+
+
+def get_names(nodes):
+    return sorted(node.token for node in nodes)
+
+
+def get_calls(edges):
+    return sorted((edge.node0.token, edge.node1.token) for edge in edges)
+
+
+def test_small_graphs_are_kept(tmp_path):
+    groups, nodes, edges = get_graph(tmp_path)
+    ((suffix, _, reduced_nodes, reduced_edges),) = GraphReducer().reduce(
+        groups, nodes, edges
+    )
+    assert suffix == ""
+    # nothing to reduce, the graph is not copied
+    assert reduced_nodes is nodes and reduced_edges is edges
+
+
+def test_trivial_nodes_are_pruned(tmp_path):
+    groups, nodes, edges = get_graph(tmp_path)
+    reducer = GraphReducer(prune_trivial=True, utility_min_callers=5)
+    _, _, reduced_nodes, reduced_edges = reducer.reduce(groups, nodes, edges)[0]
+    # log is a leaf called by many functions, __repr__ a dunder method
+    assert "log" in get_names(nodes) and "__repr__" in get_names(nodes)
+    assert "log" not in get_names(reduced_nodes)
+    assert "__repr__" not in get_names(reduced_nodes)
+    # constructors are never trivial
+    assert ("run", "__init__") in get_calls(reduced_edges)
+    # the original graph, cached by the parser, is left untouched
+    assert "log" in get_names(nodes)
+    assert len(edges) == len(get_graph(tmp_path)[2])
+
+
+def test_leaves_are_pruned(tmp_path):
+    groups, nodes, edges = get_graph(tmp_path)
+    reducer = GraphReducer(prune_leaves=True)
+    _, _, reduced_nodes, reduced_edges = reducer.reduce(groups, nodes, edges)[0]
+    leaves = {node.token for node in nodes if node.is_leaf}
+    assert leaves and not leaves.intersection(get_names(reduced_nodes))
+    assert reduced_edges
+
+
+def test_limits_keep_the_most_connected_nodes(tmp_path):
+    groups, nodes, edges = get_graph(tmp_path)
+    reducer = GraphReducer(max_nodes=3, max_edges=2, utility_min_callers=100)
+    _, _, reduced_nodes, reduced_edges = reducer.reduce(groups, nodes, edges)[0]
+    assert 0 < len(reduced_nodes) <= 3
+    assert 0 < len(reduced_edges) <= 2
+    assert {edge.node0 for edge in reduced_edges} <= set(reduced_nodes)
+    assert {edge.node1 for edge in reduced_edges} <= set(reduced_nodes)
+
+
+def test_collapse_methods(tmp_path):
+    groups, nodes, edges = get_graph(tmp_path)
+    reducer = GraphReducer(collapse_methods=True)
+    _, reduced_groups, reduced_nodes, reduced_edges = reducer.reduce(
+        groups, nodes, edges
+    )[0]
+    assert get_names(reduced_nodes) == ["Cache", "Store", "log", "main", "run"]
+    assert ("Cache", "Store") in get_calls(reduced_edges)
+    assert ("Store", "Store") not in get_calls(reduced_edges)
+    assert get_class_names(reduced_groups) == []
+    store = next(node for node in reduced_nodes if node.token == "Store")
+    assert store.label().endswith("class Store")
+    assert "label" not in vars(store)
+
+
+def test_split_writes_an_overview_and_a_graph_per_class(tmp_path):
+    groups, nodes, edges = get_graph(tmp_path)
+    graphs = GraphReducer(split=True).reduce(groups, nodes, edges)
+    assert [suffix for suffix, *_ in graphs] == ["", "_Store", "_Cache"]
+    overview = graphs[0][2]
+    assert "save" not in get_names(overview) and "Store" in get_names(overview)
+    # the detail graph of a class shows its methods and their callers and callees
+    store_calls = get_calls(graphs[1][3])
+    assert ("save", "check") in store_calls
+    assert ("run", "save") in store_calls
+    assert ("main", "run") not in store_calls
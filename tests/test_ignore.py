@@ -0,0 +1,115 @@
+import pytest
+
+from pycodedoc.ignore import IgnoreRules, is_ignored
+from pycodedoc.parser import Parser
+
+
+def match(patterns, path, is_dir=False, base=""):
+    return IgnoreRules(patterns=patterns, base=base).match(path, is_dir)
+
+
+@pytest.mark.parametrize(
+    "pattern, path, expected",
+    [
+        # patterns without a slash match a name at any depth
+        ("*.log", "debug.log", True),
+        ("*.log", "a/b/debug.log", True),
+        ("build", "a/build", True),
+        # a wildcard never crosses a directory
+        ("a/*.py", "a/b/c.py", None),
+        ("a/*.py", "a/c.py", True),
+        # a slash anchors the pattern to the base directory
+        ("/setup.py", "setup.py", True),
+        ("/setup.py", "pkg/setup.py", None),
+        ("doc/frotz", "doc/frotz", True),
+        ("doc/frotz", "a/doc/frotz", None),
+        # ** matches any number of directories
+        ("**/tests", "tests", True),
+        ("**/tests", "a/b/tests", True),
+        ("a/**/b.py", "a/b.py", True),
+        ("a/**/b.py", "a/x/y/b.py", True),
+        ("a/**/b.py", "c/a/b.py", None),
+        ("vendor/**", "vendor/lib/x.py", True),
+        ("vendor/**", "vendor", None),
+        ("?.py", "a.py", True),
+        ("?.py", "ab.py", None),
+        ("[ab].py", "b.py", True),
+        ("[!ab].py", "b.py", None),
+        ("[!ab].py", "c.py", True),
+        # escaped special characters and trailing spaces
+        ("\\#notes.py", "#notes.py", True),
+        ("\\!keep.py", "!keep.py", True),
+        ("a.py   ", "a.py", True),
+        ("a.py\\ ", "a.py ", True),
+        ("# a comment", "# a comment", None),
+    ],
+)
+def test_patterns(pattern, path, expected):
+    assert match([pattern], path) is expected
+
+
+def test_directory_patterns_do_not_match_files():
+    assert match(["build/"], "build", is_dir=True) is True
+    assert match(["build/"], "a/build", is_dir=True) is True
+    assert match(["build/"], "build") is None
+
+
+def test_last_matching_pattern_wins():
+    assert match(["*.py", "!keep.py"], "keep.py") is False
+    assert match(["*.py", "!keep.py"], "drop.py") is True
+    assert match(["!keep.py", "*.py"], "keep.py") is True
+
+
+def test_base_directory():
+    assert match(["/x.py"], "pkg/x.py", base="pkg") is True
+    assert match(["/x.py"], "x.py", base="pkg") is None
+    assert match(["*.py"], "pkgx/x.py", base="pkg") is None
+
+
+def test_deepest_rules_take_precedence():
+    rules = [
+        IgnoreRules(patterns=["*.py"]),
+        IgnoreRules(patterns=["!keep.py"], base="pkg"),
+    ]
+    assert is_ignored(rules, "pkg/keep.py") is False
+    assert is_ignored(rules, "keep.py") is True
+    assert is_ignored(rules, "pkg/other.py") is True
+    assert is_ignored(rules, "README.md") is False
+
+
+def write(root, files):
+    for path, content in files.items():
+        file_path = root / path
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(content)
+
+
+def test_parser_honors_ignore_files(tmp_path):
+    write(
+        tmp_path,
+        {
+            ".gitignore": "generated/\n*_pb2.py\n",
+            "main.py": "",
+            "api_pb2.py": "",
+            "generated/models.py": "",
+            "pkg/.pycodedocignore": "/legacy.py\n",
+            "pkg/legacy.py": "",
+            "pkg/sub/legacy.py": "",
+            "pkg/sub/.gitignore": "!api_pb2.py\n",
+            "pkg/sub/api_pb2.py": "",
+        },
+    )
+    parser = Parser(base_dir=str(tmp_path), exclude_patterns=[])
+    assert sorted(parser.get_modules_paths()) == [
+        "main.py",
+        "pkg/sub/api_pb2.py",
+        "pkg/sub/legacy.py",
+    ]
+    parser = Parser(base_dir=str(tmp_path), exclude_patterns=[], use_ignore_files=False)
+    assert len(parser.get_modules_paths()) == 6
+
+
+def test_ignored_directories_cannot_be_reincluded(tmp_path):
+    write(tmp_path, {".gitignore": "build/\n!build/keep.py\n", "build/keep.py": ""})
+    parser = Parser(base_dir=str(tmp_path), exclude_patterns=[])
+    assert parser.get_modules_paths() == []
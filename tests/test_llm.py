@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from pycodedoc.costs import calculate_cost
+from pycodedoc.docgen import DocGen
+from pycodedoc.llm import BudgetExceededError, Llm
+
+MODEL = "gpt-3.5-turbo-0125"
+
+
+class Client:
+    """answers after a delay, reporting a usage of 10 prompt and 10 output tokens"""
+
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.requests = 0
+        self.chat = self.completions = self
+
+    async def create(self, messages, model, **kwargs):
+        self.requests += 1
+        await asyncio.sleep(self.delay)
+        return {
+            "content": messages[-1]["content"],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 10},
+        }
+
+
+def run(llm, client, n_requests, model=MODEL, **kwargs):
+    async def run_batch():
+        async with llm.async_session(client=client):
+            return await llm.arun_batch_completions(
+                [[{"role": "user", "content": str(i)}] for i in range(n_requests)],
+                model=model,
+                **kwargs,
+            )
+
+    return asyncio.run(run_batch())
+
+
+def test_requests_wait_for_the_reservations_to_settle(encoding):
+    # each request reserves 500 output tokens but only costs 20 tokens
+    reserved = calculate_cost(1, 500, MODEL)
+    actual = calculate_cost(10, 10, MODEL)
+    llm = Llm(max_cost=2.5 * reserved)
+    client = Client()
+    responses = run(llm, client, 20, max_in_flight=5)
+    assert [response["content"] for response in responses] == [
+        str(i) for i in range(20)
+    ]
+    assert client.requests == 20
+    assert llm.get_spent() == pytest.approx(20 * actual)
+
+
+def test_budget_exceeded(encoding):
+    llm = Llm(max_cost=5.5 * calculate_cost(10, 10, MODEL), projected_output_tokens=10)
+    client = Client()
+    with pytest.raises(BudgetExceededError):
+        run(llm, client, 20, max_in_flight=2)
+    assert client.requests == 5
+
+
+def test_unknown_prices_are_rejected_before_the_run():
+    with pytest.raises(ValueError, match="price of my-model is unknown"):
+        run(Llm(max_cost=1), Client(), 1, model="my-model")
+    with pytest.raises(ValueError, match="price of my-small-model is unknown"):
+        DocGen(
+            base_dir="/nonexistent",
+            llm={"max_cost": 1},
+            router={"small_model": "my-small-model"},
+        )
+    with pytest.raises(ValueError, match="price of my-model is unknown"):
+        DocGen(
+            base_dir="/nonexistent",
+            llm={"max_cost": 1},
+            profiles={"project": {"model": "my-model"}},
+        )
+
+
+def test_timeout_grows_with_the_prompt_tokens(encoding):
+    llm = Llm(timeout_per_1k_tokens=2.0)
+    # 500 words of 20 characters are 500 tokens, not the 2500 of a characters count
+    messages = [{"role": "user", "content": " ".join(["x" * 19] * 500)}]
+    assert llm.get_timeout(messages, MODEL, 10.0) == pytest.approx(11.0)
+    assert llm.get_timeout(messages, MODEL) is None
+    assert Llm(adaptive_timeout=False).get_timeout(messages, MODEL, 10.0) == 10.0
+
+
+class FlakyClient(Client):
+    """fails the first attempts of the requests of the given prompts"""
+
+    def __init__(self, failures: dict):
+        super().__init__(delay=0)
+        self.failures = failures
+
+    async def create(self, messages, model, **kwargs):
+        prompt = messages[-1]["content"]
+        if self.failures.get(prompt, 0) > 0:
+            self.failures[prompt] -= 1
+            raise RuntimeError("request failed")
+        return await super().create(messages, model, **kwargs)
+
+
+def test_failed_requests_are_retried_at_the_end_of_the_batch():
+    # the 3 attempts of the request of "1" fail in the batch, not in the retry round
+    client = FlakyClient({"1": 3})
+    completed = []
+    run(
+        Llm(retry_backoff=0),
+        client,
+        3,
+        on_response=lambda i, response: completed.append((i, response["content"])),
+    )
+    assert completed == [(0, "0"), (2, "2"), (1, "1")]
+
+
+def test_requests_failing_every_round_get_no_response():
+    client = FlakyClient({"1": 100})
+    responses = run(Llm(retry_backoff=0, retry_rounds=1), client, 3)
+    assert [response and response["content"] for response in responses] == [
+        "0",
+        None,
+        "2",
+    ]
+    # 3 attempts in the batch and in the retry round
+    assert client.failures["1"] == 94
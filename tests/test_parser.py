@@ -0,0 +1,72 @@
+import pytest
+from conftest import write
+
+from pycodedoc.parser import Parser
+
+FILES = {
+    "app/main.py": "from app.core import run\n\nrun()\n",
+    "app/core.py": "from lib.util import helper\n\n\ndef run():\n    helper()\n",
+    "lib/util.py": "def helper():\n    pass\n",
+    "lib/extra.py": "EXTRA = 1\n",
+    "tools/cli.py": "import sys\n",
+}
+
+
+@pytest.fixture
+def parser(tmp_path):
+    write(tmp_path, FILES)
+    # as for a scoped run, no module is parsed before the selection
+    return Parser(base_dir=str(tmp_path), modules_paths=[])
+
+
+def get_parsed(parser) -> set:
+    return {module.path for module in parser.get_modules()}
+
+
+@pytest.mark.parametrize(
+    "include, expected",
+    [
+        (["lib"], {"lib/util.py", "lib/extra.py"}),
+        (["lib/"], {"lib/util.py", "lib/extra.py"}),
+        (["*/c*.py"], {"app/core.py", "tools/cli.py"}),
+        (["tools/cli.py", "lib/extra.py"], {"tools/cli.py", "lib/extra.py"}),
+        (["li"], set()),
+    ],
+)
+def test_select_included_modules(parser, include, expected):
+    selected = parser.select_modules(include=include)
+    assert set(selected) == expected
+    assert get_parsed(parser) == expected
+
+
+def test_select_entries_with_their_imports(parser):
+    selected = parser.select_modules(entries=["app/main.py"])
+    # the modules imported by the entry's imports are selected as well
+    assert set(selected) == {"app/main.py", "app/core.py", "lib/util.py"}
+    assert get_parsed(parser) == set(selected)
+    # selections add up, in the order of the project
+    assert parser.select_modules(include=["tools"], entries=["lib/util.py"]) == [
+        path
+        for path in parser.get_modules_paths()
+        if path in {"lib/util.py", "tools/cli.py"}
+    ]
+
+
+def test_select_unknown_entries(parser):
+    with pytest.raises(ValueError, match="app/missing.py"):
+        parser.select_modules(entries=["app/missing.py"])
+
+
+def test_index_and_tree_are_memoized_until_reset(parser, tmp_path):
+    tree = parser.get_tree()
+    assert "extra.py" in tree and parser.get_tree() is tree
+    write(tmp_path, {"lib/new.py": "NEW = 1\n"})
+    (tmp_path / "lib" / "extra.py").unlink()
+    # the project is only walked again once the index is reset
+    assert "lib/new.py" not in parser.get_modules_paths()
+    assert parser.get_tree() is tree
+    parser.update_modules(["lib/new.py"], ["lib/extra.py"])
+    assert "lib/new.py" in parser.get_modules_paths()
+    assert "lib/extra.py" not in parser.get_modules_paths()
+    tree = parser.get_tree()
+    assert "new.py" in tree and "extra.py" not in tree
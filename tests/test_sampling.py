@@ -0,0 +1,90 @@
+import pytest
+from conftest import write
+from typer.testing import CliRunner
+
+from pycodedoc.cli import app
+from pycodedoc.costs import estimate_module
+from pycodedoc.docgen import DocGen
+from pycodedoc.sampling import allocate, estimate_sampled_cost, extrapolate, stratify
+
+FILES = {
+    f"{package}/mod{i}.py": "def f(x):\n    return x\n" * (i + 1)
+    for package in ["api", "core"]
+    for i in range(6)
+}
+
+
+def make_docgen(tmp_path, **kwargs):
+    return DocGen(
+        base_dir=str(tmp_path),
+        output_dir=str(tmp_path / "docs"),
+        no_relations=True,
+        no_cache=True,
+        use_structure=True,
+        modules_paths=[],
+        **kwargs,
+    )
+
+
+def test_stratify_by_package_and_size(tmp_path):
+    write(tmp_path, FILES)
+    strata = stratify(str(tmp_path), sorted(FILES))
+    assert len(strata) == 8
+    assert strata[("api", 0)] == ["api/mod0.py"]
+    assert strata[("core", 3)] == ["core/mod4.py", "core/mod5.py"]
+
+
+def test_allocate_in_proportion_to_the_strata():
+    strata = {"a": list(range(30)), "b": list(range(10)), "c": list(range(1))}
+    assert allocate(strata, 8) == {"a": 5, "b": 2, "c": 1}
+    # below one module per stratum, the largest remainders get the modules
+    assert allocate(strata, 2) == {"a": 1, "b": 1, "c": 0}
+    assert allocate(strata, 100) == {"a": 30, "b": 10, "c": 1}
+
+
+@pytest.mark.parametrize("sample_size", [0, -1])
+def test_allocate_nothing(sample_size):
+    assert allocate({"a": [1, 2]}, sample_size) == {"a": 0}
+    assert allocate({}, 3) == {}
+
+
+def test_extrapolate():
+    strata = {"a": ["a1", "a2", "a3", "a4"], "b": ["b1", "b2"]}
+    values = {"a1": 1, "a2": 3, "b1": 10, "b2": 10}
+    total, margin = extrapolate(strata, {"a": ["a1", "a2"], "b": ["b1", "b2"]}, values)
+    assert total == 4 * 2 + 20
+    assert margin > 0
+    # a fully sampled project is known exactly
+    values.update(a3=2, a4=2)
+    total, margin = extrapolate(strata, strata, values)
+    assert (total, margin) == (28, 0)
+
+
+def test_full_sample_is_exact(tmp_path, encoding):
+    write(tmp_path, FILES)
+    estimate = estimate_sampled_cost(make_docgen(tmp_path), len(FILES))
+    assert (estimate.n_modules, estimate.n_sampled) == (len(FILES), len(FILES))
+    docgen = make_docgen(tmp_path)
+    docgen.parser.add_modules(sorted(FILES))
+    costs = [estimate_module(docgen, module) for module in docgen.parser.get_modules()]
+    for phase in ["functions", "modules"]:
+        expected = sum(cost[phase]["cost"] for cost in costs)
+        assert estimate.phases[phase].cost == pytest.approx(expected)
+        assert estimate.phases[phase].cost_margin == 0
+
+
+def test_empty_project(tmp_path, encoding):
+    estimate = estimate_sampled_cost(make_docgen(tmp_path), 10)
+    assert (estimate.n_modules, estimate.n_sampled, estimate.cost) == (0, 0, 0)
+    assert "Estimate from 0 of 0 modules" in estimate.format()
+
+
+def test_sample_size_must_be_positive(tmp_path, encoding):
+    write(tmp_path, FILES)
+    with pytest.raises(ValueError):
+        estimate_sampled_cost(make_docgen(tmp_path), 0)
+    result = CliRunner().invoke(
+        app, ["-d", str(tmp_path), "--estimate", "--sample", "0"]
+    )
+    assert result.exit_code != 0
+    assert "--sample" in result.output
@@ -0,0 +1,78 @@
+import json
+import textwrap
+
+import pytest
+from conftest import write
+
+from pycodedoc.costs import calculate_cost
+from pycodedoc.shard import document_shard, get_shard_file, merge_shards
+
+FILES = {
+    "api/routes.py": textwrap.dedent(
+        """
+        from core.models import load
+
+
+        def index():
+            return load()
+        """
+    ),
+    "core/models.py": "def load():\n    return 1\n\n\ndef save():\n    return 2\n",
+}
+
+
+@pytest.fixture
+def docgen_kwargs(tmp_path, encoding, fake_openai):
+    write(tmp_path / "project", FILES)
+    return dict(
+        base_dir=str(tmp_path / "project"),
+        output_dir=str(tmp_path / "docs"),
+        create_graphs=False,
+        no_cache=True,
+        use_structure=True,
+        llm={"retry_backoff": 0},
+    )
+
+
+def read_shard(docgen_kwargs, shard_index):
+    with open(get_shard_file(docgen_kwargs["output_dir"], shard_index, 2)) as f:
+        return json.load(f)
+
+
+def test_shards_are_merged(docgen_kwargs, fake_openai):
+    for shard_index in range(2):
+        document_shard(docgen_kwargs, shard_index, 2)
+    shards = [read_shard(docgen_kwargs, i) for i in range(2)]
+    assert ["api/routes.py"] in [shard["pending_deps"] for shard in shards]
+    docgen = merge_shards(docgen_kwargs, 2)
+    assert docgen._descriptions.modules_deps["api/routes.py"] is not None
+    assert docgen._descriptions.project is not None
+
+
+def test_budget_is_split_between_the_shards(docgen_kwargs, fake_openai):
+    # each share is enough for a request, not for all the requests of a shard
+    max_cost = 3 * calculate_cost(300, 500, "gpt-3.5-turbo-0125")
+    docgen_kwargs["llm"]["max_cost"] = max_cost
+    for shard_index in range(2):
+        document_shard(docgen_kwargs, shard_index, 2)
+    shards = [read_shard(docgen_kwargs, i) for i in range(2)]
+    # the shards ran out of budget but still wrote what they described
+    assert all(0 < shard["spent"] <= max_cost / 3 for shard in shards)
+    modules = [shard["descriptions"]["modules"] for shard in shards]
+    assert None in [desc for shard in modules for desc in shard.values()]
+    docgen = merge_shards(docgen_kwargs, 2)
+    spent = sum(shard["spent"] for shard in shards) + docgen.llm.get_spent()
+    assert spent <= max_cost
+    assert docgen.llm.max_cost == pytest.approx(
+        max_cost - sum(shard["spent"] for shard in shards)
+    )
+
+
+def test_shard_without_budget_still_writes_its_results(docgen_kwargs, fake_openai):
+    docgen_kwargs["llm"]["max_cost"] = 1e-7
+    for shard_index in range(2):
+        document_shard(docgen_kwargs, shard_index, 2)
+    assert fake_openai.prompts == []
+    assert read_shard(docgen_kwargs, 0)["spent"] == 0
+    merge_shards(docgen_kwargs, 2)
+    assert fake_openai.prompts == []
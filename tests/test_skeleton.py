@@ -0,0 +1,135 @@
+import ast
+import textwrap
+
+from pycodedoc.skeleton import (
+    render_filtered,
+    render_selected,
+    render_structure,
+    render_summary,
+)
+
+CODE = textwrap.dedent(
+    '''
+    import os
+
+    LIMIT = 3
+
+
+    def helper(x):
+        return x + 1
+
+
+    class Greeter:
+        """greets"""
+
+        name = "world"
+
+        def greet(self):
+            return helper(1)
+
+        async def wait(self):
+            return os.sep
+    '''
+)
+
+
+def parse():
+    return ast.parse(CODE)
+
+
+def test_module_structure():
+    node = parse()
+    assert render_structure(node) == textwrap.dedent(
+        '''\
+        import os
+
+        def helper(x):
+            ...
+
+        class Greeter:
+            """greets"""
+            name = 'world'
+
+            def greet(self):
+                ...
+
+            async def wait(self):
+                ...'''
+    )
+
+
+def test_structure_options_and_descriptions():
+    descriptions = {"helper": "adds one", "Greeter.greet": "says hello"}
+    rendered = render_structure(
+        parse(), descriptions, strip_imports=True, strip_globals=False
+    )
+    assert "import os" not in rendered
+    assert "LIMIT = 3" in rendered
+    assert 'def helper(x):\n    """adds one"""\n    ...' in rendered
+    assert 'def greet(self):\n        """says hello"""\n        ...' in rendered
+
+
+def test_function_and_class_structure():
+    node = parse()
+    greeter = node.body[3]
+    assert render_structure(
+        greeter.body[2], {"Greeter.greet": "hi"}, name="Greeter.greet"
+    ) == ('def greet(self):\n    """hi"""\n    ...')
+    assert render_structure(greeter).startswith('class Greeter:\n    """greets"""')
+
+
+def test_rendering_leaves_the_tree_untouched():
+    node = parse()
+    before = ast.dump(node)
+    render_structure(node, {"helper": "adds one"})
+    render_filtered(node, {"greet"}, {"Greeter"})
+    render_selected(node, {"helper"}, {"Greeter.wait"}, {"Greeter.wait": "waits"})
+    render_summary(node, {"helper"}, {"helper": "adds one"}, "the module")
+    assert ast.dump(node) == before
+    assert ast.unparse(node) == ast.unparse(ast.parse(CODE))
+
+
+def test_render_filtered():
+    rendered = render_filtered(parse(), {"greet"}, {"Greeter"})
+    assert "def helper" not in rendered
+    assert "def greet(self):\n        return helper(1)" in rendered
+    assert "async def wait" not in rendered
+    assert "name = 'world'" in rendered
+    # a kept class without kept methods still has a body
+    node = ast.parse("class A:\n    def f(self):\n        pass")
+    assert render_filtered(node, set(), {"A"}) == "class A:\n    ..."
+
+
+def test_render_selected():
+    rendered = render_selected(
+        parse(), {"helper"}, {"Greeter.wait"}, {"Greeter.wait": "waits"}
+    )
+    assert "return x + 1" in rendered
+    assert "def greet" not in rendered
+    assert 'async def wait(self):\n        """waits"""\n        ...' in rendered
+    # classes without selected methods are left out
+    assert "class Greeter" not in render_selected(parse(), {"helper"})
+
+
+def test_render_summary():
+    rendered = render_summary(
+        parse(),
+        {"helper", "Greeter.greet"},
+        {"helper": "adds one", "Greeter": "a greeter", "Greeter.greet": "says hi"},
+        "the module",
+    )
+    assert rendered == textwrap.dedent(
+        '''\
+        """the module"""
+
+        def helper(x):
+            """adds one"""
+            ...
+
+        class Greeter:
+            """a greeter"""
+
+            def greet(self):
+                """says hi"""
+                ...'''
+    )
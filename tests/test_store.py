@@ -0,0 +1,116 @@
+import pytest
+
+from pycodedoc.docgen import Descriptions
+from pycodedoc.store import DescriptionsStore, MemoryStore, SqliteStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryStore()
+    else:
+        store = SqliteStore(path=str(tmp_path / "db" / "descriptions.db"))
+        yield store
+        store.close()
+
+
+def test_incomplete_store_cannot_be_created():
+    class IncompleteStore(DescriptionsStore):
+        def get(self, phase, path, entity="", default=None):
+            return default
+
+    with pytest.raises(TypeError):
+        IncompleteStore()
+
+
+def test_get_set(store):
+    assert store.get("modules", "a.py") is None
+    assert store.get("modules", "a.py", default="missing") == "missing"
+    store.set("modules", "a.py", "", "module a")
+    store.set("functions", "a.py", "f", None)
+    assert store.get("modules", "a.py") == "module a"
+    assert store.get("functions", "a.py", "f", "missing") is None
+    assert store.get("functions", "b.py", "f") is None
+
+
+def test_contains(store):
+    store.set("functions", "a.py", "f", "f")
+    assert store.contains("functions", "a.py", "f")
+    assert store.contains("functions", "a.py", None)
+    assert not store.contains("functions", "a.py", "g")
+    assert not store.contains("functions", "a.py")
+    assert not store.contains("classes", "a.py", None)
+
+
+def test_insertion_order(store):
+    for path, entity in [("b.py", "g"), ("a.py", "f"), ("b.py", "e")]:
+        store.set("functions", path, entity, entity.upper())
+    # updating a value keeps its position
+    store.set("functions", "b.py", "g", "G2")
+    assert list(store.paths("functions")) == ["b.py", "a.py"]
+    assert list(store.entities("functions", "b.py")) == [("g", "G2"), ("e", "E")]
+    assert list(store.paths("classes")) == []
+
+
+def test_delete(store):
+    store.set("functions", "a.py", "f", "F")
+    store.set("functions", "a.py", "g", "G")
+    store.set("functions", "b.py", "h", "H")
+    store.delete("functions", "a.py", "f")
+    assert list(store.entities("functions", "a.py")) == [("g", "G")]
+    store.delete("functions", "a.py", "g")
+    assert list(store.paths("functions")) == ["b.py"]
+    store.delete("functions", "b.py")
+    assert list(store.paths("functions")) == []
+    # deleting what is not stored is a no-op
+    store.delete("functions", "c.py")
+    store.delete("functions", "c.py", "f")
+
+
+def fill(descriptions):
+    paths = ["pkg/a.py", "pkg/sub/b.py", "c.py"]
+    for path in paths:
+        descriptions.entities[path] = {"f": f"{path} f"}
+        descriptions.functions[path] = {"f": f"{path} f"}
+        descriptions.modules[path] = f"{path} module"
+        descriptions.modules_deps[path] = f"{path} relations"
+    descriptions.gaps["functions"] = {f"{path}:f": "timeout" for path in paths}
+    for path in ["", "pkg", "pkg/sub"]:
+        descriptions.packages[path] = f"{path} package"
+
+
+def test_remove_entities_only(store):
+    descriptions = Descriptions(store=store)
+    fill(descriptions)
+    descriptions.remove("c.py", entities_only=True)
+    assert "c.py" not in descriptions.entities
+    assert "c.py" not in descriptions.functions
+    assert descriptions.modules["c.py"] == "c.py module"
+    assert descriptions.modules_deps["c.py"] == "c.py relations"
+    assert not descriptions.has_gap("functions", "c.py:f")
+    assert descriptions.has_gap("functions", "pkg/a.py:f")
+    descriptions.remove("c.py")
+    assert "c.py" not in descriptions.modules
+    assert "c.py" not in descriptions.modules_deps
+    assert "pkg/a.py" in descriptions.modules
+
+
+def test_retain(store):
+    descriptions = Descriptions(store=store)
+    fill(descriptions)
+    descriptions.retain(["pkg/a.py", "c.py"])
+    assert list(descriptions.modules) == ["pkg/a.py", "c.py"]
+    assert list(descriptions.entities) == ["pkg/a.py", "c.py"]
+    assert list(descriptions.modules_deps) == ["pkg/a.py", "c.py"]
+    assert list(descriptions.packages) == ["", "pkg"]
+    assert not descriptions.has_gap("functions", "pkg/sub/b.py:f")
+
+
+def test_sqlite_store_persists(tmp_path):
+    path = str(tmp_path / "descriptions.db")
+    store = SqliteStore(path=path)
+    Descriptions(store=store).modules["a.py"] = "module a"
+    store.close()
+    assert Descriptions(store=SqliteStore(path=path)).modules.to_dict() == {
+        "a.py": "module a"
+    }
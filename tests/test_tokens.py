@@ -0,0 +1,118 @@
+import textwrap
+import threading
+
+import pytest
+from conftest import write
+
+from pycodedoc import tokens
+from pycodedoc.parser import Parser
+from pycodedoc.tokens import TokenIndex, get_encoding_name, get_token_index
+
+CODE = textwrap.dedent(
+    '''
+    class Box:
+        """holds a value"""
+
+        @property
+        def value(self):
+            return self._value
+
+        @value.setter
+        def value(self, value):
+            self._value = value
+
+
+    def double(x):
+        return 2 * x
+    '''
+)
+
+
+def test_counts_are_memoized(encoding):
+    index = TokenIndex(encoding_name="whitespace")
+    assert index.count("one two three") == 3
+    assert index.count("one two three") == 3
+    assert index.count("four") == 1
+    assert encoding.calls == 2
+
+
+def test_least_recently_used_counts_are_evicted(encoding, monkeypatch):
+    monkeypatch.setattr(tokens, "MAX_TEXTS", 2)
+    index = TokenIndex(encoding_name="whitespace")
+    for text in ["a", "b", "a", "c"]:
+        index.count(text)
+    assert encoding.calls == 3
+    # "b" was the least recently used when "c" was added
+    index.count("a")
+    assert encoding.calls == 3
+    index.count("b")
+    assert encoding.calls == 4
+
+
+def test_count_messages(encoding):
+    messages = [
+        {"role": "system", "content": "be brief"},
+        {"role": "assistant", "content": None},
+        {"role": "user", "content": "describe this code"},
+    ]
+    assert get_token_index("gpt-4").count_messages(messages) == 5
+
+
+def test_models_sharing_an_encoding_share_an_index(encoding):
+    assert get_token_index("gpt-4") is get_token_index("gpt-3.5-turbo")
+    get_token_index("gpt-4").count("shared text")
+    get_token_index("gpt-3.5-turbo").count("shared text")
+    assert encoding.calls == 1
+
+
+def test_unknown_models_use_the_default_encoding(encoding, monkeypatch):
+    import tiktoken
+
+    def encoding_for_model(model):
+        raise KeyError(model)
+
+    monkeypatch.setattr(tiktoken, "encoding_for_model", encoding_for_model)
+    assert get_encoding_name("my-local-model") == "cl100k_base"
+
+
+def test_concurrent_counts(encoding):
+    index = TokenIndex(encoding_name="whitespace")
+    texts = [" ".join(["word"] * (i % 50 + 1)) for i in range(2000)]
+    results = {}
+
+    def count(start):
+        results[start] = [index.count(text) for text in texts[start::4]]
+
+    threads = [threading.Thread(target=count, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for start, sizes in results.items():
+        assert sizes == [i % 50 + 1 for i in range(start, 2000, 4)]
+
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_parser_token_sizes(tmp_path, encoding, cached):
+    write(tmp_path / "project", {"box.py": CODE})
+    cache_dir = str(tmp_path / "cache") if cached else None
+    parser = Parser(base_dir=str(tmp_path / "project"), cache_dir=cache_dir)
+    sizes = parser.get_token_sizes("box.py", "gpt-4")
+    module = parser.get_module("box.py")
+    assert sizes.module == len(module.code.split())
+    box, double = module.entities
+    assert sizes.code(double) == len(double.code.split())
+    assert sizes.docstring(box) == 3
+    assert sizes.docstring(double) == 0
+    # the property and its setter share their name but not their size
+    getter, setter = box.methods
+    assert sizes.code(getter) != sizes.code(setter)
+    assert sizes.class_structure(box) > 0
+    # the sizes are computed once per module and encoding
+    calls = encoding.calls
+    assert parser.get_token_sizes("box.py", "gpt-3.5-turbo") is sizes
+    assert encoding.calls == calls
+    if cached:
+        other = Parser(base_dir=str(tmp_path / "project"), cache_dir=cache_dir)
+        assert other.get_token_sizes("box.py", "gpt-4") == sizes
+        assert encoding.calls == calls
@@ -0,0 +1,87 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+
+from pycodedoc.llm import Llm
+from pycodedoc.trace import Trace, TraceMissError, make_chunk
+
+MODEL = "gpt-3.5-turbo-0125"
+
+
+class StreamingClient:
+    """streams the reversed content of the last message, word by word"""
+
+    def __init__(self):
+        self.requests = 0
+        self.chat = self.completions = self
+
+    async def create(self, messages, model, stream=False, **kwargs):
+        self.requests += 1
+        words = messages[-1]["content"][::-1].split()
+
+        async def iterate():
+            for word in words:
+                await asyncio.sleep(0)
+                yield make_chunk(word + " ")
+            yield make_chunk(usage={"prompt_tokens": 3, "completion_tokens": 2})
+
+        return iterate()
+
+
+def run(llm, messages, client=None, **kwargs):
+    async def run_batch():
+        async with llm.async_session(client=client):
+            return await llm.arun_batch_completions(
+                messages, model=MODEL, stream=True, **kwargs
+            )
+
+    return asyncio.run(run_batch())
+
+
+@pytest.mark.parametrize("name", ["trace.jsonl", "trace.jsonl.gz"])
+def test_record_and_replay(tmp_path, name):
+    path = str(tmp_path / name)
+    messages = [[{"role": "user", "content": f"request number {i}"}] for i in range(5)]
+    client = StreamingClient()
+    recorded = run(Llm(record_trace=path), messages, client)
+    assert client.requests == 5
+
+    # the trace is complete once the session exits
+    opener = gzip.open if name.endswith(".gz") else open
+    with opener(path, "rt") as f:
+        entries = [json.loads(line) for line in f]
+    assert len(entries) == 5
+    assert all(entry["usage"]["prompt_tokens"] == 3 for entry in entries)
+
+    llm = Llm(replay_trace=path)
+    replayed = run(llm, messages)
+    assert [r["content"] for r in replayed] == [r["content"] for r in recorded]
+    assert replayed[0]["content"] == "0 rebmun tseuqer "
+    assert llm.get_usage()["prompt_tokens"] == 15
+
+
+def test_recording_resumes_after_closing(tmp_path):
+    path = str(tmp_path / "trace.jsonl.gz")
+    llm = Llm(record_trace=path)
+    run(llm, [[{"role": "user", "content": "first"}]], StreamingClient())
+    run(llm, [[{"role": "user", "content": "second"}]], StreamingClient())
+    replayed = run(
+        Llm(replay_trace=path),
+        [
+            [{"role": "user", "content": "second"}],
+            [{"role": "user", "content": "first"}],
+        ],
+    )
+    assert [r["content"] for r in replayed] == ["dnoces ", "tsrif "]
+
+
+def test_replay_miss(tmp_path):
+    path = str(tmp_path / "trace.jsonl")
+    messages = [[{"role": "user", "content": "known"}]]
+    run(Llm(record_trace=path), messages, StreamingClient())
+    trace = Trace(path=path)
+    assert trace.get_entry(MODEL, messages[0])["chunks"][0][1] == "nwonk "
+    with pytest.raises(TraceMissError):
+        trace.get_entry(MODEL, [{"role": "user", "content": "unknown"}])
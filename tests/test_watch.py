@@ -0,0 +1,34 @@
+from conftest import write
+
+from pycodedoc.docgen import DocGen
+from pycodedoc.watch import Watcher
+
+FILES = {
+    "shop/cart.py": "from shop.prices import price\n\nCART = [price]\n",
+    "shop/prices.py": "def price(item):\n    return item.price\n",
+}
+
+
+def test_watcher_updates_added_and_removed_modules(tmp_path, encoding, fake_openai):
+    write(tmp_path / "project", FILES)
+    (tmp_path / "docs").mkdir()
+    docgen = DocGen(
+        base_dir=str(tmp_path / "project"),
+        output_dir=str(tmp_path / "docs"),
+        create_graphs=False,
+        no_cache=True,
+        llm={"retry_backoff": 0},
+    )
+    watcher = Watcher(docgen=docgen, interval=0, debounce=0)
+    docgen.generate_documentation()
+    watcher._mtimes = watcher.snapshot()
+    assert watcher.poll() == (set(), set())
+
+    write(tmp_path / "project", {"shop/orders.py": "ORDERS = []\n"})
+    (tmp_path / "project" / "shop" / "cart.py").unlink()
+    assert watcher.wait_for_changes() == (["shop/orders.py"], ["shop/cart.py"])
+    docgen.update_documentation(["shop/orders.py"], ["shop/cart.py"])
+    modules = docgen.get_descriptions().modules
+    assert set(modules) == {"shop/orders.py", "shop/prices.py"}
+    markdown = (tmp_path / "docs" / "project-doc.md").read_text()
+    assert "shop/orders.py" in markdown and "shop/cart.py" not in markdown